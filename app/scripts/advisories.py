@@ -0,0 +1,373 @@
+"""
+Índice local de vulnerabilidades (advisories no formato OSV) para o ecossistema npm.
+
+Carrega um dump do OSV (pasta com os .json, o npm/all.zip do osv.dev ou um único JSON)
+num índice por nome de pacote, com os intervalos afetados já convertidos em chaves de
+versão comparáveis. As dependências de todos os package.json de um repo são casadas
+contra o índice numa única passada, sem chamadas de API nem `npm audit`.
+
+Sem lockfile, a versão de uma dependência é a menor versão que satisfaz o range
+declarado (como o `semver.minVersion` do npm): "^4.17.0" é verificado como 4.17.0.
+"""
+import json
+import os
+import re
+import zipfile
+from functools import lru_cache
+
+# caminho do dump OSV; vazio desliga a verificação de vulnerabilidades
+ADVISORY_DB = os.getenv("ADVISORY_DB", "")
+ADVISORY_ECOSYSTEM = "npm"
+
+_VERSION = re.compile(
+    r"^\s*[v=]?\s*(\d+)(?:\.(\d+))?(?:\.(\d+))?"
+    r"(?:-?([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?(?:\+[0-9A-Za-z.-]+)?\s*$"
+)
+_PARTIAL = re.compile(
+    r"^\s*[v=]?\s*([0-9]+|[xX*])?(?:\.([0-9]+|[xX*]))?(?:\.([0-9]+|[xX*]))?"
+    r"(?:-([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?(?:\+[0-9A-Za-z.-]+)?\s*$"
+)
+_COMPARATOR = re.compile(r"^(\^|~>?|[<>]=?|=)?\s*(.*)$")
+_HYPHEN = re.compile(r"^\s*(\S+)\s+-\s+(\S+)\s*$")
+
+
+# --- versões semver ---
+
+def _prerelease_key(prerelease):
+    # identificadores numéricos vêm antes dos alfanuméricos e comparam como número
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in prerelease.split("."))
+
+
+def version_key(major, minor, patch, prerelease=None):
+    """Chave ordenável de uma versão: a release vem depois de todas as suas pré-releases."""
+    if prerelease:
+        return (major, minor, patch, 0, _prerelease_key(prerelease))
+    return (major, minor, patch, 1, ())
+
+
+def parse_version(text):
+    """Chave de uma versão completa ("1.2.3", "v1.2.3-beta.1"); None se não for semver."""
+    match = _VERSION.match(str(text))
+    if not match:
+        return None
+    major, minor, patch, prerelease = match.groups()
+    return version_key(int(major), int(minor or 0), int(patch or 0), prerelease)
+
+
+# menor pré-release possível de uma versão: "<2.0.0-0" exclui também as pré-releases do 2.0.0
+def _floor(major, minor, patch):
+    return (major, minor, patch, 0, ((0, 0, ""),))
+
+
+def _partial(text):
+    """(major, minor, patch, prerelease) com None nas partes ausentes ou curinga (x, *)."""
+    match = _PARTIAL.match(text)
+    if not match:
+        raise ValueError(f"versão inválida: {text!r}")
+    parts = [None if p is None or p in "xX*" else int(p) for p in match.groups()[:3]]
+    # "1.x.3" vale como "1.x"
+    for i in range(1, 3):
+        if parts[i - 1] is None:
+            parts[i] = None
+    return parts[0], parts[1], parts[2], match.group(4)
+
+
+def _comparators(op, text):
+    """Converte um comparador npm (com versões parciais) em [(op, chave)] com op em >=, >, <, <=."""
+    major, minor, patch, prerelease = _partial(text)
+    if major is None:
+        return [] if op in ("", "=", ">=", "<=", "^", "~") else [("<", _floor(0, 0, 0))]
+
+    if op == "^":
+        low = version_key(major, minor or 0, patch or 0, prerelease)
+        if major > 0 or minor is None:
+            high = _floor(major + 1, 0, 0)
+        elif minor > 0 or patch is None:
+            high = _floor(0, minor + 1, 0)
+        else:
+            high = _floor(0, 0, patch + 1)
+        return [(">=", low), ("<", high)]
+    if op in ("~", "~>"):
+        low = version_key(major, minor or 0, patch or 0, prerelease)
+        high = _floor(major + 1, 0, 0) if minor is None else _floor(major, minor + 1, 0)
+        return [(">=", low), ("<", high)]
+
+    if minor is None or patch is None:
+        # versão parcial: vira o intervalo que ela cobre
+        low = version_key(major, minor or 0, 0)
+        high = _floor(major + 1, 0, 0) if minor is None else _floor(major, minor + 1, 0)
+        if op in ("", "="):
+            return [(">=", low), ("<", high)]
+        if op == ">=":
+            return [(">=", low)]
+        if op == ">":
+            return [(">=", version_key(*high[:3]))]
+        if op == "<":
+            return [("<", _floor(*low[:3]))]
+        return [("<", high)]  # <=
+    key = version_key(major, minor, patch, prerelease)
+    if op in ("", "="):
+        return [(">=", key), ("<=", key)]
+    return [(op, key)]
+
+
+def _satisfies(key, comparators):
+    for op, bound in comparators:
+        if op == ">=" and not key >= bound:
+            return False
+        if op == ">" and not key > bound:
+            return False
+        if op == "<" and not key < bound:
+            return False
+        if op == "<=" and not key <= bound:
+            return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def parse_range(spec):
+    """
+    Range npm ("^1.2.0", "~1.2", ">=1 <2 || 3.x", "1.2 - 2", "*") como lista de alternativas,
+    cada uma uma lista de comparadores (op, chave). Levanta ValueError se não for um range semver.
+    """
+    alternatives = []
+    for alternative in str(spec).split("||"):
+        alternative = alternative.strip()
+        hyphen = _HYPHEN.match(alternative)
+        if hyphen:
+            low, high = hyphen.groups()
+            alternatives.append(_comparators(">=", low) + _comparators("<=", high))
+            continue
+        # "> 1.2" e ">1.2" são o mesmo comparador
+        tokens = re.sub(r"(\^|~>?|[<>]=?|=)\s+", r"\1", alternative).split()
+        comparators = []
+        for token in tokens or ["*"]:
+            op, text = _COMPARATOR.match(token).groups()
+            comparators.extend(_comparators(op or "", text))
+        alternatives.append(comparators)
+    return tuple(tuple(c) for c in alternatives)
+
+
+def _bump_patch(key):
+    major, minor, patch, release, prerelease = key
+    if release == 0:
+        return (major, minor, patch, 0, prerelease + ((0, 0, ""),))
+    return (major, minor, patch + 1, 1, ())
+
+
+@lru_cache(maxsize=None)
+def min_version(spec):
+    """Menor versão que satisfaz o range (semver.minVersion do npm); None se nenhuma ou se inválido."""
+    try:
+        alternatives = parse_range(spec)
+    except ValueError:
+        return None
+    best = None
+    for comparators in alternatives:
+        low = version_key(0, 0, 0)
+        for op, bound in comparators:
+            if op == ">=" and bound > low:
+                low = bound
+            elif op == ">" and bound >= low:
+                low = _bump_patch(bound)
+        if _satisfies(low, comparators) and (best is None or low < best):
+            best = low
+    return best
+
+
+def dependency_target(name, spec):
+    """
+    (pacote, range) efetivos de uma entrada de package.json, ou None se a versão não vem do
+    registro npm (git, url, file:, link:, workspace:, tags como "latest").
+    """
+    if not isinstance(spec, str):
+        return None
+    spec = spec.strip()
+    if spec.startswith("npm:"):
+        # alias: "nome": "npm:outro-pacote@^1.2.0"
+        target = spec[4:]
+        at = target.rfind("@")
+        if at <= 0:
+            return None
+        return target[:at], target[at + 1:]
+    if re.match(r"^[a-z+]+:", spec) or "/" in spec:
+        return None
+    return name, spec
+
+
+# --- índice de advisories ---
+
+def _affected_intervals(affected):
+    """Eventos OSV (introduced/fixed/last_affected) de um pacote como [(início, fim, fim inclusivo?)]."""
+    intervals = []
+    for range_ in affected.get("ranges", []):
+        if range_.get("type") not in ("SEMVER", "ECOSYSTEM"):
+            continue
+        start = None
+        for event in range_.get("events", []):
+            if "introduced" in event:
+                start = version_key(0, 0, 0) if event["introduced"] == "0" else parse_version(event["introduced"])
+            elif start is not None and ("fixed" in event or "last_affected" in event):
+                inclusive = "last_affected" in event
+                end = parse_version(event["last_affected"] if inclusive else event["fixed"])
+                if end is not None:
+                    intervals.append((start, end, inclusive))
+                start = None
+        if start is not None:
+            intervals.append((start, None, False))
+    return intervals
+
+
+class AdvisoryIndex:
+    """
+    Advisories npm por nome de pacote: {nome: [(id, intervalos, versões explícitas)]}.
+    O veredito de cada (pacote, versão) fica memorizado: entre milhares de repos as mesmas
+    versões de lodash/minimist se repetem, e só a primeira percorre os advisories do pacote.
+    """
+
+    def __init__(self, fingerprint=None):
+        self.by_package = {}
+        self.fingerprint = fingerprint
+        self.advisories = 0
+        self._verdicts = {}
+
+    def add(self, advisory):
+        if advisory.get("withdrawn"):
+            return
+        added = False
+        for affected in advisory.get("affected", []):
+            package = affected.get("package", {})
+            if package.get("ecosystem") != ADVISORY_ECOSYSTEM or not package.get("name"):
+                continue
+            versions = frozenset(filter(None, (parse_version(v) for v in affected.get("versions", []))))
+            intervals = tuple(_affected_intervals(affected))
+            if intervals or versions:
+                self.by_package.setdefault(package["name"], []).append((advisory["id"], intervals, versions))
+                added = True
+        self.advisories += added
+        if added:
+            self._verdicts.clear()
+
+    def affected_by(self, name, key):
+        """Ids dos advisories que afetam a versão `key` do pacote."""
+        verdict = self._verdicts.get((name, key))
+        if verdict is not None:
+            return verdict
+        ids = []
+        for advisory_id, intervals, versions in self.by_package.get(name, ()):
+            if key in versions or any(
+                start <= key and (end is None or key < end or (inclusive and key == end))
+                for start, end, inclusive in intervals
+            ):
+                ids.append(advisory_id)
+        self._verdicts[(name, key)] = ids
+        return ids
+
+    def match(self, dependencies):
+        """
+        Casa de uma vez uma coleção de (nome, spec) e devolve {(nome, spec): [ids]} só com as
+        afetadas. Cada par distinto é resolvido e verificado uma única vez.
+        """
+        found = {}
+        for name, spec in set(dependencies):
+            target = dependency_target(name, spec)
+            if target is None or target[0] not in self.by_package:
+                continue
+            key = min_version(target[1])
+            if key is None:
+                continue
+            ids = self.affected_by(target[0], key)
+            if ids:
+                found[(name, spec)] = ids
+        return found
+
+
+def _iter_osv_documents(path):
+    """Advisories de uma pasta de .json, de um .zip (dump do osv.dev) ou de um único arquivo JSON."""
+    def from_text(text):
+        data = json.loads(text)
+        yield from data if isinstance(data, list) else [data]
+
+    if os.path.isdir(path):
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith(".json"):
+                    with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                        yield from from_text(f.read())
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                if name.endswith(".json"):
+                    yield from from_text(zf.read(name).decode("utf-8"))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from from_text(f.read())
+
+
+def advisory_db_fingerprint(path=None):
+    """Identifica a versão do dump (tamanho e mtime dos arquivos); None se não configurado."""
+    path = path if path is not None else ADVISORY_DB
+    if not path or not os.path.exists(path):
+        return None
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+    total = latest = count = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            st = os.stat(os.path.join(root, name))
+            total += st.st_size
+            latest = max(latest, st.st_mtime_ns)
+            count += 1
+    return f"{count}:{total}:{latest}"
+
+
+@lru_cache(maxsize=4)
+def _load_index(path, fingerprint):
+    print(f"📚 Carregando advisories de {path} ...")
+    index = AdvisoryIndex(fingerprint)
+    for advisory in _iter_osv_documents(path):
+        try:
+            index.add(advisory)
+        except (KeyError, TypeError, AttributeError) as e:
+            print(f"   ⚠️ Advisory ignorado ({advisory.get('id', '?') if isinstance(advisory, dict) else '?'}): {e}")
+    return index
+
+
+_indexes = {}
+
+
+def load_advisory_index(path=None, reload=False):
+    """
+    Índice do dump em `path` (default: ADVISORY_DB), ou None se não configurado.
+    Carregado uma vez por processo, junto com o fingerprint (que percorre o dump inteiro):
+    a análise de cada repo reaproveita o mesmo índice. `reload=True` confere o dump de novo
+    e recarrega se ele mudou.
+    """
+    path = path if path is not None else ADVISORY_DB
+    if reload or path not in _indexes:
+        fingerprint = advisory_db_fingerprint(path)
+        _indexes[path] = None if fingerprint is None else _load_index(path, fingerprint)
+    return _indexes[path]
+
+
+def scan_packages(packages, index):
+    """
+    Verifica as dependências (dependencies e devDependencies) de todos os package.json de um
+    repo. Retorna {"vulnerable_deps": entradas afetadas, "cves": ids em ordem de aparição}.
+    """
+    entries = []
+    for pkg in packages:
+        for field in ("dependencies", "devDependencies"):
+            deps = pkg.get(field)
+            if isinstance(deps, dict):
+                entries.extend(deps.items())
+    found = index.match(entries)
+    cves = {}
+    vulnerable = 0
+    for entry in entries:
+        ids = found.get(entry)
+        if ids:
+            vulnerable += 1
+            cves.update(dict.fromkeys(ids))
+    return {"vulnerable_deps": vulnerable, "cves": list(cves)}
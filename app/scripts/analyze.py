@@ -1,35 +1,420 @@
+import argparse
+import csv
 import os
-import pandas as pd
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
-from github_api import get_top_js_repos
-from metrics import get_metrics
-from utils import save_json
+from advisories import advisory_db_fingerprint
+from cache import load_cached_metrics, store_cached_metrics
+from exclusions import exclusion_settings
+from github_api import get_head_sha, iter_top_js_repos
+from local_inputs import iter_local_repos, local_commit_sha
+from metrics import LOC_ENGINE, analyze_fetched, fetch_repo
+from results_db import RESULTS_DB, ResultsStore
+from sharding import check_shards, in_shard, parse_shard, remove_marker, shard_label, shard_paths, write_marker
+from supervised import PROCESS_CONTEXT
+from telemetry import StageRecorder, profile_path, summarize_spans
+from utils import JsonlWriter, iter_jsonl, save_json_stream
 
 load_dotenv()
 TOKEN = os.getenv("GITHUB_TOKEN")
 
 RESULTS_DIR = "./app/results"
 os.makedirs(RESULTS_DIR, exist_ok=True)
+# telemetria e perfis ficam numa subpasta para não virarem abas no Excel
+REPORTS_DIR = f"{RESULTS_DIR}/reports"
+
+# campos que mudam sem novo commit: sempre vêm da busca atual, mesmo com cache
+REPO_METADATA_FIELDS = ("stars", "forks", "size_kb")
+
+# pipeline: downloads (threads, I/O) alimentam a análise (processos, CPU)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "2"))
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "1"))
+# máximo de repos baixados no disco ao mesmo tempo (esperando ou em análise)
+MAX_PENDING_REPOS = int(os.getenv("MAX_PENDING_REPOS", "4"))
+# entradas de fora do repo que mudam as métricas: se alguma mudar, o cache de métricas não vale mais
+# - versão do dump de advisories (ADVISORY_DB)
+# - motor de LOC (LOC_ENGINE=pygount é a referência e não pode devolver contagens do jsloc)
+# - o que a varredura exclui (EXCLUDE_DIRS, EXCLUDE_RULES, DETECT_MINIFIED)
+METRICS_CACHE_CONTEXT = {
+    "advisories": advisory_db_fingerprint(),
+    "loc_engine": LOC_ENGINE,
+    "exclusions": exclusion_settings(),
+}
+
+def prepare_repo(repo):
+    """
+    Etapa de download: resolve o commit e consulta o cache; só baixa se o repo mudou.
+    Repos locais (--input-dir) não passam pelo GitHub: o commit vem do manifesto ou do próprio
+    checkout/arquivo e o "download" é só a leitura do disco.
+    Retorna (repo, sha, métricas em cache ou None, repo baixado ou None).
+    """
+    recorder = StageRecorder()
+    local = bool(repo.get("local_path"))
+    with recorder.span("resolve"):
+        try:
+            sha = local_commit_sha(repo) if local else get_head_sha(repo["name"], repo["default_branch"])
+        except Exception as e:
+            sha = None
+            print(f"⚠️ Não foi possível resolver o commit de {repo['name']}: {e}")
+        cached = load_cached_metrics(repo["name"], sha, METRICS_CACHE_CONTEXT) if sha else None
+
+    if cached is not None:
+        print(f"♻️ {repo['name']} sem mudanças desde a última análise ({sha[:7]}), usando cache")
+        cached.update({field: repo[field] for field in REPO_METADATA_FIELDS})
+        cached["stages"] = recorder.spans
+        return repo, sha, cached, None
+    if local:
+        print(f"📂 Lendo do disco: {repo['name']} ({repo['local_path']}) ...")
+        return repo, sha, None, fetch_repo(repo, TOKEN, recorder=recorder)
+    if sha:
+        # baixa exatamente o commit resolvido, para o cache corresponder ao conteúdo analisado
+        repo = {**repo, "download_url": f"https://codeload.github.com/{repo['name']}/zip/{sha}"}
+
+    print(f"⬇️ Baixando: {repo['name']} ...")
+    return repo, sha, None, fetch_repo(repo, TOKEN, recorder=recorder)
+
+def finish_repo(repo, sha, metrics):
+    """
+    Registra o commit analisado e guarda as métricas no cache (sem a telemetria da execução).
+    Métricas parciais (orçamento de tempo do repo esgotado) não vão para o cache.
+    """
+    if sha:
+        metrics["commit_sha"] = sha
+    if sha and not metrics.get("partial"):
+        store_cached_metrics(repo["name"], sha, {k: v for k, v in metrics.items() if k != "stages"},
+                             METRICS_CACHE_CONTEXT)
+    return metrics
+
+def analyze_repo(repo, profile_dir=None):
+    """Analisa um repo, reaproveitando o cache quando o branch principal não mudou."""
+    repo, sha, cached, fetched = prepare_repo(repo)
+    if cached is not None:
+        return cached
+    print(f"📊 Analisando: {repo['name']} ...")
+    return finish_repo(repo, sha, analyze_fetched(repo, fetched, profile_dir))
+
+def run_pipeline(repos, download_workers=DOWNLOAD_WORKERS, analysis_workers=ANALYSIS_WORKERS,
+                 max_pending=MAX_PENDING_REPOS, profile_dir=None):
+    """
+    Processa os repos em pipeline: enquanto uns baixam, outros são analisados.
+    - repos pode ser uma lista ou um iterador (ex.: iter_top_js_repos), consumido à medida
+      que os itens chegam e no máximo max_pending + download_workers itens à frente do
+      consumidor;
+    - download_workers threads baixam e indexam os repos e entregam cada um à análise;
+    - analysis_workers processos calculam as métricas;
+    - no máximo max_pending repos ficam no disco ao mesmo tempo (back-pressure: o download
+      seguinte só começa quando a análise de um repo termina e libera seus arquivos);
+    - com profile_dir, a análise de cada repo grava um .prof (cProfile) nessa pasta.
+    É um gerador: devolve as métricas de cada repo na mesma ordem de `repos`, assim que
+    ficam prontas (com a telemetria das etapas em "stages"); repos que falharam ficam de fora.
+    Se o consumidor parar (exceção, close() ou Ctrl-C), os downloads pendentes são cancelados
+    e os arquivos já baixados e não enviados à análise são apagados.
+    """
+    results = {}
+    slots = threading.BoundedSemaphore(max(1, max_pending))
+    # parada antecipada (consumidor falhou, fechou o gerador ou Ctrl-C): downloads pendentes desistem
+    stop = threading.Event()
+    # só esta quantidade de repos é lida de `repos` e enviada ao download antes de ser consumida
+    lookahead = max(1, max_pending) + max(1, download_workers)
+
+    with ThreadPoolExecutor(max_workers=max(1, download_workers)) as downloads, \
+            ProcessPoolExecutor(max_workers=max(1, analysis_workers), mp_context=PROCESS_CONTEXT) as analyses:
+
+        def discard(fetched):
+            slots.release()
+            if fetched["temp_dir"] is not None:
+                shutil.rmtree(fetched["temp_dir"], ignore_errors=True)
+
+        def download(i, repo):
+            while not slots.acquire(timeout=0.5):
+                if stop.is_set():
+                    return None
+            if stop.is_set():
+                slots.release()
+                return None
+            try:
+                repo, sha, cached, fetched = prepare_repo(repo)
+            except BaseException:
+                slots.release()
+                raise
+            if cached is not None:
+                slots.release()  # cache: nada foi baixado
+                results[i] = cached
+                return None
+            if stop.is_set():
+                discard(fetched)
+                return None
+            print(f"📊 Analisando: {repo['name']} ...")
+            try:
+                analysis = analyses.submit(analyze_fetched, repo, fetched, profile_dir)
+            except BaseException:
+                # pool já encerrado: a análise nunca vai liberar o slot nem apagar os arquivos
+                discard(fetched)
+                raise
+            analysis.add_done_callback(lambda _: slots.release())
+            return analysis, repo, sha, fetched
+
+        pending = deque()
+        repo_iter = enumerate(repos)
+
+        def fill():
+            while len(pending) < lookahead:
+                item = next(repo_iter, None)
+                if item is None:
+                    return
+                i, repo = item
+                pending.append((i, repo, downloads.submit(download, i, repo)))
+
+        try:
+            fill()
+            while pending:
+                i, repo, future = pending.popleft()
+                fill()
+                try:
+                    submitted = future.result()
+                except Exception as e:
+                    print(f"❌ Falha ao baixar {repo['name']}: {e}")
+                    continue
+                if submitted is None:
+                    if i in results:
+                        yield results.pop(i)
+                    continue
+                analysis, repo, sha, fetched = submitted
+                try:
+                    metrics = finish_repo(repo, sha, analysis.result())
+                except Exception as e:
+                    print(f"❌ Falha ao analisar {repo['name']}: {e}")
+                    # se o processo de análise morreu, os arquivos baixados ainda estão no disco
+                    if fetched["temp_dir"] is not None:
+                        shutil.rmtree(fetched["temp_dir"], ignore_errors=True)
+                    continue
+                yield metrics
+        finally:
+            # antes de sair dos `with`: downloads na fila são cancelados e os em andamento
+            # desistem, em vez de esperar por slots que ninguém mais vai liberar
+            stop.set()
+            downloads.shutdown(wait=False, cancel_futures=True)
+
+def telemetry_record(metrics):
+    """Separa a telemetria das métricas: devolve o registro do telemetry.jsonl e remove "stages"."""
+    stages = metrics.pop("stages", [])
+    return {
+        "repo": metrics["repo"],
+        "commit_sha": metrics.get("commit_sha"),
+        # repos locais não têm download, mas passam pela indexação quando são analisados
+        "cached": not any(span["stage"] in ("download", "index") for span in stages),
+        **summarize_spans(stages),
+        "stages": stages,
+    }
+
+def histogram_record(metrics):
+    """Tira os histogramas exatos por função do registro (não cabem no summary plano) e devolve a linha do JSONL."""
+    return {
+        "repo": metrics["repo"],
+        "commit_sha": metrics.get("commit_sha"),
+        "function_histograms": metrics.pop("function_histograms", None),
+    }
+
+def keep_slowest_profiles(profile_dir, timings, keep):
+    """Mantém só os .prof dos `keep` repos mais lentos (tempo total das etapas) e lista-os."""
+    ranked = sorted(timings, key=lambda item: item[1], reverse=True)
+    for name, _ in ranked[keep:]:
+        try:
+            os.remove(profile_path(profile_dir, name))
+        except OSError:
+            pass
+    for name, wall in ranked[:keep]:
+        print(f"   🐢 {name}: {wall:.1f}s -> {profile_path(profile_dir, name)}")
+    if ranked[:keep]:
+        print("   (abra com: python -m pstats <arquivo.prof>)")
+
+def _iter_checkpoints(checkpoints):
+    for file_no, checkpoint in enumerate(checkpoints):
+        for line_no, record in enumerate(iter_jsonl(checkpoint)):
+            yield (file_no, line_no), record
+
+def latest_checkpoint_records(*checkpoints):
+    """
+    Lê os checkpoints em duas passadas, sem guardar as métricas em memória: a primeira
+    descobre a última linha de cada repo (no último arquivo em que aparece) e as colunas;
+    a segunda devolve os registros. Retorna (colunas, gerador de registros).
+    """
+    last_line = {}
+    columns = {}
+    for position, record in _iter_checkpoints(checkpoints):
+        last_line[record["repo"]] = position
+        columns.update(dict.fromkeys(record))
+    keep = set(last_line.values())
+
+    def records():
+        for position, record in _iter_checkpoints(checkpoints):
+            if position in keep:
+                yield record
+
+    return list(columns), records
+
+def write_summary(*checkpoints):
+    """Gera summary.json e summary.csv a partir de um ou mais checkpoints JSONL (fatias, no merge)."""
+    columns, records = latest_checkpoint_records(*checkpoints)
+    save_json_stream(f"{RESULTS_DIR}/summary.json", records())
+    with open(f"{RESULTS_DIR}/summary.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for record in records():
+            writer.writerow(record)
+
+def merge_shards(count, db_path, telemetry_path, histograms_path):
+    """
+    Junta as N fatias de uma coleta em vários nós: valida que todas terminaram, gera o
+    summary.json/csv canônico (um registro por repo), grava os registros na base principal
+    e concatena a telemetria e os histogramas por função das fatias.
+    """
+    try:
+        checkpoints = check_shards(RESULTS_DIR, count)
+    except ValueError as e:
+        raise SystemExit(f"❌ Merge cancelado: {e}")
+
+    write_summary(*checkpoints)
+    _, records = latest_checkpoint_records(*checkpoints)
+    merged = 0
+    batch = []
+    with ResultsStore(db_path) as store:
+        for record in records():
+            batch.append(record)
+            if len(batch) >= 500:
+                merged += store.upsert(batch)
+                batch = []
+        merged += store.upsert(batch) if batch else 0
+
+    for kind, out_path in (("telemetry", telemetry_path), ("histograms", histograms_path)):
+        with JsonlWriter(out_path, truncate=True) as out:
+            for index in range(1, count + 1):
+                for record in iter_jsonl(shard_paths(RESULTS_DIR, (index, count))[kind]):
+                    out.write(record)
+    print(f"🧩 {count} fatias combinadas: {merged} repos em {RESULTS_DIR}/summary.json, summary.csv e {db_path}")
 
 def main():
-    print("🔍 Buscando repositórios JavaScript mais populares...")
-    repos = get_top_js_repos(limit=5)
-    summary = []
+    p = argparse.ArgumentParser()
+    p.add_argument("--limit", type=int, default=None,
+                   help="Quantos repositórios analisar (default 5; com --input-dir, todos)")
+    p.add_argument("--input-dir", metavar="PASTA",
+                   help="Modo offline: analisa os ZIP/tar/checkouts desta pasta em vez de buscar no GitHub")
+    p.add_argument("--manifest",
+                   help="JSON/JSONL/CSV com stars, forks e size_kb de cada repo de --input-dir "
+                        "(default: <input-dir>/manifest.json, se existir)")
+    p.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS, help="Threads de download")
+    p.add_argument("--analysis-workers", type=int, default=ANALYSIS_WORKERS, help="Processos de análise")
+    p.add_argument("--max-pending", type=int, default=MAX_PENDING_REPOS,
+                   help="Máximo de repos baixados no disco ao mesmo tempo")
+    p.add_argument("--checkpoint", default=None,
+                   help="JSONL onde cada repo é gravado assim que termina (default: results/summary.jsonl; "
+                        "com --shard, um por fatia em results/shards/)")
+    p.add_argument("--resume", action="store_true",
+                   help="Retoma uma execução interrompida, pulando os repos já presentes no checkpoint")
+    p.add_argument("--telemetry", default=None,
+                   help="JSONL com o tempo, CPU, memória e contadores de cada etapa por repo "
+                        "(default: results/reports/telemetry.jsonl; com --shard, um por fatia)")
+    p.add_argument("--histograms", default=None,
+                   help="JSONL com os histogramas exatos de complexidade/NLOC/parâmetros por repo "
+                        "(default: results/reports/function_histograms.jsonl; com --shard, um por fatia)")
+    p.add_argument("--profile", type=int, default=0, metavar="N",
+                   help="Roda a análise sob o cProfile e guarda o pstats dos N repos mais lentos")
+    p.add_argument("--profile-dir", default=f"{REPORTS_DIR}/profiles", help="Pasta dos arquivos .prof")
+    p.add_argument("--db", default=None,
+                   help="Base SQLite onde cada repo é gravado, upsert por repo e commit "
+                        "(default: RESULTS_DB; com --shard, uma por fatia)")
+    p.add_argument("--shard", type=parse_shard, metavar="i/N",
+                   help="Analisa só a fatia i de N da lista (por hash do nome do repo); para vários nós")
+    p.add_argument("--merge-shards", type=int, metavar="N",
+                   help="Não analisa nada: valida e junta as N fatias no summary.json/csv e na base")
+    args = p.parse_args()
+
+    if args.shard and args.merge_shards:
+        p.error("--shard e --merge-shards não podem ser usados juntos")
+    # com --shard cada fatia grava seus próprios arquivos; sem ele, os arquivos de sempre
+    paths = shard_paths(RESULTS_DIR, args.shard) if args.shard else {
+        "checkpoint": f"{RESULTS_DIR}/summary.jsonl",
+        "telemetry": f"{REPORTS_DIR}/telemetry.jsonl",
+        "histograms": f"{REPORTS_DIR}/function_histograms.jsonl",
+        "db": RESULTS_DB,
+    }
+    args.checkpoint = args.checkpoint or paths["checkpoint"]
+    args.telemetry = args.telemetry or paths["telemetry"]
+    args.histograms = args.histograms or paths["histograms"]
+    args.db = args.db or paths["db"]
+
+    if args.merge_shards:
+        merge_shards(args.merge_shards, args.db, args.telemetry, args.histograms)
+        return
+
+    if args.input_dir:
+        manifest = args.manifest
+        if manifest is None and os.path.exists(os.path.join(args.input_dir, "manifest.json")):
+            manifest = os.path.join(args.input_dir, "manifest.json")
+        print(f"📂 Modo offline: repositórios de {args.input_dir}" + (f" (manifesto {manifest})" if manifest else ""))
+        repos = iter_local_repos(args.input_dir, manifest, limit=args.limit)
+    else:
+        print("🔍 Buscando repositórios JavaScript mais populares...")
+        # os repos chegam página a página; a análise começa antes do fim da busca
+        repos = iter_top_js_repos(limit=5 if args.limit is None else args.limit)
+    assigned = set()
+    if args.shard:
+        remove_marker(paths["marker"])
+        print(f"🧩 Fatia {args.shard[0]}/{args.shard[1]}: só os repos desta fatia serão analisados")
+
+        def shard_repos(repos):
+            for repo in repos:
+                if in_shard(repo["name"], args.shard):
+                    assigned.add(repo["name"])
+                    yield repo
+
+        repos = shard_repos(repos)
+    done = set()
+    if args.resume:
+        done = {record["repo"] for record in iter_jsonl(args.checkpoint)}
+        print(f"⏩ Retomando: {len(done)} repositórios já estão no checkpoint")
+        repos = (repo for repo in repos if repo["name"] not in done)
+
+    profile_dir = args.profile_dir if args.profile > 0 else None
+    profiled = []
+    with JsonlWriter(args.checkpoint, truncate=not args.resume) as checkpoint, \
+            JsonlWriter(args.telemetry, truncate=not args.resume) as telemetry, \
+            JsonlWriter(args.histograms, truncate=not args.resume) as histograms, \
+            ResultsStore(args.db) as store:
+        for metrics in run_pipeline(repos, args.download_workers, args.analysis_workers, args.max_pending,
+                                    profile_dir):
+            record = telemetry_record(metrics)
+            telemetry.write(record)
+            histograms.write(histogram_record(metrics))
+            checkpoint.write(metrics)
+            store.upsert([metrics])
+            done.add(metrics["repo"])
+            if not record["cached"]:
+                profiled.append((record["repo"], record["wall_s"]))
 
-    for repo in repos:
-        print(f"📊 Analisando: {repo['name']} ...")
-        metrics = get_metrics(repo, TOKEN)
-        summary.append(metrics)
+    if args.shard:
+        # o summary canônico só sai no merge, com todas as fatias
+        write_marker(paths["marker"], args.shard, assigned, done & assigned)
+        print(f"✅ {shard_label(args.shard)} concluída: {len(done & assigned)}/{len(assigned)} repos em {args.checkpoint}")
+        print(f"   Quando todas as fatias terminarem: python app/scripts/analyze.py --merge-shards {args.shard[1]}")
+        return
 
-    df = pd.DataFrame(summary)
-    df.to_csv(f"{RESULTS_DIR}/summary.csv", index=False)
-    save_json(f"{RESULTS_DIR}/summary.json", summary)
+    write_summary(args.checkpoint)
+    print(f"⏱️ Telemetria por etapa salva em {args.telemetry}")
+    if profile_dir:
+        print(f"🔬 Perfis dos {min(args.profile, len(profiled))} repos mais lentos:")
+        keep_slowest_profiles(profile_dir, profiled, args.profile)
 
-    print("✅ Análise concluída! Resultados salvos em ./app/results/summary.csv")
+    print(f"✅ Análise concluída! Resultados salvos em ./app/results/summary.csv e {args.db}")
 
-    # Gráfico opcional
+    # Gráfico opcional (último snapshot de cada repo, direto da base)
     try:
         import matplotlib.pyplot as plt
+        with ResultsStore(args.db) as store:
+            df = store.latest()[["repo", "lines_of_code", "avg_complexity"]].head(args.limit)
         df.plot(x="repo", y=["lines_of_code", "avg_complexity"], kind="bar")
         plt.title("Linhas de Código e Complexidade Média (Top JS Repos)")
         plt.tight_layout()
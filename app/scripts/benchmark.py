@@ -0,0 +1,413 @@
+"""
+Benchmarks offline de metrics.py, advisories.py e generate_results_excel.py.
+
+Gera repositórios JavaScript sintéticos (quantidade e tamanho de arquivos,
+profundidade de pastas, nº de package.json e fração de arquivos minificados
+configuráveis), mede as etapas principais e grava os tempos em JSON para
+comparar execuções. Nada é buscado na rede: o get_metrics "ponta a ponta"
+baixa o ZIP sintético de um servidor HTTP local.
+
+Uso:
+  python app/scripts/benchmark.py --files 300 --repeat 3
+  python app/scripts/benchmark.py --baseline app/results/reports/benchmark_antigo.json --max-regression 15
+"""
+import argparse
+import contextlib
+import functools
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+
+import advisories
+import cache
+import metrics
+from generate_results_excel import (
+    EXPORT_FORMATS, add_derived_sheets, list_result_files, load_sheets, parse_cves_column, write_workbook,
+)
+from utils import save_json
+
+REPORTS_DIR = "./app/results/reports"
+BENCHMARK_FORMAT_VERSION = 1
+
+IDENTIFIERS = ["value", "items", "config", "result", "index", "node", "options", "state", "data", "count"]
+PACKAGE_NAMES = ["lodash", "react", "express", "axios", "chalk", "debug", "moment", "uuid", "yargs", "semver",
+                 "minimist", "commander", "glob", "rimraf", "webpack", "babel-core", "jest", "mocha", "eslint"]
+
+
+# --- gerador de repositórios sintéticos ---
+
+def _js_statement(rng, depth=0):
+    """Uma instrução JS (lista de linhas) com desvios suficientes para o lizard ter o que contar."""
+    name = rng.choice(IDENTIFIERS)
+    other = rng.choice(IDENTIFIERS)
+    kind = rng.randrange(8 if depth < 2 else 4)
+    if kind == 0:
+        return [f"const {name}{rng.randrange(100)} = {other}.map((x) => x * {rng.randrange(10)});"]
+    if kind == 1:
+        return [f"let {name} = '{other} ' + \"literal\" + `tmpl ${{{other}}}`;"]
+    if kind == 2:
+        return [f"{name} = /^[a-z]+\\d*$/i.test({other}) ? {other} / 2 : null;"]
+    if kind == 3:
+        return [f"{other}.push({{ key: '{name}', size: {rng.randrange(1000)} }});"]
+    body = [f"  {line}" for _ in range(rng.randint(1, 3)) for line in _js_statement(rng, depth + 1)]
+    if kind == 4:
+        return [f"if ({name} && {other} > {rng.randrange(50)}) {{"] + body + ["} else {", f"  {name} = {other};", "}"]
+    if kind == 5:
+        return [f"for (let i = 0; i < {other}.length; i++) {{"] + body + ["}"]
+    if kind == 6:
+        return [f"switch ({name}) {{", "  case 1:"] + body + ["    break;", "  default:", f"    {other}++;", "}"]
+    return ["try {"] + body + ["} catch (err) {", "  console.error(err);", "}"]
+
+
+def _js_source(rng, lines, minified=False):
+    """Conteúdo de um arquivo .js com ~`lines` linhas (uma linha só se minificado)."""
+    out = []
+    while len(out) < lines:
+        fn = f"{rng.choice(IDENTIFIERS)}Handler{len(out)}"
+        if not minified and rng.random() < 0.3:
+            out.append(f"// {fn}: comentário de linha")
+        if not minified and rng.random() < 0.2:
+            out += ["/*", f" * Documentação de {fn}.", " */"]
+        out.append(f"function {fn}({rng.choice(IDENTIFIERS)}, {rng.choice(IDENTIFIERS)}) {{")
+        for _ in range(rng.randint(2, 6)):
+            out += [f"  {line}" for line in _js_statement(rng)]
+        out += ["  return value;", "}", ""]
+    if minified:
+        return "".join(line.strip() for line in out) + "\n"
+    return "\n".join(out) + "\n"
+
+
+def _package_json(rng):
+    names = rng.sample(PACKAGE_NAMES, rng.randint(2, 10))
+    dependencies = {n: f"^{rng.randint(0, 9)}.{rng.randint(0, 20)}.0" for n in names[: len(names) // 2 + 1]}
+    dev_dependencies = {n: f"~{rng.randint(0, 9)}.0.{rng.randint(0, 9)}" for n in names[len(names) // 2 + 1:]}
+    return {"name": f"pkg-{rng.randrange(10_000)}", "version": "1.0.0",
+            "dependencies": dependencies, "devDependencies": dev_dependencies}
+
+
+def generate_repo(root, files=200, lines=150, depth=3, package_jsons=3, minified_ratio=0.1, seed=42):
+    """
+    Cria em `root` um repositório sintético e devolve o caminho da pasta.
+    O mesmo `seed` sempre gera o mesmo conteúdo, então execuções são comparáveis.
+    """
+    rng = random.Random(seed)
+    repo_dir = Path(root)
+    dirs = [repo_dir]
+    for i in range(max(1, files // 10)):
+        parts = [f"mod{i}"] + [f"sub{rng.randrange(4)}" for _ in range(rng.randint(0, max(0, depth - 1)))]
+        dirs.append(repo_dir.joinpath("src", *parts))
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+
+    for i in range(files):
+        minified = rng.random() < minified_ratio
+        name = f"file{i}.min.js" if minified else f"file{i}.js"
+        (rng.choice(dirs) / name).write_text(_js_source(rng, lines, minified), encoding="utf-8")
+
+    # o primeiro package.json fica na raiz, os demais em pastas aleatórias (monorepo)
+    for i, d in enumerate([repo_dir] + rng.sample(dirs[1:], min(len(dirs) - 1, max(0, package_jsons - 1)))):
+        if i >= package_jsons:
+            break
+        (d / "package.json").write_text(json.dumps(_package_json(rng), indent=2), encoding="utf-8")
+    return str(repo_dir)
+
+
+def zip_repo(repo_dir, zip_path, prefix="synthetic-main"):
+    """Compacta o repo como o codeload do GitHub (tudo dentro de uma pasta raiz)."""
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(Path(repo_dir).rglob("*")):
+            if path.is_file():
+                zf.write(path, f"{prefix}/{path.relative_to(repo_dir).as_posix()}")
+    return zip_path
+
+
+def generate_results(results_dir, rows=5000, seed=42):
+    """Cria summary.json e dependencies_cve_summary.json sintéticos com `rows` repos."""
+    rng = random.Random(seed)
+    summary = []
+    cve_summary = []
+    for i in range(rows):
+        repo = f"owner{i % 97}/repo{i}"
+        deps = rng.randint(0, 60)
+        vulnerable = rng.randint(0, min(deps, 5))
+        cves = [f"GHSA-{rng.randrange(16 ** 4):04x}-{rng.randrange(16 ** 4):04x}-{rng.randrange(16 ** 4):04x}"
+                for _ in range(vulnerable)]
+        summary.append({"repo": repo, "stars": rng.randint(100, 200_000), "forks": rng.randint(0, 50_000),
+                        "size_kb": rng.randint(10, 2_000_000), "lines_of_code": rng.randint(100, 800_000),
+                        "avg_complexity": round(rng.uniform(1, 6), 2), "dependencies": deps})
+        cve_summary.append({"repo": repo, "stars": summary[-1]["stars"], "forks": summary[-1]["forks"],
+                            "dependencies": deps, "dev_dependencies": rng.randint(0, 200),
+                            "vulnerable_deps": vulnerable, "cves": cves,
+                            "path_usado": rng.choice(["", "packages/core"])})
+    save_json(os.path.join(results_dir, "summary.json"), summary)
+    save_json(os.path.join(results_dir, "dependencies_cve_summary.json"), cve_summary)
+    return cve_summary
+
+
+def generate_advisories(zip_path, per_package=20, seed=42):
+    """Dump OSV sintético (zip, como o npm/all.zip do osv.dev) com advisories para PACKAGE_NAMES."""
+    rng = random.Random(seed)
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in PACKAGE_NAMES:
+            for i in range(per_package):
+                major = rng.randint(0, 9)
+                advisory_id = f"GHSA-{rng.randrange(16 ** 4):04x}-{rng.randrange(16 ** 4):04x}-{i:04x}"
+                events = [{"introduced": f"{major}.0.0"}, {"fixed": f"{major}.{rng.randint(1, 20)}.{rng.randint(0, 9)}"}]
+                zf.writestr(f"{advisory_id}.json", json.dumps({
+                    "id": advisory_id,
+                    "aliases": [f"CVE-2024-{rng.randrange(100_000)}"],
+                    "affected": [{"package": {"ecosystem": "npm", "name": name},
+                                  "ranges": [{"type": "SEMVER", "events": events}]}],
+                }))
+    return zip_path
+
+
+# --- medição ---
+
+def measure(name, fn, repeat, warmup=0):
+    """Roda `fn` `warmup` vezes sem medir e `repeat` vezes medindo; devolve tempos de parede/CPU."""
+    for _ in range(warmup):
+        fn()
+    wall = []
+    cpu = []
+    result = None
+    for _ in range(repeat):
+        started_wall = time.perf_counter()
+        started_cpu = time.process_time()
+        result = fn()
+        cpu.append(time.process_time() - started_cpu)
+        wall.append(time.perf_counter() - started_wall)
+    entry = {
+        "repeat": repeat,
+        "warmup": warmup,
+        "min_s": round(min(wall), 6),
+        "median_s": round(statistics.median(wall), 6),
+        "max_s": round(max(wall), 6),
+        "cpu_median_s": round(statistics.median(cpu), 6),
+    }
+    if isinstance(result, (int, float, str)):
+        entry["result"] = result
+    print(f"⏱️  {name}: mediana {entry['median_s']:.4f}s (min {entry['min_s']:.4f}s, {repeat}x)")
+    return entry
+
+
+@functools.lru_cache(maxsize=None)
+def _quiet_handler(directory):
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve_directory(directory):
+    """Sobe um servidor HTTP local (porta livre) servindo `directory`; devolve o servidor."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _quiet_handler(directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_benchmarks(args, work_dir):
+    """Gera as entradas sintéticas em `work_dir` e mede cada etapa; devolve {nome: tempos}."""
+    selected = set(args.only.split(",")) if args.only else None
+    results = {}
+
+    def bench(name, fn):
+        if selected is None or name.split("[")[0] in selected or name in selected:
+            results[name] = measure(name, fn, args.repeat, args.warmup)
+
+    print("🏗️  Gerando repositório sintético...")
+    repo_dir = generate_repo(os.path.join(work_dir, "repo"), files=args.files, lines=args.lines, depth=args.depth,
+                             package_jsons=args.package_json, minified_ratio=args.minified_ratio, seed=args.seed)
+    index = metrics.build_file_index(repo_dir)
+
+    bench("build_file_index", lambda: len(metrics.build_file_index(repo_dir)["by_ext"].get(".js", [])))
+    bench("find_package_json_files", lambda: len(metrics.find_package_json_files(repo_dir, index=index)))
+    bench("count_js_loc", lambda: metrics.count_js_loc(repo_dir, index=index))
+    if args.pygount:
+        bench("count_js_loc[pygount]", lambda: metrics.count_js_loc(repo_dir, index=index, engine="pygount"))
+    bench("calc_js_complexity", lambda: round(metrics.calc_js_complexity(repo_dir, index=index), 6))
+
+    # ponta a ponta: download (servidor local) + extração/índice + análise
+    serve_dir = os.path.join(work_dir, "serve")
+    os.makedirs(serve_dir)
+    zip_repo(repo_dir, os.path.join(serve_dir, "repo.zip"))
+    server = serve_directory(serve_dir)
+    repo = {"name": "synthetic/repo", "stars": 0, "forks": 0, "size_kb": 0,
+            "download_url": f"http://127.0.0.1:{server.server_address[1]}/repo.zip"}
+    warm_cache_dir = os.path.join(work_dir, "cache-warm")
+
+    def end_to_end(from_zip=False, cache_dir=None):
+        # cache por arquivo vazio a cada chamada (frio) ou compartilhado entre chamadas (quente)
+        cache.CACHE_DIR = cache_dir or tempfile.mkdtemp(dir=work_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return metrics.get_metrics(repo, "offline", from_zip=from_zip)["lines_of_code"]
+
+    original_cache_dir = cache.CACHE_DIR
+    try:
+        bench("get_metrics", end_to_end)
+        bench("get_metrics[zip]", lambda: end_to_end(from_zip=True))
+        if cache.FILE_CACHE_ENABLED and (selected is None or "get_metrics" in selected):
+            end_to_end(cache_dir=warm_cache_dir)
+            bench("get_metrics[warm]", lambda: end_to_end(cache_dir=warm_cache_dir))
+    finally:
+        cache.CACHE_DIR = original_cache_dir
+        server.shutdown()
+
+    # vulnerabilidades: carga do índice OSV e verificação dos package.json de `results_rows` repos
+    advisory_zip = generate_advisories(os.path.join(work_dir, "advisories.zip"), args.advisories, seed=args.seed)
+    rng = random.Random(args.seed)
+    packages = [_package_json(rng) for _ in range(args.results_rows)]
+
+    def load_index():
+        with contextlib.redirect_stdout(io.StringIO()):
+            index = advisories._load_index.__wrapped__(advisory_zip, None)
+        return index.advisories
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        advisory_index = advisories.load_advisory_index(advisory_zip)
+
+    def scan():
+        # caches zerados: mede a verificação "fria", como num processo que acabou de carregar o índice
+        advisories.parse_range.cache_clear()
+        advisories.min_version.cache_clear()
+        advisory_index._verdicts.clear()
+        return sum(advisories.scan_packages([pkg], advisory_index)["vulnerable_deps"] for pkg in packages)
+
+    bench("load_advisory_index", load_index)
+    bench("scan_packages", scan)
+
+    print("🏗️  Gerando resultados sintéticos...")
+    results_dir = os.path.join(work_dir, "results")
+    cve_rows = generate_results(results_dir, rows=args.results_rows, seed=args.seed)
+    cves = [row["cves"] for row in cve_rows]
+    # as três formas em que a coluna aparece: lista (JSON), string JSON (CSV) e literal Python (str(list))
+    as_json = pd.Series([json.dumps(c) for c in cves])
+    as_literal = pd.Series([repr(c) for c in cves])
+    bench("parse_cves_column[list]", lambda: len(parse_cves_column(pd.Series(cves))))
+    bench("parse_cves_column[json]", lambda: len(parse_cves_column(as_json)))
+    bench("parse_cves_column[literal]", lambda: len(parse_cves_column(as_literal)))
+
+    files = list_result_files(Path(results_dir))
+    with contextlib.redirect_stdout(io.StringIO()):
+        sheets = load_sheets(files)
+
+    def load():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return len(load_sheets(files))
+
+    def export(stream=False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_workbook(add_derived_sheets(load_sheets(files)), Path(work_dir) / "all_results.xlsx", stream=stream)
+        return os.path.getsize(Path(work_dir) / "all_results.xlsx")
+
+    derived = add_derived_sheets({k: v.copy() for k, v in sheets.items()})
+
+    def write_format(fmt):
+        writer, _, _ = EXPORT_FORMATS[fmt]
+        writer(derived, Path(work_dir) / f"export-{fmt}")
+        return fmt
+
+    bench("load_sheets", load)
+    bench("add_derived_sheets", lambda: len(add_derived_sheets({k: v.copy() for k, v in sheets.items()})))
+    bench("excel_export", export)
+    bench("excel_export[stream]", lambda: export(stream=True))
+    for fmt in ("parquet", "csv.gz", "sqlite"):
+        if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            continue  # dependência opcional
+        bench(f"export[{fmt}]", lambda fmt=fmt: write_format(fmt))
+    return results
+
+
+def compare(report, baseline, max_regression=None):
+    """
+    Compara as medianas com um relatório anterior; imprime a variação de cada etapa.
+    Retorna a lista de etapas que pioraram mais que `max_regression` (%).
+    """
+    regressions = []
+    for name, entry in report["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or not previous.get("median_s"):
+            continue
+        change = (entry["median_s"] - previous["median_s"]) / previous["median_s"] * 100
+        marker = "🔺" if change > 0 else "🔻"
+        print(f"{marker} {name}: {previous['median_s']:.4f}s → {entry['median_s']:.4f}s ({change:+.1f}%)")
+        if max_regression is not None and change > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark offline das etapas de coleta e do export para Excel")
+    p.add_argument("--files", type=int, default=200, help="Arquivos .js no repositório sintético")
+    p.add_argument("--lines", type=int, default=150, help="Linhas aproximadas por arquivo")
+    p.add_argument("--depth", type=int, default=3, help="Profundidade máxima das pastas")
+    p.add_argument("--package-json", type=int, default=3, help="Quantidade de package.json")
+    p.add_argument("--minified-ratio", type=float, default=0.1, help="Fração de arquivos .min.js (0 a 1)")
+    p.add_argument("--results-rows", type=int, default=5000, help="Repos nos resultados sintéticos (CVE/Excel)")
+    p.add_argument("--advisories", type=int, default=20, help="Advisories OSV sintéticos por pacote")
+    p.add_argument("--repeat", type=int, default=3, help="Repetições de cada medição")
+    p.add_argument("--warmup", type=int, default=1, help="Execuções descartadas antes de medir")
+    p.add_argument("--seed", type=int, default=42, help="Semente do gerador")
+    p.add_argument("--only", help="Etapas separadas por vírgula (ex.: count_js_loc,excel_export)")
+    p.add_argument("--pygount", action="store_true", help="Mede também o count_js_loc com o pygount")
+    p.add_argument("--out", default=f"{REPORTS_DIR}/benchmark.json", help="Arquivo JSON com os tempos")
+    p.add_argument("--baseline", help="Relatório anterior para comparação")
+    p.add_argument("--max-regression", type=float, help="Falha (código 1) se alguma etapa piorar mais que N%%")
+    p.add_argument("--keep", action="store_true", help="Não apaga a pasta temporária com as entradas geradas")
+    args = p.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        benchmarks = run_benchmarks(args, work_dir)
+    finally:
+        if args.keep:
+            print(f"📁 Entradas mantidas em {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "version": BENCHMARK_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "loc_engine": metrics.LOC_ENGINE,
+            "lizard_workers": metrics.LIZARD_WORKERS,
+            "file_cache": cache.FILE_CACHE_ENABLED,
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "max_regression", "keep")},
+        "benchmarks": benchmarks,
+    }
+    save_json(args.out, report)
+    print(f"✅ Relatório salvo em {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print(f"❌ Regressão acima de {args.max_regression}% em: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+from utils import save_json
+
+# cache persistente de resultados, fora de results/ para não virar aba no Excel
+CACHE_DIR = os.getenv("METRICS_CACHE_DIR", "./app/cache")
+
+# incrementar quando o cálculo das métricas mudar, invalidando o que já está em cache
+METRICS_CACHE_VERSION = 9
+
+
+def _metrics_cache_path(full_name):
+    return os.path.join(CACHE_DIR, "metrics", full_name.replace("/", "__") + ".json")
+
+
+def load_cached_metrics(full_name, sha, context=None):
+    """
+    Retorna as métricas salvas para o repo se foram calculadas no mesmo commit, senão None.
+    `context` identifica entradas de fora do repo (ex.: a versão do dump de advisories):
+    se mudou, as métricas são recalculadas mesmo sem commit novo.
+    """
+    path = _metrics_cache_path(full_name)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("sha") != sha or entry.get("version") != METRICS_CACHE_VERSION:
+        return None
+    if entry.get("context") != context:
+        return None
+    return entry.get("metrics")
+
+
+def store_cached_metrics(full_name, sha, metrics, context=None):
+    """Guarda a saída completa de get_metrics para o repo no commit `sha`."""
+    save_json(_metrics_cache_path(full_name), {
+        "repo": full_name,
+        "sha": sha,
+        "version": METRICS_CACHE_VERSION,
+        "context": context,
+        "metrics": metrics,
+    })
+
+
+# cache por arquivo: resultados do pygount/lizard indexados pelo hash do conteúdo,
+# compartilhado entre todos os repos (cópias vendorizadas de jQuery/lodash são analisadas uma vez)
+FILE_CACHE_ENABLED = os.getenv("FILE_CACHE", "1") == "1"
+FILE_CACHE_VERSION = 2
+
+
+def content_digest(data):
+    """Hash do conteúdo de um arquivo usado como chave do cache por arquivo."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class FileResultCache:
+    """
+    Cache persistente (SQLite) de resultados por arquivo.
+    Cada entrada é (tipo, hash do conteúdo) -> valor em JSON; o tipo leva a versão,
+    então mudar a forma de um resultado só exige trocar FILE_CACHE_VERSION.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "files.sqlite")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        # WAL permite vários processos de análise lendo/escrevendo ao mesmo tempo
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_results ("
+            " kind TEXT NOT NULL, digest TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (kind, digest)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def _kind(self, kind):
+        return f"{kind}:v{FILE_CACHE_VERSION}"
+
+    def get_many(self, kind, digests):
+        """Busca vários hashes de uma vez; retorna {digest: valor} só com os encontrados."""
+        found = {}
+        digests = list(dict.fromkeys(digests))
+        # SQLite limita o nº de parâmetros por consulta
+        for i in range(0, len(digests), 500):
+            batch = digests[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT digest, value FROM file_results WHERE kind = ? AND digest IN ({placeholders})",
+                [self._kind(kind), *batch],
+            )
+            for digest, value in rows:
+                found[digest] = json.loads(value)
+        return found
+
+    def put_many(self, kind, values):
+        """Grava {digest: valor} numa única transação."""
+        if not values:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_results (kind, digest, value) VALUES (?, ?, ?)",
+                [(self._kind(kind), digest, json.dumps(value)) for digest, value in values.items()],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def open_file_cache():
+    """Abre o cache por arquivo, ou None se estiver desabilitado (FILE_CACHE=0)."""
+    return FileResultCache() if FILE_CACHE_ENABLED else None
@@ -0,0 +1,201 @@
+"""
+Distribuições das métricas por função (complexidade ciclomática, NLOC, nº de parâmetros).
+
+Os valores são inteiros pequenos, então o "sketch" é um histograma exato: um array de
+contagens indexado pelo valor (mais um dict para os raros valores grandes). Ocupa o mesmo
+espaço com 100 ou 1 milhão de funções, dá quantis exatos e juntar dois histogramas
+(lotes de workers paralelos ou repos diferentes) é somar as contagens.
+
+Os histogramas exatos de cada repo vão para app/results/reports/function_histograms.jsonl
+(fora do summary, que só recebe os quantis e as faixas). Uso (distribuição somando todos os repos):
+  python app/scripts/distributions.py app/results/reports/function_histograms.jsonl
+"""
+import argparse
+import json
+import math
+from array import array
+
+# valores abaixo disso ficam no array denso; acima, num dict (funções gigantes são raras)
+DENSE_LIMIT = 512
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+# faixas do histograma resumido de complexidade (limites inferiores), nas faixas usuais de risco
+COMPLEXITY_BUCKETS = (1, 2, 3, 5, 8, 11, 21, 51)
+
+
+class IntHistogram:
+    """Histograma exato e mesclável de inteiros não negativos."""
+
+    __slots__ = ("dense", "sparse", "count", "total")
+
+    def __init__(self):
+        self.dense = array("Q", bytes(8 * DENSE_LIMIT))
+        self.sparse = {}
+        self.count = 0
+        self.total = 0
+
+    def add(self, value, times=1):
+        value = max(0, int(value))
+        if value < DENSE_LIMIT:
+            self.dense[value] += times
+        else:
+            self.sparse[value] = self.sparse.get(value, 0) + times
+        self.count += times
+        self.total += value * times
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Soma as contagens de `other` (o resultado é o de ter visto os dois conjuntos)."""
+        for value, times in other.items():
+            self.add(value, times)
+        return self
+
+    def items(self):
+        """(valor, contagem) em ordem crescente de valor, só os presentes."""
+        for value, times in enumerate(self.dense):
+            if times:
+                yield value, times
+        for value in sorted(self.sparse):
+            yield value, self.sparse[value]
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def max(self):
+        if self.sparse:
+            return max(self.sparse)
+        for value in range(DENSE_LIMIT - 1, -1, -1):
+            if self.dense[value]:
+                return value
+        return None
+
+    def quantiles(self, qs):
+        """Quantis por posto mais próximo: o menor valor com pelo menos q·n observações até ele."""
+        if not self.count:
+            return [None] * len(qs)
+        # a folga evita que 0.9 * 10 = 9.000000000000002 vire o posto 10
+        targets = sorted((max(1, math.ceil(q * self.count - 1e-9)), i) for i, q in enumerate(qs))
+        result = [None] * len(qs)
+        seen = 0
+        pending = iter(targets)
+        target, slot = next(pending)
+        for value, times in self.items():
+            seen += times
+            while seen >= target:
+                result[slot] = value
+                try:
+                    target, slot = next(pending)
+                except StopIteration:
+                    return result
+        return result
+
+    def summary(self, prefix):
+        """{prefix_p50, prefix_p90, prefix_p99, prefix_max} para o dict de métricas."""
+        values = self.quantiles(list(QUANTILES.values()))
+        stats = {f"{prefix}_{name}": value for name, value in zip(QUANTILES, values)}
+        stats[f"{prefix}_max"] = self.max()
+        return stats
+
+    def buckets(self, lower_bounds=COMPLEXITY_BUCKETS):
+        """Contagens por faixa ("1", "3-4", "51+"...), inclusive faixas vazias."""
+        labels = []
+        for i, low in enumerate(lower_bounds):
+            high = lower_bounds[i + 1] - 1 if i + 1 < len(lower_bounds) else None
+            labels.append(str(low) if high == low else f"{low}-{high}" if high is not None else f"{low}+")
+        counts = dict.fromkeys(labels, 0)
+        for value, times in self.items():
+            for i in range(len(lower_bounds) - 1, -1, -1):
+                if value >= lower_bounds[i]:
+                    counts[labels[i]] += times
+                    break
+        return counts
+
+    def to_dict(self):
+        """Forma serializável (JSON) e mesclável: {"valor": contagem} só com os valores presentes."""
+        return {str(value): times for value, times in self.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for value, times in (data or {}).items():
+            histogram.add(int(value), int(times))
+        return histogram
+
+
+class FunctionStats:
+    """Histogramas de complexidade, NLOC e parâmetros das funções de um repo (ou de vários)."""
+
+    FIELDS = ("complexity", "nloc", "params")
+
+    def __init__(self):
+        self.complexity = IntHistogram()
+        self.nloc = IntHistogram()
+        self.params = IntHistogram()
+
+    def add_functions(self, functions):
+        """Acrescenta as funções de um arquivo: [(complexidade, nloc, parâmetros), ...]."""
+        for complexity, nloc, params in functions:
+            self.complexity.add(complexity)
+            self.nloc.add(nloc)
+            self.params.add(params)
+
+    def merge(self, other):
+        for field in self.FIELDS:
+            getattr(self, field).merge(getattr(other, field))
+        return self
+
+    def to_metrics(self):
+        """
+        Campos escalares do resultado de um repo: quantis e máximo de cada métrica e a contagem
+        de funções por faixa de complexidade (complexity_bucket_1, complexity_bucket_3_4, ...,
+        complexity_bucket_51_plus). Os histogramas exatos (to_dict) ficam fora do registro plano.
+        """
+        metrics = {"functions": self.complexity.count}
+        for field in self.FIELDS:
+            metrics.update(getattr(self, field).summary(field))
+        for label, count in self.complexity.buckets().items():
+            metrics[bucket_column(label)] = count
+        return metrics
+
+    def to_dict(self):
+        return {field: getattr(self, field).to_dict() for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for field in cls.FIELDS:
+            setattr(stats, field, IntHistogram.from_dict((data or {}).get(field)))
+        return stats
+
+
+def bucket_column(label):
+    """Coluna de uma faixa do histograma: "3-4" -> "complexity_bucket_3_4", "51+" -> "complexity_bucket_51_plus"."""
+    return "complexity_bucket_" + label.replace("-", "_").replace("+", "_plus")
+
+
+def merge_records(records):
+    """Junta os histogramas exatos ("function_histograms") de vários repos num único FunctionStats."""
+    stats = FunctionStats()
+    for record in records:
+        histograms = record.get("function_histograms")
+        if isinstance(histograms, str):
+            histograms = json.loads(histograms)
+        if histograms:
+            stats.merge(FunctionStats.from_dict(histograms))
+    return stats
+
+
+def main():
+    p = argparse.ArgumentParser(description="Distribuição das métricas por função somando vários repos")
+    p.add_argument("files", nargs="+", help="JSONL com os histogramas por repo (reports/function_histograms.jsonl)")
+    args = p.parse_args()
+
+    from results_db import read_records
+    stats = merge_records(record for path in args.files for record in read_records(path))
+    print(json.dumps(stats.to_metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Regras de exclusão da varredura: o que não é código-fonte do projeto não entra no índice
+de arquivos e, portanto, não passa pelo LOC, pelo lizard nem pela leitura de dependências.
+
+- pastas por nome (node_modules, dist, build, coverage, fixtures...), podadas antes de
+  descer nelas;
+- regras do próprio repo: .gitignore (arquivos gerados que acabaram versionados) e
+  .gitattributes com linguist-vendored / linguist-generated, como o GitHub Linguist;
+- arquivos minificados, detectados por nome (.min.js) ou pelo início do conteúdo
+  (linhas muito longas e quase nenhum espaço em branco).
+
+Cada coisa pulada é contada, para o resultado mostrar quanto do repo ficou de fora.
+"""
+import os
+import re
+
+DEFAULT_EXCLUDE_DIRS = (
+    "node_modules", "bower_components", "jspm_packages", "vendor", "third_party",
+    "dist", "build", "coverage", ".nyc_output", "fixtures", "__fixtures__", ".git",
+)
+# lista separada por vírgulas; vazio desliga a poda por nome de pasta
+EXCLUDE_DIRS = tuple(
+    name.strip() for name in os.getenv("EXCLUDE_DIRS", ",".join(DEFAULT_EXCLUDE_DIRS)).split(",") if name.strip()
+)
+# EXCLUDE_RULES=0 ignora .gitignore/.gitattributes; DETECT_MINIFIED=0 não procura minificados
+EXCLUDE_RULES = os.getenv("EXCLUDE_RULES", "1") == "1"
+DETECT_MINIFIED = os.getenv("DETECT_MINIFIED", "1") == "1"
+
+MINIFIED_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+MINIFIED_SUFFIXES = (".min.js", "-min.js", ".bundle.js")
+# só o começo do arquivo é lido; arquivos pequenos não pesam na análise e nem são verificados
+MINIFIED_SAMPLE_BYTES = 64 * 1024
+MINIFIED_MIN_SIZE = 2048
+MINIFIED_LINE_LENGTH = 250
+MINIFIED_WHITESPACE_RATIO = 0.05
+
+GITIGNORE = ".gitignore"
+GITATTRIBUTES = ".gitattributes"
+LINGUIST_ATTRIBUTES = {"linguist-vendored": "vendored", "linguist-generated": "generated"}
+
+
+def exclusion_settings():
+    """Configuração das exclusões (entra na chave do cache de métricas: mudou, o repo é reanalisado)."""
+    return {"dirs": sorted(EXCLUDE_DIRS), "rules": EXCLUDE_RULES, "minified": DETECT_MINIFIED}
+
+
+def is_minified(sample):
+    """Heurística sobre os primeiros bytes: linha média muito longa ou quase sem espaços em branco."""
+    if len(sample) < MINIFIED_MIN_SIZE:
+        return False
+    lines = sample.count(b"\n") + 1
+    if len(sample) / lines > MINIFIED_LINE_LENGTH:
+        return True
+    whitespace = sample.count(b" ") + sample.count(b"\t") + sample.count(b"\n") + sample.count(b"\r")
+    return whitespace / len(sample) < MINIFIED_WHITESPACE_RATIO
+
+
+def _translate_glob(pattern):
+    """Glob do git (*, ?, [..], **) para regex, com "/" como separador."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape("["))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                out.append("[" + ("^" + body[1:] if body[0] == "!" else body) + "]")
+                i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def compile_pattern(pattern):
+    """
+    Padrão do .gitignore/.gitattributes -> (regex, negado, só pastas), ou None para linhas
+    vazias e comentários. Sem "/" no meio o padrão vale em qualquer nível; com "/" é relativo
+    à pasta do arquivo de regras.
+    """
+    pattern = pattern.rstrip("\n\r")
+    if not pattern.endswith("\\ "):
+        pattern = pattern.rstrip(" ")
+    if not pattern or pattern.startswith("#"):
+        return None
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = _translate_glob(pattern)
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return re.compile(regex + r"\Z"), negate, dir_only
+
+
+def _relative(base, path):
+    """Caminho relativo à pasta `base` ("" é a raiz), ou None se `path` não está dentro dela."""
+    if not base:
+        return path
+    if path.startswith(base + "/"):
+        return path[len(base) + 1:]
+    return None
+
+
+class ExclusionRules:
+    """
+    Decide o que fica fora do índice de um repo. Os caminhos são relativos à raiz do repo,
+    com "/". As regras de .gitignore/.gitattributes são acrescentadas conforme a varredura
+    encontra esses arquivos (da raiz para as subpastas: as mais profundas têm precedência).
+    """
+
+    def __init__(self, exclude_dirs=None, use_rules=None, detect_minified=None):
+        self.exclude_dirs = frozenset(EXCLUDE_DIRS if exclude_dirs is None else exclude_dirs)
+        self.use_rules = EXCLUDE_RULES if use_rules is None else use_rules
+        self.detect_minified = DETECT_MINIFIED if detect_minified is None else detect_minified
+        self.ignore_rules = []  # (pasta base, regex, negado, só pastas)
+        self.attribute_rules = []  # (pasta base, regex, {"vendored": bool, "generated": bool})
+        self.skipped = {"dirs": 0, "ignored": 0, "vendored": 0, "generated": 0, "minified": 0}
+
+    @classmethod
+    def disabled(cls):
+        """Sem nenhuma exclusão (comportamento antigo da varredura)."""
+        return cls(exclude_dirs=(), use_rules=False, detect_minified=False)
+
+    def wants(self, file_name):
+        """Se `file_name` é um arquivo de regras que a varredura deve ler antes dos demais."""
+        return self.use_rules and file_name in (GITIGNORE, GITATTRIBUTES)
+
+    def add_rules_file(self, rel_path, text):
+        base, _, file_name = rel_path.rpartition("/")
+        if file_name == GITIGNORE:
+            self.add_gitignore(base, text)
+        elif file_name == GITATTRIBUTES:
+            self.add_gitattributes(base, text)
+
+    def add_gitignore(self, base, text):
+        for line in text.splitlines():
+            compiled = compile_pattern(line)
+            if compiled is not None:
+                self.ignore_rules.append((base, *compiled))
+
+    def add_gitattributes(self, base, text):
+        for line in text.splitlines():
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            attributes = {}
+            for attr in parts[1:]:
+                value = not attr.startswith(("-", "!")) and not attr.endswith("=false")
+                name = attr.lstrip("-!").split("=", 1)[0]
+                if name in LINGUIST_ATTRIBUTES:
+                    attributes[LINGUIST_ATTRIBUTES[name]] = value
+            compiled = compile_pattern(parts[0]) if attributes else None
+            if compiled is not None:
+                self.attribute_rules.append((base, compiled[0], attributes))
+
+    def _ignored(self, rel_path, is_dir):
+        ignored = False
+        for base, regex, negate, dir_only in self.ignore_rules:
+            if dir_only and not is_dir:
+                continue
+            relative = _relative(base, rel_path)
+            if relative is not None and regex.match(relative):
+                ignored = not negate
+        return ignored
+
+    def prune_dir(self, rel_dir):
+        """True se a pasta não deve ser percorrida (nome excluído ou ignorada pelo .gitignore)."""
+        name = rel_dir.rpartition("/")[2]
+        if name in self.exclude_dirs or (self.use_rules and self.ignore_rules and self._ignored(rel_dir, True)):
+            self.skipped["dirs"] += 1
+            return True
+        return False
+
+    def skip_file(self, rel_path):
+        """True se o arquivo é ignorado pelo .gitignore ou marcado como vendored/generated."""
+        if not self.use_rules:
+            return False
+        if self.ignore_rules and self._ignored(rel_path, False):
+            self.skipped["ignored"] += 1
+            return True
+        state = {}
+        for base, regex, attributes in self.attribute_rules:
+            relative = _relative(base, rel_path)
+            if relative is not None and regex.match(relative):
+                state.update(attributes)
+        for kind in ("vendored", "generated"):
+            if state.get(kind):
+                self.skipped[kind] += 1
+                return True
+        return False
+
+    def skip_minified(self, file_name, size, read_sample):
+        """
+        True se o arquivo JS/TS é minificado: pelo nome (.min.js) ou, se tiver pelo menos
+        MINIFIED_MIN_SIZE bytes, pelo começo do conteúdo (`read_sample()` devolve os primeiros
+        MINIFIED_SAMPLE_BYTES e só é chamada quando o nome não resolve).
+        """
+        if not self.detect_minified or not file_name.endswith(MINIFIED_EXTENSIONS):
+            return False
+        minified = file_name.endswith(MINIFIED_SUFFIXES)
+        if not minified and size >= MINIFIED_MIN_SIZE:
+            try:
+                minified = is_minified(read_sample())
+            except OSError:
+                return False
+        if minified:
+            self.skipped["minified"] += 1
+        return minified
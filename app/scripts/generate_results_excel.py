@@ -5,14 +5,22 @@ Gera um Excel único com todas as tabelas encontradas em results/ e algumas agre
 Uso:
   pip install pandas openpyxl
   python scripts/generate_results_excel.py --results-dir results --out results/all_results.xlsx
+  python scripts/generate_results_excel.py --results-dir results --stream        (xlsx com memória constante)
+  python scripts/generate_results_excel.py --results-dir results --format parquet   (requer pyarrow)
+  python scripts/generate_results_excel.py --results-dir results --format csv.gz | sqlite
 """
+from fnmatch import fnmatch
 from pathlib import Path
 import pandas as pd
 import json
 import argparse
 import sys
 import ast
+import re
 import numpy as np
+import hashlib
+
+from utils import JsonStream, iter_jsonl
 
 def resolve_results_dir(input_dir: str) -> Path:
     requested = Path(input_dir)
@@ -37,77 +45,191 @@ def read_csv(path: Path) -> pd.DataFrame:
     except Exception:
         return pd.read_csv(path, engine="python", encoding="utf-8", on_bad_lines="skip")
 
-def read_json(path: Path) -> pd.DataFrame:
+# records per DataFrame chunk when reading JSON/JSONL; only one chunk of Python objects is alive at a time
+JSON_CHUNK_ROWS = 50_000
+
+def iter_json_records(path: Path):
+    """
+    Yields the records of a JSON results file without loading it whole: the items of a
+    top-level array, or of the first list-valued key of a top-level object. An object
+    without any list yields itself as a single record.
+    """
     with open(path, "r", encoding="utf-8") as fh:
-        data = json.load(fh)
-    if isinstance(data, list):
-        return pd.json_normalize(data)
-    elif isinstance(data, dict):
-        for k, v in data.items():
-            if isinstance(v, list):
-                return pd.json_normalize(v)
-        return pd.json_normalize([data])
-    else:
-        return pd.DataFrame()
+        stream = JsonStream(fh)
+        char = stream.peek()
+        if char == "[":
+            yield from stream.iter_array()
+        elif char == "{":
+            stream.pos += 1
+            fields = {}
+            while stream.peek() != "}":
+                key = stream.value()
+                stream.expect(":")
+                if stream.peek() == "[":
+                    yield from stream.iter_array()
+                    return
+                fields[key] = stream.value()
+                if stream.peek() == ",":
+                    stream.pos += 1
+            yield fields
 
-def parse_cves_column(series: pd.Series) -> pd.Series:
+def records_to_frame(records, schema: dict = None, chunk_rows: int = JSON_CHUNK_ROWS) -> pd.DataFrame:
     """
-    Robust parsing for the 'cves' column. Returns a Series where each cell is a Python list.
-    Handles None, NaN, list/tuple/ndarray/Series, JSON strings, Python-literal lists, and bracketed comma strings.
+    Builds a DataFrame from an iterable of records, normalizing and casting the declared columns
+    `chunk_rows` at a time; the undeclared columns are inferred once, on the whole frame.
     """
-    def is_nan_scalar(val):
-        # True only for scalar NaN (float('nan')), not for arrays/Series
-        return isinstance(val, float) and np.isnan(val)
+    frames = []
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            frames.append(apply_schema(pd.json_normalize(chunk), schema or {}, infer=False))
+            chunk = []
+    if chunk or not frames:
+        frames.append(apply_schema(pd.json_normalize(chunk), schema or {}, infer=False))
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return apply_schema(df, schema or {}, cast=False)
 
-    def parse_cell(x):
-        # None
-        if x is None:
-            return []
-        # scalar NaN
-        if is_nan_scalar(x):
+def read_json(path: Path, schema: dict = None, chunk_rows: int = JSON_CHUNK_ROWS) -> pd.DataFrame:
+    """Reads a JSON (array, or object holding one) or JSONL results file incrementally."""
+    if path.suffix.lower() == ".jsonl":
+        return records_to_frame(iter_jsonl(path), schema, chunk_rows)
+    return records_to_frame(iter_json_records(path), schema, chunk_rows)
+
+def _is_nan_scalar(val):
+    # True only for scalar NaN (float('nan')), not for arrays/Series
+    return isinstance(val, float) and np.isnan(val)
+
+def _parse_cves_cell(x):
+    """
+    Per-cell parser, used for list-like cells and for strings the bulk path can't handle.
+    Handles None, NaN, list/tuple/ndarray/Series, JSON strings, Python-literal lists, and bracketed comma strings.
+    """
+    # None
+    if x is None:
+        return []
+    # scalar NaN
+    if _is_nan_scalar(x):
+        return []
+    # if already list/tuple/ndarray/Series -> normalize to list of strings
+    if isinstance(x, (list, tuple, np.ndarray, pd.Series)):
+        try:
+            seq = list(x)
+        except Exception:
             return []
-        # if already list/tuple/ndarray/Series -> normalize to list of strings
+        out = []
+        for v in seq:
+            if v is None:
+                continue
+            if _is_nan_scalar(v):
+                continue
+            sval = str(v).strip()
+            if sval:
+                out.append(sval.strip("'\""))
+        return out
+    # otherwise coerce to str and try parse
+    s = str(x).strip()
+    if not s or s.lower() == "nan":
+        return []
+    # try JSON first
+    try:
+        parsed = json.loads(s)
+        if isinstance(parsed, list):
+            return [str(p).strip() for p in parsed if p is not None and str(p).strip()]
+    except Exception:
+        pass
+    # try Python literal eval (single quotes)
+    try:
+        parsed = ast.literal_eval(s)
+        if isinstance(parsed, list):
+            return [str(p).strip() for p in parsed if p is not None and str(p).strip()]
+    except Exception:
+        pass
+    # fallback: remove brackets and split by comma
+    s2 = s.strip("[] ")
+    if not s2:
+        return []
+    parts = [p.strip().strip("'\"") for p in s2.split(",") if p.strip()]
+    return parts
+
+# a whole cell that is a flat list of plain quoted strings (no escapes): '["a", "b"]' or "['a', 'b']"
+_QUOTED_LIST_PATTERNS = {
+    quote: re.compile(r"\s*\[\s*(?:{q}[^{q}\\]*{q}\s*(?:,\s*{q}[^{q}\\]*{q}\s*)*)?\]\s*".format(q=quote))
+    for quote in ('"', "'")
+}
+# one token of such a list
+_QUOTED_TOKEN_PATTERNS = {
+    quote: re.compile(r"{q}([^{q}\\]*){q}".format(q=quote))
+    for quote in ('"', "'")
+}
+
+def detect_cves_encoding(series: pd.Series) -> str:
+    """
+    Looks at the first non-empty cell to tell how the column is encoded:
+    'list' (real lists, e.g. from JSON files), 'json' or 'literal' (strings such as
+    '["a"]' or "['a']", e.g. from CSV files), 'text' (anything else) or 'empty'.
+    """
+    for x in series:
+        if x is None or _is_nan_scalar(x):
+            continue
         if isinstance(x, (list, tuple, np.ndarray, pd.Series)):
-            try:
-                seq = list(x)
-            except Exception:
-                return []
-            out = []
-            for v in seq:
-                if v is None:
-                    continue
-                if is_nan_scalar(v):
-                    continue
-                sval = str(v).strip()
-                if sval:
-                    out.append(sval.strip("'\""))
-            return out
-        # otherwise coerce to str and try parse
+            return "list"
         s = str(x).strip()
         if not s or s.lower() == "nan":
-            return []
-        # try JSON first
-        try:
-            parsed = json.loads(s)
-            if isinstance(parsed, list):
-                return [str(p).strip() for p in parsed if p is not None and str(p).strip()]
-        except Exception:
-            pass
-        # try Python literal eval (single quotes)
-        try:
-            parsed = ast.literal_eval(s)
-            if isinstance(parsed, list):
-                return [str(p).strip() for p in parsed if p is not None and str(p).strip()]
-        except Exception:
-            pass
-        # fallback: remove brackets and split by comma
-        s2 = s.strip("[] ")
-        if not s2:
-            return []
-        parts = [p.strip().strip("'\"") for p in s2.split(",") if p.strip()]
-        return parts
+            continue
+        if s.startswith("["):
+            if '"' in s:
+                return "json"
+            if "'" in s:
+                return "literal"
+            if not s.strip("[] "):
+                continue  # an empty list says nothing about the quoting
+        return "text"
+    return "empty"
 
-    return series.apply(parse_cell)
+def parse_cves_column(series: pd.Series) -> pd.DataFrame:
+    """
+    Parses the 'cves' column straight into a long table with one row per CVE:
+    'row' (position of the cell in `series`) and 'cve'. Cells without CVEs produce no rows.
+
+    The encoding is detected once; string cells that are plain quoted lists are then
+    tokenized in bulk with a single regex pass over the joined column, and only the
+    remaining cells (escapes, odd formats, real lists) go through the per-cell parser.
+    """
+    values = series.tolist()
+    encoding = detect_cves_encoding(series)
+    value_rows = []
+    cves = []
+    pending = range(len(values))
+
+    if encoding in ("json", "literal"):
+        quote = '"' if encoding == "json" else "'"
+        matches = _QUOTED_LIST_PATTERNS[quote].fullmatch
+        bulk_rows = [i for i, x in enumerate(values) if isinstance(x, str) and matches(x)]
+        if bulk_rows:
+            bulk_cells = [values[i] for i in bulk_rows]
+            # inside these cells the quote char only delimits tokens, so tokens = quotes / 2;
+            # no token can span two cells, so the whole column is tokenized in one pass
+            counts = [cell.count(quote) // 2 for cell in bulk_cells]
+            value_rows.append(np.repeat(np.asarray(bulk_rows, dtype=np.int64), counts))
+            cves.extend(token.strip() for token in _QUOTED_TOKEN_PATTERNS[quote].findall("".join(bulk_cells)))
+        is_pending = np.ones(len(values), dtype=bool)
+        is_pending[bulk_rows] = False
+        pending = np.flatnonzero(is_pending)
+
+    fallback_rows = []
+    for i in pending:
+        parsed = _parse_cves_cell(values[i])
+        fallback_rows.extend([i] * len(parsed))
+        cves.extend(parsed)
+    value_rows.append(np.asarray(fallback_rows, dtype=np.int64))
+
+    rows = np.concatenate(value_rows)
+    cves = np.asarray(cves, dtype=object)
+    keep = cves != ""
+    # stable sort: CVEs keep their order inside each cell
+    order = np.argsort(rows[keep], kind="stable")
+    return pd.DataFrame({"row": rows[keep][order], "cve": cves[keep][order]})
 
 def make_sheet_name(name: str, existing: set) -> str:
     base = name[:31]
@@ -120,49 +242,134 @@ def make_sheet_name(name: str, existing: set) -> str:
     existing.add(candidate)
     return candidate
 
-def main():
-    p = argparse.ArgumentParser()
-    p.add_argument("--results-dir", default="results", help="Diretório com arquivos coletados (default: results)")
-    p.add_argument("--out", "-o", default="results/all_results.xlsx", help="Caminho do Excel de saída")
-    p.add_argument("--top-n", type=int, default=50, help="Quantos top repos na aba top_vulnerable (default 50)")
-    args = p.parse_args()
+# explicit column types for the files written by the collection scripts (matched by file stem);
+# columns not listed here are inferred from a sample
+RESULT_SCHEMAS = {
+    "summary*": {
+        "repo": "str", "stars": "int", "forks": "int", "size_kb": "int", "lines_of_code": "int",
+        "avg_complexity": "float", "dependencies": "int", "dev_dependencies": "int", "direct_deps": "int",
+        "transitive_deps": "int", "unique_deps": "int", "vulnerable_deps": "int", "cves": "list", "commit_sha": "str",
+        "functions": "int",
+        **{f"{field}_{stat}": "int" for field in ("complexity", "nloc", "params") for stat in ("p50", "p90", "p99", "max")},
+        **{f"complexity_bucket_{label}": "int" for label in ("1", "2", "3_4", "5_7", "8_10", "11_20", "21_50", "51_plus")},
+    },
+    "dependencies_cve*": {
+        "repo": "str", "stars": "int", "forks": "int", "dependencies": "int", "dev_dependencies": "int",
+        "vulnerable_deps": "int", "cves": "list", "path_usado": "str",
+    },
+    "repo_metrics": {
+        "repo": "str", "snapshot": "str", "analyzed_at": "str", "stars": "int", "forks": "int", "size_kb": "int",
+        "lines_of_code": "int", "avg_complexity": "float", "dependencies": "int", "dev_dependencies": "int",
+        "direct_deps": "int", "transitive_deps": "int", "unique_deps": "int",
+        "vulnerable_deps": "int", "cves": "list", "path_usado": "str", "commit_sha": "str", "extra": "str",
+    },
+}
+# results database written by analyze.py (see results_db.py), looked up inside the results dir
+RESULTS_DB_NAME = "results.sqlite"
+# result files whose records analyze.py also writes to the database: skipped when reading the
+# database, every other file in results/ (CVE summaries, lizard runs...) is still loaded
+DB_COVERED_STEMS = {"summary"}
+INFERENCE_SAMPLE_SIZE = 1000
 
-    results_dir = resolve_results_dir(args.results_dir)
-    if not results_dir.exists() or not results_dir.is_dir():
-        print("Diretório results não encontrado em:", results_dir)
-        sys.exit(1)
+def schema_for(stem: str) -> dict:
+    for pattern, schema in RESULT_SCHEMAS.items():
+        if fnmatch(stem.lower(), pattern):
+            return schema
+    return {}
 
-    files = sorted([f for f in results_dir.iterdir() if f.is_file() and f.suffix.lower() in {".csv", ".json"}])
-    if not files:
-        print("Nenhum CSV/JSON encontrado em", results_dir)
-        sys.exit(1)
+def apply_schema(df: pd.DataFrame, schema: dict, infer: bool = True, cast: bool = True) -> pd.DataFrame:
+    """
+    Casts each column to its declared type ('int' -> nullable Int64, 'float'; 'str'/'list' are
+    left as read). With `infer`, other object columns are converted only if a sample of their
+    first values looks numeric; non-numeric cells are then kept as they were. `cast=False`
+    only infers (the declared columns were already cast, e.g. chunk by chunk while reading).
+    """
+    for col in df.columns:
+        kind = schema.get(col)
+        if kind in ("int", "float"):
+            if not cast:
+                continue
+            conv = pd.to_numeric(df[col], errors="coerce")
+            if kind == "int":
+                try:
+                    conv = conv.astype("Int64")
+                except (TypeError, ValueError):
+                    pass  # fractional values: keep as float rather than truncate
+            else:
+                conv = conv.astype("float64")
+            df[col] = conv
+        elif infer and kind is None and df[col].dtype == object:
+            sample = df[col].iloc[:INFERENCE_SAMPLE_SIZE]
+            try:
+                if pd.to_numeric(sample, errors="coerce").notna().any():
+                    conv = pd.to_numeric(df[col], errors="coerce")
+                    df[col] = conv.where(conv.notna(), df[col])
+            except Exception:
+                pass
+    return df
+
+def list_result_files(results_dir: Path) -> list:
+    files = [f for f in results_dir.iterdir() if f.is_file() and f.suffix.lower() in {".csv", ".json", ".jsonl"}]
+    # a .jsonl is read only when no CSV/JSON has the same name (summary.jsonl is analyze.py's
+    # checkpoint, already consolidated into summary.json/csv)
+    stems = {f.stem for f in files if f.suffix.lower() != ".jsonl"}
+    return sorted(f for f in files if f.suffix.lower() != ".jsonl" or f.stem not in stems)
 
+def load_sheets(files) -> dict:
+    """
+    Reads each CSV/JSON/JSONL into a DataFrame keyed by file stem, typed by RESULT_SCHEMAS (see
+    apply_schema). JSON inputs are typed while they are read (read_json), CSVs once read.
+    """
     sheets = {}
-    print("Arquivos encontrados em", results_dir)
     for f in files:
         print(" -", f.name)
         try:
             if f.suffix.lower() == ".csv":
                 df = read_csv(f)
+                df.columns = [str(c).strip() for c in df.columns]
+                df = apply_schema(df, schema_for(f.stem))
             else:
-                df = read_json(f)
+                df = read_json(f, schema_for(f.stem))
+                df.columns = [str(c).strip() for c in df.columns]
         except Exception as e:
             print("   Erro lendo", f.name, "->", e)
             continue
-        df.columns = [str(c).strip() for c in df.columns]
-        for col in df.columns:
-            if df[col].dtype == object:
-                try:
-                    conv = pd.to_numeric(df[col], errors="coerce")
-                    if conv.notna().sum() > 0:
-                        df[col] = conv.where(conv.notna(), df[col])
-                except Exception:
-                    pass
         sheets[f.stem] = df
+    return sheets
 
-    # detect cve-like files
-    cve_candidates = [k for k in sheets.keys() if "dependencies_cve" in k.lower() or "cve" in k.lower()]
-    existing_sheet_names = set()
+def files_not_in_db(files) -> list:
+    """The result files the database does not cover (see DB_COVERED_STEMS)."""
+    return [f for f in files if f.stem.lower() not in DB_COVERED_STEMS]
+
+def load_db_sheets(db_path: Path) -> dict:
+    """Latest snapshot of each repo from the results database, as a single 'repo_metrics' sheet."""
+    from results_db import ResultsStore
+    with ResultsStore(str(db_path)) as store:
+        df = store.latest()
+    return {"repo_metrics": apply_schema(df, schema_for("repo_metrics"))}
+
+DERIVED_SHEETS = ("cves_exploded", "vuln_by_repo", "top_vulnerable")
+
+def cve_candidate_keys(sheets: dict) -> list:
+    """The CVE-like sheets the derived sheets are built from (by name, or by having a 'cves' column)."""
+    return [
+        k for k in sheets.keys()
+        if "dependencies_cve" in k.lower() or "cve" in k.lower() or "cves" in [str(c).lower() for c in sheets[k].columns]
+    ]
+
+def _has_vulnerability_data(df: pd.DataFrame) -> bool:
+    cols = [c for c in df.columns if str(c).lower() in ("cves", "vulnerable_deps")]
+    return any(df[c].notna().any() for c in cols)
+
+def add_derived_sheets(sheets: dict, top_n: int = 50) -> dict:
+    """
+    Adds cves_exploded, vuln_by_repo and top_vulnerable built from the CVE-like sheets. Sheets
+    whose CVE/vulnerable_deps columns are all empty (e.g. the database when ADVISORY_DB was not
+    set) are used only if no other sheet has that data.
+    """
+    cve_candidates = cve_candidate_keys(sheets)
+    with_data = [k for k in cve_candidates if _has_vulnerability_data(sheets[k])]
+    cve_candidates = with_data or cve_candidates
     cves_exploded_df = None
     vuln_by_repo_df = None
     top_vuln_df = None
@@ -179,21 +386,15 @@ def main():
                 cves_col = name
                 break
         if cves_col:
-            df["_cves_list"] = parse_cves_column(df[cves_col])
-            exploded = df.copy()
-            exploded = exploded.explode("_cves_list")
-            exploded = exploded.rename(columns={"_cves_list": "cve"})
-            keep_cols = []
-            for c in ["repo", "Repo", "repository", "path_usado"]:
-                if c in exploded.columns and c not in keep_cols:
-                    keep_cols.append(c)
-            if "cve" not in exploded.columns:
-                exploded["cve"] = None
-            selected_cols = [c for c in keep_cols if c in exploded.columns] + ["cve"]
-            if selected_cols:
-                cves_exploded_df = exploded[selected_cols].reset_index(drop=True)
-            else:
-                cves_exploded_df = exploded.reset_index(drop=True)
+            cves_long = parse_cves_column(df[cves_col])
+            keep_cols = [c for c in ["repo", "Repo", "repository", "path_usado"] if c in df.columns]
+            # repos without CVEs still get one row (empty cve), like DataFrame.explode on an empty list
+            empty_rows = np.setdiff1d(np.arange(len(df)), cves_long["row"].to_numpy())
+            rows = np.concatenate([cves_long["row"].to_numpy(), empty_rows])
+            cve_values = np.concatenate([cves_long["cve"].to_numpy(dtype=object), np.full(len(empty_rows), np.nan, dtype=object)])
+            order = np.argsort(rows, kind="stable")
+            cves_exploded_df = df[keep_cols].iloc[rows[order]].reset_index(drop=True)
+            cves_exploded_df["cve"] = cve_values[order]
         # vuln summary
         def find_col_possibilities(df_local, names):
             for n in names:
@@ -205,21 +406,22 @@ def main():
         d_col = find_col_possibilities(df, ["dependencies", "deps", "num_dependencies"])
         repo_col = find_col_possibilities(df, ["repo", "repository", "full_name"])
         if repo_col:
-            vuln_by_repo_df = pd.DataFrame()
-            vuln_by_repo_df["repo"] = df[repo_col].astype(str)
-            if d_col and d_col in df.columns:
-                vuln_by_repo_df["dependencies"] = pd.to_numeric(df[d_col], errors="coerce").fillna(0).astype(int)
-            else:
-                vuln_by_repo_df["dependencies"] = 0
-            if v_col and v_col in df.columns:
-                vuln_by_repo_df["vulnerable_deps"] = pd.to_numeric(df[v_col], errors="coerce").fillna(0).astype(int)
-            else:
-                vuln_by_repo_df["vulnerable_deps"] = 0
-            vuln_by_repo_df["vuln_ratio"] = vuln_by_repo_df.apply(
-                lambda r: (r["vulnerable_deps"] / r["dependencies"]) if r["dependencies"] > 0 else None, axis=1
-            )
+            def count_column(col):
+                if col is None:
+                    return np.zeros(len(df), dtype=int)
+                return pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy(dtype=int)
+            dependencies = count_column(d_col)
+            vulnerable = count_column(v_col)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                vuln_ratio = np.where(dependencies > 0, vulnerable / dependencies, np.nan)
+            vuln_by_repo_df = pd.DataFrame({
+                "repo": df[repo_col].astype(str).to_numpy(),
+                "dependencies": dependencies,
+                "vulnerable_deps": vulnerable,
+                "vuln_ratio": vuln_ratio,
+            })
             vuln_by_repo_df = vuln_by_repo_df.sort_values("vulnerable_deps", ascending=False).reset_index(drop=True)
-            top_vuln_df = vuln_by_repo_df.head(args.top_n)
+            top_vuln_df = vuln_by_repo_df.head(top_n)
 
     if cves_exploded_df is not None:
         sheets["cves_exploded"] = cves_exploded_df
@@ -227,42 +429,324 @@ def main():
         sheets["vuln_by_repo"] = vuln_by_repo_df
     if top_vuln_df is not None:
         sheets["top_vulnerable"] = top_vuln_df
+    return sheets
+
+README_LINES = [
+    "Arquivo gerado automaticamente por scripts/generate_results_excel.py",
+    "",
+    "Cada aba equivale a um arquivo original ou a uma tabela derivada:",
+    "- cves_exploded: cada CVE em linha separada com a coluna 'repo' (se o arquivo original tinha cves)",
+    "- vuln_by_repo: resumo por repo (dependencies, vulnerable_deps, vuln_ratio)",
+    "- top_vulnerable: top N repositórios por número de dependências vulneráveis",
+    "- outras abas: uma aba por CSV/JSON lido",
+    "",
+    "Abra este Excel no Power BI: Home -> Get Data -> Excel -> selecione este arquivo.",
+]
+# rows handed to the writers at a time in the streaming/chunked modes
+WRITE_CHUNK_SIZE = 10_000
+
+def _is_nested(value) -> bool:
+    return isinstance(value, (list, tuple, dict, set, np.ndarray))
+
+def stringify_nested_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns `df` with list/dict cells (e.g. 'cves' read from JSON) turned into their str() form,
+    which is what every writer here needs. Only the affected columns are copied.
+    """
+    nested = [col for col in df.columns if df[col].dtype == object and df[col].map(_is_nested).any()]
+    if not nested:
+        return df
+    return df.assign(**{col: df[col].map(lambda v: str(v) if _is_nested(v) else v) for col in nested})
 
-    out_path = Path(args.out).resolve()
+def _cell_value(value):
+    """Python value openpyxl can store; missing values become empty cells."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if _is_nested(value):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def write_workbook(sheets: dict, out_path: Path, stream: bool = False, chunk_size: int = WRITE_CHUNK_SIZE) -> None:
+    """
+    Writes one sheet per table plus a README sheet. Raises ModuleNotFoundError without openpyxl.
+    With stream=True the workbook is written by openpyxl in write_only mode, `chunk_size` rows at
+    a time, so memory stays flat regardless of the number of rows (headers are not styled).
+    """
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    existing_sheet_names = set()
+    readme = pd.DataFrame({"info": README_LINES})
+    if stream:
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        for name, df in [*sheets.items(), ("README", readme)]:
+            ws = wb.create_sheet(make_sheet_name(name, existing_sheet_names))
+            ws.append([str(c) for c in df.columns])
+            for start in range(0, len(df), chunk_size):
+                for row in df.iloc[start:start + chunk_size].itertuples(index=False, name=None):
+                    ws.append([_cell_value(v) for v in row])
+        wb.save(out_path)
+        return
+    with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+        for name, df in [*sheets.items(), ("README", readme)]:
+            sheet_name = make_sheet_name(name, existing_sheet_names)
+            df = stringify_nested_columns(df)
+            try:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+            except Exception:
+                # last resort (e.g. odd objects): only the text columns are converted, not a full copy
+                df.astype({c: str for c in df.columns if df[c].dtype == object}).to_excel(
+                    writer, sheet_name=sheet_name, index=False)
 
+def write_parquet(sheets: dict, out_dir: Path, chunk_size: int = WRITE_CHUNK_SIZE) -> None:
+    """One <sheet>.parquet per table. Needs pyarrow (or fastparquet); raises ImportError otherwise."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in sheets.items():
+        path = out_dir / f"{name}.parquet"
+        try:
+            # list columns (cves) are kept as real lists: Parquet has a native list type
+            df.to_parquet(path, index=False, row_group_size=chunk_size)
+        except (TypeError, ValueError):
+            # mixed-type columns (numbers and text in the same column) are stored as text
+            mixed = [c for c in df.columns if df[c].dtype == object and not df[c].map(_is_nested).any()]
+            df.astype({c: str for c in mixed}).to_parquet(path, index=False, row_group_size=chunk_size)
+
+def write_csv_gz(sheets: dict, out_dir: Path, chunk_size: int = WRITE_CHUNK_SIZE) -> None:
+    """One gzip-compressed <sheet>.csv.gz per table."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in sheets.items():
+        df.to_csv(out_dir / f"{name}.csv.gz", index=False, compression="gzip", chunksize=chunk_size)
+
+def write_sqlite(sheets: dict, out_path: Path, chunk_size: int = WRITE_CHUNK_SIZE) -> None:
+    """One table per sheet in a single SQLite file (replaced if it exists)."""
+    import sqlite3
+    from contextlib import closing
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if out_path.exists():
+        out_path.unlink()
+    # the connection's own context manager only commits; closing() releases the file handle
+    with closing(sqlite3.connect(out_path)) as conn, conn:
+        for name, df in sheets.items():
+            stringify_nested_columns(df).to_sql(name, conn, index=False, chunksize=chunk_size)
+
+# --format -> (writer, default output, package to install when the writer's dependency is missing)
+EXPORT_FORMATS = {
+    "xlsx": (write_workbook, "results/all_results.xlsx", "openpyxl"),
+    "parquet": (write_parquet, "results/all_results_parquet", "pyarrow"),
+    "csv.gz": (write_csv_gz, "results/all_results_csv", None),
+    "sqlite": (write_sqlite, "results/all_results.sqlite", None),
+}
+
+# --- incremental regeneration ---
+# Each input (CSV/JSON file or the results database) is fingerprinted; its parsed frames are
+# pickled next to a manifest, so later runs only re-parse inputs whose content changed,
+# recompute the derived sheets only when a CVE-like input changed, and skip the export
+# altogether when nothing did.
+MANIFEST_VERSION = 1
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "cache" / "excel"
+
+def _digest(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(cache_dir: Path) -> dict:
     try:
-        with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
-            for name, df in sheets.items():
-                sheet_name = make_sheet_name(name, existing_sheet_names)
-                try:
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-                except Exception:
-                    df2 = df.copy().astype(str)
-                    df2.to_excel(writer, sheet_name=sheet_name, index=False)
-            readme_text = [
-                "Arquivo gerado automaticamente por scripts/generate_results_excel.py",
-                "",
-                "Cada aba equivale a um arquivo original ou a uma tabela derivada:",
-                "- cves_exploded: cada CVE em linha separada com a coluna 'repo' (se o arquivo original tinha cves)",
-                "- vuln_by_repo: resumo por repo (dependencies, vulnerable_deps, vuln_ratio)",
-                "- top_vulnerable: top N repositórios por número de dependências vulneráveis",
-                "- outras abas: uma aba por CSV/JSON lido",
-                "",
-                "Abra este Excel no Power BI: Home -> Get Data -> Excel -> selecione este arquivo.",
-            ]
-            rd = pd.DataFrame({"info": readme_text})
-            sheet_name = make_sheet_name("README", existing_sheet_names)
-            rd.to_excel(writer, sheet_name=sheet_name, index=False)
+        with open(cache_dir / "manifest.json", "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "inputs": {}, "derived": {}, "outputs": {}}
+
+def save_manifest(cache_dir: Path, manifest: dict) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_dir / "manifest.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    tmp.replace(cache_dir / "manifest.json")
+
+def input_fingerprint(path: Path, entry: dict) -> tuple:
+    """
+    Returns (fingerprint, stat) for an input. Unchanged size and mtime reuse the recorded hash;
+    otherwise the file is hashed. The database is fingerprinted by the stat of the file and its
+    WAL, since recent writes may live only in the WAL.
+    """
+    if path.suffix.lower() == ".sqlite":
+        parts = [path, path.with_name(path.name + "-wal")]
+        stat = [[p.stat().st_size, p.stat().st_mtime_ns] if p.exists() else None for p in parts]
+        return _digest(stat), stat
+    st = path.stat()
+    stat = [st.st_size, st.st_mtime_ns]
+    if entry and entry.get("stat") == stat:
+        return entry["fingerprint"], stat
+    return file_sha256(path), stat
+
+def _load_input(path: Path) -> dict:
+    if path.suffix.lower() == ".sqlite":
+        return load_db_sheets(path)
+    return load_sheets([path])
+
+def _frame_path(cache_dir: Path, key: str, sheet: str) -> Path:
+    return cache_dir / f"{_digest([key, sheet])[:20]}.pkl"
+
+def load_inputs_cached(inputs: list, manifest: dict, cache_dir: Path) -> tuple:
+    """
+    Loads every input, re-parsing only the ones whose fingerprint changed.
+    Returns (sheets, {sheet name: fingerprint of the input it came from}).
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    sheets = {}
+    sheet_fingerprints = {}
+    seen = set()
+    for path in inputs:
+        key = str(path.resolve())
+        seen.add(key)
+        entry = manifest["inputs"].get(key)
+        fingerprint, stat = input_fingerprint(path, entry)
+        frames = None
+        if entry and entry["fingerprint"] == fingerprint:
+            try:
+                frames = {name: pd.read_pickle(_frame_path(cache_dir, key, name)) for name in entry["sheets"]}
+                print(" -", path.name, "(cache)")
+            except (OSError, ValueError, EOFError):
+                frames = None
+        if frames is None:
+            frames = _load_input(path)
+            for name, df in frames.items():
+                df.to_pickle(_frame_path(cache_dir, key, name))
+        manifest["inputs"][key] = {"fingerprint": fingerprint, "stat": stat, "sheets": list(frames)}
+        for name, df in frames.items():
+            sheets[name] = df
+            sheet_fingerprints[name] = fingerprint
+    # inputs that disappeared from results/
+    for key in list(manifest["inputs"]):
+        if key not in seen:
+            for name in manifest["inputs"].pop(key)["sheets"]:
+                _frame_path(cache_dir, key, name).unlink(missing_ok=True)
+    return sheets, sheet_fingerprints
+
+def add_derived_sheets_cached(sheets: dict, sheet_fingerprints: dict, top_n: int, manifest: dict, cache_dir: Path) -> tuple:
+    """add_derived_sheets, reusing the cached derived frames while the CVE-like inputs are unchanged."""
+    key = _digest({
+        "candidates": {k: sheet_fingerprints.get(k) for k in cve_candidate_keys(sheets)},
+        "top_n": top_n,
+    })
+    cached = manifest["derived"]
+    derived = None
+    if cached.get("key") == key:
+        try:
+            derived = {name: pd.read_pickle(_frame_path(cache_dir, "derived", name)) for name in cached["sheets"]}
+        except (OSError, ValueError, EOFError):
+            derived = None
+    if derived is None:
+        derived = {k: v for k, v in add_derived_sheets(dict(sheets), top_n).items() if k not in sheets}
+        for name, df in derived.items():
+            df.to_pickle(_frame_path(cache_dir, "derived", name))
+        manifest["derived"] = {"key": key, "sheets": list(derived)}
+    sheets.update(derived)
+    sheet_fingerprints.update({name: key for name in derived})
+    return sheets, sheet_fingerprints
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--results-dir", default="results", help="Diretório com arquivos coletados (default: results)")
+    p.add_argument("--format", "-f", choices=list(EXPORT_FORMATS), default="xlsx",
+                   help="Formato de saída: xlsx (default), parquet / csv.gz (um arquivo por aba) ou sqlite")
+    p.add_argument("--out", "-o", default=None,
+                   help="Caminho de saída (default: results/all_results.xlsx; pasta para parquet e csv.gz)")
+    p.add_argument("--source", choices=["auto", "db", "files"], default="auto",
+                   help=f"De onde ler: db = base SQLite ({RESULTS_DB_NAME}) mais os CSV/JSON que ela não cobre "
+                        f"(tudo exceto summary.*); files = só os CSV/JSON; auto (default) = db se a base existir")
+    p.add_argument("--db", default=None, help=f"Caminho da base (default: <results-dir>/{RESULTS_DB_NAME})")
+    p.add_argument("--top-n", type=int, default=50, help="Quantos top repos na aba top_vulnerable (default 50)")
+    p.add_argument("--stream", action="store_true",
+                   help="xlsx: grava em modo streaming (write_only), com memória constante")
+    p.add_argument("--chunk-size", type=int, default=WRITE_CHUNK_SIZE,
+                   help=f"Linhas gravadas por vez (default {WRITE_CHUNK_SIZE})")
+    p.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                   help="Manifesto e tabelas já lidas, para regenerar só o que mudou (default: app/cache/excel)")
+    p.add_argument("--no-cache", action="store_true", help="Relê e regrava tudo, ignorando o manifesto")
+    args = p.parse_args()
+
+    results_dir = resolve_results_dir(args.results_dir)
+    if not results_dir.exists() or not results_dir.is_dir():
+        print("Diretório results não encontrado em:", results_dir)
+        sys.exit(1)
+
+    db_path = Path(args.db) if args.db else results_dir / RESULTS_DB_NAME
+    use_db = args.source == "db" or (args.source == "auto" and db_path.is_file())
+    if use_db:
+        print("Lendo a base de resultados", db_path)
+        inputs = [db_path] + files_not_in_db(list_result_files(results_dir))
+        if len(inputs) > 1:
+            print("e os arquivos que ela não cobre, em", results_dir)
+    else:
+        inputs = list_result_files(results_dir)
+        if not inputs:
+            print("Nenhum CSV/JSON encontrado em", results_dir)
+            sys.exit(1)
+        print("Arquivos encontrados em", results_dir)
+
+    writer, default_out, package = EXPORT_FORMATS[args.format]
+    out_path = Path(args.out or default_out).resolve()
+    cache_dir = Path(args.cache_dir).resolve()
+    manifest = load_manifest(cache_dir) if not args.no_cache else None
+    output_params = {"format": args.format, "stream": args.stream, "top_n": args.top_n}
+    try:
+        if manifest is None:
+            sheets = {}
+            for path in inputs:
+                sheets.update(_load_input(path))
+            sheets = add_derived_sheets(sheets, args.top_n)
+            sheet_fingerprints = {}
+        else:
+            sheets, sheet_fingerprints = load_inputs_cached(inputs, manifest, cache_dir)
+            sheets, sheet_fingerprints = add_derived_sheets_cached(
+                sheets, sheet_fingerprints, args.top_n, manifest, cache_dir)
     except ModuleNotFoundError as e:
-        print("Erro: biblioteca necessária para escrever Excel não encontrada:", e)
-        print("Instale com: pip install openpyxl")
+        print("Erro: biblioteca necessária para ler a base não encontrada:", e)
+        print("Instale com: pip install sqlalchemy")
+        sys.exit(1)
+
+    previous = manifest["outputs"].get(str(out_path)) if manifest is not None else None
+    to_write = sheets
+    if previous and previous.get("params") == output_params and out_path.exists():
+        if previous.get("sheets") == sheet_fingerprints:
+            save_manifest(cache_dir, manifest)
+            print("Nenhuma entrada mudou; saída mantida:", out_path)
+            return
+        if args.format in ("parquet", "csv.gz") and set(previous["sheets"]) == set(sheet_fingerprints):
+            # one file per sheet: only the sheets whose inputs changed are rewritten
+            to_write = {k: v for k, v in sheets.items() if previous["sheets"].get(k) != sheet_fingerprints[k]}
+
+    try:
+        if args.format == "xlsx":
+            writer(to_write, out_path, stream=args.stream, chunk_size=args.chunk_size)
+        else:
+            writer(to_write, out_path, chunk_size=args.chunk_size)
+    except ImportError as e:
+        print(f"Erro: biblioteca necessária para escrever {args.format} não encontrada:", e)
+        if package:
+            print(f"Instale com: pip install {package}")
         sys.exit(1)
+    if manifest is not None:
+        manifest["outputs"][str(out_path)] = {"params": output_params, "sheets": sheet_fingerprints}
+        save_manifest(cache_dir, manifest)
 
-    print("Excel gerado em:", out_path)
+    print("Excel gerado em:" if args.format == "xlsx" else "Resultados gerados em:", out_path)
     print("Abas criadas:")
     for s in sheets.keys():
         print(" -", s)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
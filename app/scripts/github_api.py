@@ -1,31 +1,171 @@
 import requests
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 TOKEN = os.getenv("GITHUB_TOKEN")
 HEADERS = {"Authorization": f"token {TOKEN}"}
 
-def get_top_js_repos(limit=5):
-    url = "https://api.github.com/search/repositories"
-    params = {"q": "language:javascript", "sort": "stars", "order": "desc", "per_page": limit}
-    r = requests.get(url, headers=HEADERS, params=params)
+SEARCH_URL = "https://api.github.com/search/repositories"
+# a API de busca devolve no máximo 1000 resultados, em páginas de até 100
+SEARCH_MAX_RESULTS = 1000
+SEARCH_PER_PAGE = 100
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "3"))
+RATE_LIMIT_RETRIES = 5
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Session compartilhada com pool de conexões (keep-alive/TLS reaproveitados entre requisições)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, SEARCH_CONCURRENCY * 2))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+class RateLimiter:
+    """
+    Espaça as requisições de um recurso da API pelo orçamento restante
+    (X-RateLimit-Remaining) até o reset da janela (X-RateLimit-Reset),
+    em vez de gastar tudo de uma vez e receber 403 no meio da coleta.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset_at = None
+        self.next_at = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_at)
+            interval = 0.0
+            if self.remaining is not None and self.reset_at is not None and self.reset_at > now:
+                if self.remaining <= 0:
+                    start = max(start, self.reset_at + 1)
+                else:
+                    interval = (self.reset_at - now) / self.remaining
+                    self.remaining -= 1
+            self.next_at = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+    def update(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset_at = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset_at is None:
+            return
+        with self.lock:
+            self.remaining = int(remaining)
+            self.reset_at = float(reset_at)
+
+    def backoff(self, response):
+        """Tempo de espera depois de um 403/429 por limite de taxa."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        if self.reset_at is not None:
+            return max(1, self.reset_at - time.time() + 1)
+        return 60
+
+
+# busca e API "core" têm cotas separadas no GitHub
+SEARCH_LIMITER = RateLimiter()
+CORE_LIMITER = RateLimiter()
+
+
+def github_get(url, limiter, **kwargs):
+    """GET na API do GitHub pela session compartilhada, respeitando e aguardando o rate limit."""
+    session = get_session()
+    for _ in range(RATE_LIMIT_RETRIES):
+        limiter.wait()
+        r = session.get(url, timeout=30, **kwargs)
+        limiter.update(r)
+        rate_limited = r.status_code == 429 or (
+            r.status_code == 403
+            and (r.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in r.headers)
+        )
+        if not rate_limited:
+            r.raise_for_status()
+            return r
+        delay = limiter.backoff(r)
+        print(f"⏳ Rate limit do GitHub atingido, aguardando {delay:.0f}s...")
+        time.sleep(delay)
     r.raise_for_status()
-    data = r.json()["items"]
-
-    repos = []
-    for repo in data:
-        # pega o branch principal dinamicamente (main, master, etc)
-        default_branch = repo.get("default_branch", "main")
-        download_url = f"https://codeload.github.com/{repo['full_name']}/zip/refs/heads/{default_branch}"
-
-        repos.append({
-            "name": repo["full_name"],
-            "url": repo["html_url"],
-            "stars": repo["stargazers_count"],
-            "forks": repo["forks_count"],
-            "size_kb": repo["size"],
-            "updated_at": repo["updated_at"],
-            "download_url": download_url,
-        })
-    return repos
+    return r
+
+
+def _repo_from_item(repo):
+    # pega o branch principal dinamicamente (main, master, etc)
+    default_branch = repo.get("default_branch", "main")
+    download_url = f"https://codeload.github.com/{repo['full_name']}/zip/refs/heads/{default_branch}"
+
+    return {
+        "name": repo["full_name"],
+        "url": repo["html_url"],
+        "stars": repo["stargazers_count"],
+        "forks": repo["forks_count"],
+        "size_kb": repo["size"],
+        "updated_at": repo["updated_at"],
+        "default_branch": default_branch,
+        "download_url": download_url,
+    }
+
+
+def _search_page(page, per_page):
+    params = {"q": "language:javascript", "sort": "stars", "order": "desc", "per_page": per_page, "page": page}
+    return github_get(SEARCH_URL, SEARCH_LIMITER, params=params).json()["items"]
+
+
+def iter_top_js_repos(limit=5, per_page=SEARCH_PER_PAGE, concurrency=SEARCH_CONCURRENCY):
+    """
+    Itera os repositórios JavaScript mais populares, página a página.
+    As páginas são buscadas em paralelo (até `concurrency` ao mesmo tempo), mas entregues
+    em ordem e assim que chegam, para que a análise comece antes do fim da busca.
+    """
+    limit = min(limit, SEARCH_MAX_RESULTS)
+    per_page = max(1, min(per_page, SEARCH_PER_PAGE, limit or 1))
+    pages = -(-limit // per_page)
+    seen = set()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(_search_page, page, per_page) for page in range(1, pages + 1)]
+        try:
+            for future in futures:
+                items = future.result()
+                for item in items:
+                    # a ordenação pode mudar entre páginas buscadas em momentos diferentes
+                    if item["full_name"] in seen:
+                        continue
+                    seen.add(item["full_name"])
+                    yield _repo_from_item(item)
+                    if len(seen) >= limit:
+                        return
+                if len(items) < per_page:
+                    return
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def get_top_js_repos(limit=5):
+    return list(iter_top_js_repos(limit))
+
+def get_head_sha(full_name, branch):
+    """Resolve o SHA do último commit do branch (resposta enxuta, só o SHA)."""
+    url = f"https://api.github.com/repos/{full_name}/commits/{branch}"
+    r = github_get(url, CORE_LIMITER, headers={"Accept": "application/vnd.github.sha"})
+    return r.text.strip()
@@ -0,0 +1,252 @@
+"""
+Contagem nativa de linhas de código JavaScript.
+
+Reproduz o que o pygount conta para arquivos `.js` (linhas com pelo menos um
+token de código; linhas só com comentários, strings, espaços ou `(),:;[]{}`
+não contam) sem passar cada arquivo pela análise completa do Pygments.
+O classificador percorre o texto pulando direto para os pontos que mudam o
+estado do léxico JavaScript do Pygments (quebras de linha, aspas, crases,
+`/` e `<!--`), e por isso trata `//`, `/* */`, strings, template literals e
+regex literais exatamente como ele.
+
+O léxico vem só da extensão (JS_EXTENSIONS): o Pygments também olha o conteúdo
+e lê alguns `.js` com outro léxico (qualquer `${...}` vira "JavaScript+Genshi
+Text", marcas de template viram Django, ERB, PHP...). Nesses arquivos a contagem
+daqui é a do JavaScript e pode diferir da do pygount; o loc_parity.py os lista à
+parte. Para outras extensões `js_code_lines` devolve None e quem chama usa o pygount.
+"""
+import re
+
+# extensões lidas com o léxico JavaScript
+JS_EXTENSIONS = (".js", ".mjs", ".cjs", ".jsx")
+# mesmos critérios do pygount (modo caminho) para arquivos vazios, binários e gerados
+TEXT_BOMS = (b"\xfe\xff", b"\xff\xfe", b"\x00\x00\xfe\xff", b"\xff\xfe\x00\x00", b"\xef\xbb\xbf")
+BINARY_SNIFF_SIZE = 8192
+GENERATED_SCAN_LINES = 15
+# os padrões "(?i).*autogenerated" etc. do pygount, numa busca só sobre as primeiras linhas
+GENERATED_LINE_REGEX = re.compile(
+    r"autogenerated|automatically generated|do not edit|generated with the .+ utility"
+    r"|this is a generated file|generated automatically",
+    re.IGNORECASE,
+)
+
+# --- léxico JavaScript (mesmos padrões do JavascriptLexer do Pygments) ---
+_JS_FLAGS = re.DOTALL | re.MULTILINE
+# pontos em que o estado do léxico pode mudar; entre eles só há tokens "simples"
+_CODE_SPECIAL = re.compile(r"[\n'\"`/]|<!--")
+_INTERP_CODE_SPECIAL = re.compile(r"[\n'\"`/}]|<!--")
+_TEMPLATE_SPECIAL = re.compile(r"[`\\]|\$\{")
+_HASHBANG = re.compile(r"\A#! ?/.*?$", _JS_FLAGS)
+# strings: mesma linguagem de `"(\\\\|\\[^\\]|[^"\\])*"`, desenrolada para não casar caractere a caractere
+_DOUBLE_QUOTED = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', _JS_FLAGS)
+_SINGLE_QUOTED = re.compile(r"'[^'\\]*(?:\\.[^'\\]*)*'", _JS_FLAGS)
+_REGEX_LITERAL = re.compile(
+    r"/(\\.|[^[/\\\n]|\[(\\.|[^\]\\\n])*])+/([gimuysd]+\b|\B)", _JS_FLAGS
+)
+# caracteres que não tornam uma linha "de código" (espaços do pygount + `(),:;[]{}`)
+_NON_WHITE = re.compile(r"[^ \f\n\r\t(),:;\[\]{}]")
+_NON_SPACE = re.compile(r"\S")
+_SPACE = re.compile(r"\s")
+
+# tokens que podem aparecer entre dois pontos especiais; o grupo diz se um `/`
+# logo depois do token começa uma regex (estado "slashstartsregex" do Pygments)
+_TAIL_TOKEN = re.compile(
+    r"(?P<clear>0[bB][01]+n?|0[oO]?[0-7]+n?|0[xX][0-9a-fA-F]+n?|[0-9]+n"
+    r"|(?:\.[0-9]+|[0-9]+\.[0-9]*|[0-9]+)(?:[eE][-+]?[0-9]+)?|\.\.\.|=>)"
+    r"|(?P<set>\+\+|--|~|\?\?=?|\?|:|\\(?=\n)"
+    r"|(?:<<|>>>?|==?|!=?|(?:\*\*|\|\||&&|[-<>+*%&|^/]))=?|[{(\[;,])"
+    r"|(?P<punct>[})\].])"
+    r"|(?P<word>(?:typeof|instanceof|in|void|delete|new)\b"
+    r"|\b(?:constructor|from|as)\b"
+    r"|(?:for|in|while|do|break|return|continue|switch|case|default|if|else|"
+    r"throw|try|catch|finally|yield|await|async|this|of|static|export|"
+    r"import|debugger|extends|super|var|let|const|with|function|class)\b)"
+    r"|(?P<space>\s+)"
+    r"|(?P<name>[\w$\u200c\u200d]+|#[a-zA-Z_]\w*)"
+    r"|(?P<error>.)",
+    _JS_FLAGS,
+)
+_REGEX_WORDS = frozenset(
+    "typeof instanceof in void delete new for while do break return continue switch "
+    "case default if else throw try catch finally yield await async this of static "
+    "export import debugger extends super var let const with function class".split()
+)
+
+_TEMPLATE = 0
+_INTERP = 1
+
+
+def _tail_starts_regex(text, start, end):
+    """
+    Diz se um `/` logo após text[start:end] inicia uma regex, olhando o último
+    token do trecho (operadores, `{([;,` e palavras-chave sim; nomes, números e
+    `)]}.` não).
+    """
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    # espaços sempre separam tokens: basta tokenizar a partir do último deles
+    pos = max(text.rfind(" ", start, end), text.rfind("\t", start, end)) + 1
+    if pos == 0:
+        pos = start
+    starts_regex = False
+    while pos < end:
+        m = _TAIL_TOKEN.match(text, pos)
+        kind = m.lastgroup
+        if kind == "set":
+            starts_regex = True
+        elif kind == "word":
+            starts_regex = m.group() in _REGEX_WORDS
+        elif kind != "space":
+            starts_regex = False
+        pos = m.end()
+    return starts_regex
+
+
+def _scan_js(text):
+    """
+    Percorre o texto como o JavascriptLexer do Pygments e devolve, em ordem,
+    uma posição para cada trecho que contém código (um trecho nunca atravessa
+    uma quebra de linha).
+    """
+    marks = []
+    n = len(text)
+    stack = []
+    pos = 0
+    # "^(?=\s|/|<!--)" no início do texto já permite regex
+    regex_ok = bool(_SPACE.match(text)) or text.startswith("/")
+    last_code = None
+    m = _HASHBANG.match(text)
+    if m:
+        pos = m.end()
+
+    while pos < n:
+        if stack and stack[-1] == _TEMPLATE:
+            m = _TEMPLATE_SPECIAL.search(text, pos)
+            if m is None:
+                break
+            token = m.group()
+            if token == "`":
+                stack.pop()
+                regex_ok, last_code = False, None
+                pos = m.end()
+            elif token == "\\":
+                pos = m.end() + 1
+            else:
+                stack.append(_INTERP)
+                regex_ok, last_code = False, None
+                pos = m.end()
+            continue
+
+        m = (_INTERP_CODE_SPECIAL if stack else _CODE_SPECIAL).search(text, pos)
+        end = m.start() if m else n
+        if end > pos:
+            code = _NON_WHITE.search(text, pos, end)
+            if code:
+                marks.append(code.start())
+            if code or _NON_SPACE.search(text, pos, end):
+                last_code = (pos, end)
+        if m is None:
+            break
+
+        token = m.group()
+        start = m.start()
+        if token == "\n":
+            pos = start + 1
+            # linha começando direto com "/": o Pygments entra em "slashstartsregex"
+            if text.startswith("/", pos):
+                regex_ok, last_code = True, None
+        elif token == '"' or token == "'":
+            quoted = (_DOUBLE_QUOTED if token == '"' else _SINGLE_QUOTED).match(text, start)
+            if quoted:
+                pos = quoted.end()
+            else:
+                marks.append(start)  # aspa sem fechamento vira token de erro (código)
+                pos = start + 1
+            regex_ok, last_code = False, None
+        elif token == "`":
+            stack.append(_TEMPLATE)
+            pos = start + 1
+        elif token == "<!--":
+            pos = start + 4
+        elif token == "}":
+            stack.pop()
+            pos = start + 1
+        else:
+            following = text[start + 1:start + 2]
+            if following == "/":
+                newline = text.find("\n", start)
+                pos = newline if newline != -1 else n
+                continue
+            if following == "*":
+                close = text.find("*/", start + 2)
+                if close != -1:
+                    pos = close + 2
+                    continue
+            if last_code is not None:
+                regex_ok = _tail_starts_regex(text, *last_code)
+                last_code = None
+            marks.append(start)
+            if regex_ok:
+                literal = _REGEX_LITERAL.match(text, start)
+                if literal:
+                    marks.pop()
+                    pos = literal.end()
+                    regex_ok = False
+                    continue
+                # regex inválida: o resto da linha vira tokens de erro
+                newline = text.find("\n", start)
+                if newline == -1:
+                    break
+                pos = newline + 1
+                regex_ok = bool(_SPACE.match(text, pos)) or text.startswith("/", pos)
+            else:
+                pos = start + (2 if following == "=" else 1)
+                regex_ok = True
+    return marks
+
+
+def _count_marked_lines(text, positions):
+    """Conta as linhas distintas de `text` que contêm alguma das posições (em ordem)."""
+    lines = 0
+    line = -1
+    previous = 0
+    current = 0
+    for position in positions:
+        current += text.count("\n", previous, position)
+        previous = position
+        if current != line:
+            line = current
+            lines += 1
+    return lines
+
+
+def js_code_lines(data, file_name="file.js"):
+    """
+    Conta as linhas de código de um arquivo JavaScript (conteúdo em bytes)
+    como o pygount faria com o léxico JavaScript. Devolve None se a extensão
+    de `file_name` não é de JavaScript; UnicodeDecodeError se não for UTF-8.
+    """
+    if not file_name.lower().endswith(JS_EXTENSIONS):
+        return None
+    if not data:
+        return 0
+    head = data[:BINARY_SNIFF_SIZE]
+    if b"\0" in head and not head.startswith(TEXT_BOMS):
+        return 0
+    # leitura em modo texto com newline universal, como o pygount faz
+    source_code = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    head_end = -1
+    for _ in range(GENERATED_SCAN_LINES):
+        head_end = source_code.find("\n", head_end + 1)
+        if head_end == -1:
+            head_end = len(source_code)
+            break
+    head = source_code[:head_end]
+    lowered = head.lower()
+    if ("generated" in lowered or "do not ed" in lowered) and GENERATED_LINE_REGEX.search(head):
+        return 0
+
+    # pré-processamento do Pygments: sem BOM, sem quebras nas pontas, "\n" final
+    text = source_code[1:] if source_code.startswith("\ufeff") else source_code
+    text = text.strip("\n") + "\n"
+    return _count_marked_lines(text, _scan_js(text))
@@ -0,0 +1,117 @@
+"""
+Relatório de paridade entre os motores de LOC: conta as linhas de código de
+cada `.js` de um ou mais diretórios com o jsloc (nativo) e com o pygount
+(referência) e lista os arquivos em que os números diferem.
+
+A paridade exigida é a do léxico JavaScript: o jsloc sempre lê `.js` como
+JavaScript, enquanto o Pygments escolhe o léxico também pelo conteúdo
+(guess_lexer_for_filename) e lê alguns arquivos como template ("${...}" vira
+Genshi, marcas de Django/ERB/PHP...). Esses arquivos vão para "other_lexer",
+com as duas contagens, e não contam como divergência.
+
+Uso: python app/scripts/loc_parity.py <dir> [<dir> ...] [--out arquivo.json]
+Sai com código 1 se houver divergência em algum arquivo lido como JavaScript.
+"""
+import argparse
+import os
+import sys
+import time
+
+from pygments.lexers import guess_lexer_for_filename
+from pygments.util import ClassNotFound
+
+from jsloc import js_code_lines
+from exclusions import ExclusionRules
+from metrics import _pygount_code_count, build_file_index, indexed_files
+from utils import save_json
+
+RESULTS_DIR = "./app/results"
+
+
+def pygments_lexer_name(file_path, data):
+    """Léxico que o Pygments (e portanto o pygount) escolhe para o arquivo, pelo nome e pelo conteúdo."""
+    try:
+        return guess_lexer_for_filename(os.path.basename(file_path), data.decode("utf-8")).name
+    except (ClassNotFound, UnicodeDecodeError):
+        return None
+
+
+def compare_file(file_path):
+    """Conta um arquivo com os dois motores; devolve (léxico, nativo, pygount, s_nativo, s_pygount)."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    lexer = pygments_lexer_name(file_path, data)
+    started = time.perf_counter()
+    try:
+        native = js_code_lines(data, os.path.basename(file_path))
+    except UnicodeDecodeError:
+        native = 0  # o pygount também conta 0 para arquivos que não são UTF-8
+    native_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    reference = _pygount_code_count(file_path, "parity")
+    reference_seconds = time.perf_counter() - started
+    return lexer, native, reference, native_seconds, reference_seconds
+
+
+def parity_report(roots):
+    report = {
+        "roots": list(roots),
+        "files": 0,
+        "native_loc": 0,
+        "pygount_loc": 0,
+        "native_seconds": 0.0,
+        "pygount_seconds": 0.0,
+        "mismatches": [],
+        "other_lexer": [],
+    }
+    for root in roots:
+        # sem exclusões: a paridade vale para todo .js (node_modules e minificados incluídos)
+        index = build_file_index(root, exclusions=ExclusionRules.disabled())
+        for file_path, _ in indexed_files(index, [".js"]):
+            try:
+                lexer, native, reference, native_seconds, reference_seconds = compare_file(file_path)
+            except Exception as e:
+                print(f"⚠️ Erro ao comparar {file_path}: {e}")
+                continue
+            report["files"] += 1
+            report["native_seconds"] += native_seconds
+            report["pygount_seconds"] += reference_seconds
+            report["native_loc"] += native
+            report["pygount_loc"] += reference
+            if lexer not in (None, "JavaScript"):
+                # o pygount leu o arquivo com outro léxico: diferença esperada, fora da paridade
+                report["other_lexer"].append({"file": file_path, "lexer": lexer, "native": native,
+                                              "pygount": reference})
+            elif native != reference:
+                report["mismatches"].append({"file": file_path, "native": native, "pygount": reference})
+
+    native_seconds = report["native_seconds"]
+    report["speedup"] = round(report["pygount_seconds"] / native_seconds, 1) if native_seconds else None
+    report["native_seconds"] = round(native_seconds, 3)
+    report["pygount_seconds"] = round(report["pygount_seconds"], 3)
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Compara a contagem de LOC do jsloc com a do pygount")
+    p.add_argument("roots", nargs="+", help="Diretórios com arquivos .js (ex.: repositórios extraídos)")
+    p.add_argument("--out", default=f"{RESULTS_DIR}/reports/loc_parity.json", help="Arquivo JSON do relatório")
+    args = p.parse_args()
+
+    report = parity_report(args.roots)
+    save_json(args.out, report)
+    print(
+        f"📊 {report['files']} arquivos | nativo {report['native_loc']} LOC em {report['native_seconds']}s"
+        f" | pygount {report['pygount_loc']} LOC em {report['pygount_seconds']}s"
+        f" | speedup {report['speedup']}x | outro léxico no Pygments {len(report['other_lexer'])}"
+    )
+    for mismatch in report["mismatches"]:
+        print(f"❌ {mismatch['file']}: nativo {mismatch['native']} x pygount {mismatch['pygount']}")
+    if report["mismatches"]:
+        sys.exit(1)
+    print(f"✅ Contagens idênticas. Relatório salvo em {args.out}")
+
+
+if __name__ == "__main__":
+    main()
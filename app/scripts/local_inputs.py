@@ -0,0 +1,235 @@
+"""
+Modo offline: analisa repos que já estão no disco (ZIP, tar ou checkout git) em vez de
+buscá-los no GitHub, com o mesmo pipeline de métricas.
+
+A pasta de entrada tem um item por repo, com o nome do repo ("dono__repo", "dono_repo" ou
+só "repo"; também vale a pasta "dono/repo"):
+  corpus/facebook__react.zip   corpus/vercel__next.js.tar.gz   corpus/expressjs/express/
+
+O manifesto (JSON, JSONL ou CSV) traz os metadados que viriam da busca: um registro por repo
+com "name" (ou "repo", então um summary.json antigo serve) e "stars", "forks", "size_kb".
+Opcionalmente "path" (relativo à pasta de entrada) e "commit_sha". Sem manifesto, todos os
+itens da pasta são analisados, sem stars/forks.
+
+O commit de cada repo (que é a chave do cache de métricas) vem do manifesto, do HEAD do
+checkout ou do comentário que o GitHub grava nos ZIP/tar que gera; sem ele o repo é
+analisado sem cache.
+"""
+import csv
+import json
+import os
+import re
+import tarfile
+import zipfile
+
+from utils import iter_jsonl
+
+ARCHIVE_EXTENSIONS = {
+    ".zip": "zip",
+    ".tar": "tar",
+    ".tar.gz": "tar",
+    ".tgz": "tar",
+    ".tar.bz2": "tar",
+    ".tar.xz": "tar",
+}
+METADATA_FIELDS = ("stars", "forks", "size_kb")
+# o que marca a raiz de um repo ao decidir se uma pasta é "dono/" com vários repos dentro
+REPO_MARKERS = (".git", "package.json")
+_SHA_RE = re.compile(r"[0-9a-f]{40}\Z")
+
+
+def split_archive_name(file_name):
+    """("facebook__react.tar.gz") -> ("facebook__react", "tar"); itens que não são arquivo -> (nome, None)."""
+    lower = file_name.lower()
+    for ext in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if lower.endswith(ext):
+            return file_name[:-len(ext)], ARCHIVE_EXTENSIONS[ext]
+    return file_name, None
+
+
+def input_kind(path):
+    """"zip", "tar" ou "dir" (checkout ou pasta extraída); None para o que não é entrada."""
+    if os.path.isdir(path):
+        return "dir"
+    return split_archive_name(os.path.basename(path))[1]
+
+
+def _looks_like_repo(path):
+    return any(os.path.exists(os.path.join(path, marker)) for marker in REPO_MARKERS)
+
+
+def _is_owner_dir(path):
+    """
+    Pasta que agrupa repos de um dono ("dono/repo"): ela mesma não tem cara de repo (sem .git
+    nem package.json) e cada item é um arquivo compactado ou uma pasta com cara de repo. Um
+    checkout sem .git com só pastas no topo continua sendo um repo, não vários.
+    """
+    if _looks_like_repo(path):
+        return False
+    children = [child for child in os.scandir(path) if not child.name.startswith(".")]
+    return bool(children) and all(split_archive_name(child.name)[1]
+                                  or (child.is_dir() and _looks_like_repo(child.path)) for child in children)
+
+
+def scan_input_dir(input_dir):
+    """{chave em minúsculas: (nome do repo, caminho)} dos itens da pasta de entrada."""
+    found = {}
+    for entry in sorted(os.scandir(input_dir), key=lambda e: e.name):
+        if entry.name.startswith("."):
+            continue
+        stem, kind = split_archive_name(entry.name)
+        if entry.is_dir() and _is_owner_dir(entry.path):
+            for child in sorted(os.scandir(entry.path), key=lambda c: c.name):
+                child_stem, child_kind = split_archive_name(child.name)
+                if not child.name.startswith(".") and (child_kind or child.is_dir()):
+                    name = f"{entry.name}/{child_stem}"
+                    found[name.lower()] = (name, child.path)
+        elif entry.is_dir() or kind:
+            found[stem.lower()] = (stem.replace("__", "/"), entry.path)
+    return found
+
+
+def _candidate_keys(name):
+    owner, _, repo = name.rpartition("/")
+    keys = [name, f"{owner}__{repo}", f"{owner}_{repo}", repo] if owner else [name]
+    return [key.lower() for key in keys]
+
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+
+def read_manifest(path):
+    """Registros do manifesto (.json com uma lista, .jsonl ou .csv)."""
+    if path.endswith(".jsonl"):
+        return list(iter_jsonl(path))
+    if path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return list(csv.DictReader(f))
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def _local_repo(name, path, entry=None):
+    entry = entry or {}
+    repo = {
+        "name": name,
+        "url": entry.get("url") or f"https://github.com/{name}",
+        "default_branch": entry.get("default_branch") or "main",
+        "local_path": os.path.abspath(path),
+        "local_kind": input_kind(path),
+    }
+    for field in METADATA_FIELDS:
+        repo[field] = _number(entry.get(field))
+    if entry.get("commit_sha"):
+        repo["commit_sha"] = entry["commit_sha"]
+    return repo
+
+
+def iter_local_repos(input_dir, manifest=None, limit=None):
+    """
+    Repos da pasta de entrada, no formato de github_api.iter_top_js_repos (mais local_path e
+    local_kind). Com manifesto, na ordem dele e só os que têm entrada na pasta (os que faltam
+    geram aviso); sem manifesto, todos os itens da pasta em ordem alfabética.
+    """
+    found = scan_input_dir(input_dir)
+    count = 0
+    if manifest is None:
+        for name, path in found.values():
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield _local_repo(name, path)
+        return
+
+    for entry in read_manifest(manifest):
+        if limit is not None and count >= limit:
+            return
+        name = entry.get("name") or entry.get("repo")
+        if not name:
+            continue
+        if entry.get("path"):
+            path = os.path.join(input_dir, entry["path"])
+            path = path if os.path.exists(path) else None
+        else:
+            path = next((found[key][1] for key in _candidate_keys(name) if key in found), None)
+        if path is None or input_kind(path) is None:
+            print(f"⚠️ {name} está no manifesto mas não foi encontrado em {input_dir}")
+            continue
+        count += 1
+        yield _local_repo(name, path, entry)
+
+
+def _git_dir(path):
+    git_dir = os.path.join(path, ".git")
+    if os.path.isfile(git_dir):
+        # worktree/submódulo: ".git" é um arquivo "gitdir: <caminho>"
+        with open(git_dir, "r", encoding="utf-8") as f:
+            target = f.read().strip().partition("gitdir:")[2].strip()
+        git_dir = os.path.join(path, target)
+    return git_dir if os.path.isdir(git_dir) else None
+
+
+def read_git_head(path):
+    """
+    Commit do HEAD de um checkout lendo .git/HEAD e as refs direto, sem rodar o git: um
+    subprocesso disparado nas threads de download enquanto o pool de análise faz fork
+    pode ficar preso esperando um pipe herdado pelo processo filho.
+    """
+    git_dir = _git_dir(path)
+    if git_dir is None:
+        return None
+    with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+        head = f.read().strip()
+    if not head.startswith("ref:"):
+        return head  # HEAD destacado
+    ref = head[4:].strip()
+    # em worktrees as refs ficam no repositório principal (commondir)
+    common_dir = git_dir
+    if os.path.exists(os.path.join(git_dir, "commondir")):
+        with open(os.path.join(git_dir, "commondir"), "r", encoding="utf-8") as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    for base in (git_dir, common_dir):
+        ref_path = os.path.join(base, *ref.split("/"))
+        if os.path.isfile(ref_path):
+            with open(ref_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+    packed = os.path.join(common_dir, "packed-refs")
+    if os.path.exists(packed):
+        with open(packed, "r", encoding="utf-8") as f:
+            for line in f:
+                sha, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha
+    return None
+
+
+def local_commit_sha(repo):
+    """Commit do repo local: manifesto, HEAD do checkout ou comentário do ZIP/tar gerado pelo GitHub."""
+    if repo.get("commit_sha"):
+        return repo["commit_sha"]
+    path, kind = repo["local_path"], repo["local_kind"]
+    sha = None
+    try:
+        if kind == "dir":
+            sha = read_git_head(path)
+        elif kind == "zip":
+            with zipfile.ZipFile(path, "r") as zip_ref:
+                sha = zip_ref.comment.decode("ascii", "replace").strip()
+        elif kind == "tar":
+            # o git archive grava o commit num cabeçalho pax global, lido ao abrir o arquivo
+            with tarfile.open(path, "r:*") as tar:
+                sha = tar.pax_headers.get("comment", "").strip()
+    except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+        print(f"⚠️ Não foi possível ler o commit de {repo['name']}: {e}")
+        return None
+    return sha if sha and _SHA_RE.match(sha) else None
@@ -0,0 +1,268 @@
+"""
+Grafo de dependências a partir dos lockfiles (package-lock.json/npm-shrinkwrap.json,
+yarn.lock e pnpm-lock.yaml).
+
+Os package.json só dizem as dependências diretas de cada pacote do repo, e somá-las conta
+duas vezes as compartilhadas num monorepo. O lockfile traz a árvore resolvida inteira:
+cada (pacote, versão) instalado vira um nó, deduplicado entre todos os lockfiles do repo.
+
+Os arquivos são lidos em fluxo (linha a linha ou com o JsonStream) e os nomes e versões são
+internados (sys.intern): num lockfile com 100k+ entradas cada string aparece uma única vez
+em memória. Do grafo só ficam os nós e quais deles são diretos, que é o que as contagens usam.
+"""
+import sys
+
+from utils import JsonStream
+
+NPM_LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json")
+YARN_LOCKFILE = "yarn.lock"
+PNPM_LOCKFILE = "pnpm-lock.yaml"
+LOCKFILE_NAMES = NPM_LOCKFILES + (YARN_LOCKFILE, PNPM_LOCKFILE)
+
+# seções do package.json (e dos importers do pnpm) que viram dependências diretas
+DEPENDENCY_FIELDS = ("dependencies", "devDependencies", "optionalDependencies")
+
+
+def declared_dependencies(manifests):
+    """{(nome, range)} declarados em uma lista de package.json já lidos."""
+    declared = set()
+    for pkg in manifests:
+        for field in DEPENDENCY_FIELDS:
+            deps = pkg.get(field)
+            if isinstance(deps, dict):
+                declared.update((name, spec) for name, spec in deps.items() if isinstance(spec, str))
+    return declared
+
+
+class DependencyGraph:
+    """Pacotes resolvidos (nome, versão) de um ou mais lockfiles, com as dependências diretas marcadas."""
+
+    def __init__(self):
+        self.packages = set()
+        self.direct = set()
+        self.lockfiles = 0
+
+    def add(self, name, version):
+        key = (sys.intern(name), sys.intern(version))
+        self.packages.add(key)
+        return key
+
+    def add_direct(self, name, version):
+        self.direct.add(self.add(name, version))
+
+    def add_lockfile(self, file_name, stream, manifests=()):
+        """
+        Lê um lockfile (stream texto) e acrescenta seus pacotes ao grafo. `manifests` são os
+        package.json do repo: o yarn.lock e o package-lock v1 não dizem quais pacotes são
+        diretos, então eles vêm das dependências declaradas.
+        """
+        if file_name in NPM_LOCKFILES:
+            parse_npm_lock(stream, self, manifests)
+        elif file_name == YARN_LOCKFILE:
+            parse_yarn_lock(stream, self, manifests)
+        elif file_name == PNPM_LOCKFILE:
+            parse_pnpm_lock(stream, self)
+        else:
+            raise ValueError(f"lockfile desconhecido: {file_name}")
+        self.lockfiles += 1
+
+    def counts(self):
+        direct = len(self.direct)
+        return {
+            "lockfiles": self.lockfiles,
+            "direct_deps": direct,
+            "transitive_deps": len(self.packages) - direct,
+            "unique_deps": len(self.packages),
+        }
+
+
+# --- package-lock.json / npm-shrinkwrap.json ---
+
+def _package_path_name(path):
+    """Nome do pacote a partir do caminho em "packages" (ex.: node_modules/a/node_modules/@b/c -> @b/c)."""
+    return path.rsplit("node_modules/", 1)[1]
+
+
+def parse_npm_lock(stream, graph, manifests=()):
+    """
+    package-lock v2/v3: percorre "packages" entrada a entrada. Caminhos sem node_modules são o
+    projeto e os workspaces (importers); os diretos são <importer>/node_modules/<dep>, ou o
+    pacote içado para node_modules/<dep> na raiz.
+    v1 (só "dependencies", aninhado): os diretos são as entradas de primeiro nível declaradas
+    nos package.json.
+    """
+    json_stream = JsonStream(stream)
+    importers = {}
+    top_level = {}
+    has_packages = False
+    declared_names = {name for name, _ in declared_dependencies(manifests)}
+
+    for section in json_stream.iter_object():
+        if section == "packages":
+            has_packages = True
+            for path in json_stream.iter_object():
+                entry = json_stream.value()
+                if not isinstance(entry, dict) or entry.get("link"):
+                    continue
+                if "node_modules/" not in path:
+                    importers[path] = {name for field in DEPENDENCY_FIELDS for name in entry.get(field) or {}}
+                    continue
+                version = entry.get("version")
+                if not version:
+                    continue
+                key = graph.add(entry.get("name") or _package_path_name(path), version)
+                parent = path.rsplit("node_modules/", 1)[0].rstrip("/")
+                if "node_modules/" not in parent:
+                    top_level[(parent, key[0])] = key
+        elif section == "dependencies" and not has_packages:
+            for name in json_stream.iter_object():
+                _walk_npm_v1(json_stream.value(), name, graph, name in declared_names)
+        else:
+            json_stream.value()
+
+    for importer, names in importers.items():
+        for name in names:
+            key = top_level.get((importer, name)) or top_level.get(("", name))
+            if key is not None:
+                graph.direct.add(key)
+
+
+def _walk_npm_v1(entry, name, graph, direct):
+    # pilha explícita: árvores v1 podem ser bem profundas
+    pending = [(name, entry, direct)]
+    while pending:
+        name, entry, direct = pending.pop()
+        if not isinstance(entry, dict):
+            continue
+        version = entry.get("version")
+        if version:
+            key = graph.add(name, version)
+            if direct:
+                graph.direct.add(key)
+        for child, child_entry in (entry.get("dependencies") or {}).items():
+            pending.append((child, child_entry, False))
+
+
+# --- yarn.lock (classic e berry) ---
+
+def _split_descriptor(descriptor):
+    """'@babel/core@npm:^7.0.0' -> ('@babel/core', '^7.0.0')."""
+    at = descriptor.find("@", 1)
+    if at == -1:
+        return descriptor, ""
+    name, spec = descriptor[:at], descriptor[at + 1:]
+    return name, spec[4:] if spec.startswith("npm:") else spec
+
+
+def parse_yarn_lock(stream, graph, manifests=()):
+    """
+    Cada bloco começa com os descritores ("nome@range", ...) sem indentação e tem a versão
+    resolvida numa linha `version` indentada. Os diretos são os blocos cujo descritor é
+    exatamente um (nome, range) declarado nos package.json.
+    """
+    declared = declared_dependencies(manifests)
+    descriptors = None
+    for line in stream:
+        if not line.strip() or line.startswith("#"):
+            continue
+        if not line[0].isspace():
+            header = line.strip().rstrip(":")
+            descriptors = [_split_descriptor(d.strip().strip('"')) for d in header.split(",")]
+            # berry: metadados do arquivo e os próprios workspaces não são dependências
+            if header == "__metadata" or any(spec.startswith(("workspace:", "link:", "portal:"))
+                                             for _, spec in descriptors):
+                descriptors = None
+            continue
+        if descriptors is None:
+            continue
+        stripped = line.strip()
+        if stripped.startswith(("version ", "version:")):
+            version = stripped[len("version"):].lstrip(": ").strip().strip('"')
+            key = graph.add(descriptors[0][0], version)
+            if any(descriptor in declared for descriptor in descriptors):
+                graph.direct.add(key)
+            descriptors = None
+
+
+# --- pnpm-lock.yaml ---
+
+def _pnpm_version(version):
+    """Versão resolvida sem o sufixo de peers ("1.2.3(react@18.2.0)" ou "1.2.3_react@18.2.0")."""
+    return version.split("(", 1)[0].split("_", 1)[0]
+
+
+def _pnpm_package_key(key):
+    """
+    Nome e versão de uma chave de "packages":
+    v5 "/@scope/nome/1.2.3_peer", v6 "/@scope/nome@1.2.3(peer)", v9 "@scope/nome@1.2.3".
+    """
+    key = key.strip("'\"")
+    key = key[1:] if key.startswith("/") else key
+    key = key.split("(", 1)[0]
+    at = key.find("@", 1)
+    name = key[:at]
+    # no v5 o "@" só aparece no escopo ou no sufixo de peers; o nome tem no máximo uma "/"
+    if at != -1 and name.count("/") == (1 if name.startswith("@") else 0):
+        return name, key[at + 1:]
+    name, _, version = key.rpartition("/")
+    return name, _pnpm_version(version)
+
+
+def _yaml_key_value(stripped):
+    key, _, value = stripped.partition(":")
+    return key.strip().strip("'\""), value.strip().strip("'\"")
+
+
+def parse_pnpm_lock(stream, graph):
+    """
+    Leitura linha a linha do YAML do pnpm (sem depender de um parser YAML):
+    - "packages:" lista cada pacote resolvido numa chave com indentação 2;
+    - "importers:" (ou, sem workspaces em lockfiles antigos, as seções de dependências na
+      raiz) dá as dependências diretas, com a versão inline ou num campo "version:".
+    "snapshots:" (v9) repete os pacotes com variações de peers e é ignorada.
+    """
+    section = None
+    dep_indent = None  # indentação das chaves de dependência na seção de diretos atual
+    pending = None  # dependência direta esperando o campo "version:"
+    for line in stream:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        if indent == 0:
+            section = stripped.rstrip(":")
+            dep_indent = 2 if section in DEPENDENCY_FIELDS else None
+            pending = None
+            continue
+
+        if section == "packages":
+            if indent == 2 and stripped.endswith(":"):
+                name, version = _pnpm_package_key(stripped[:-1])
+                if name and version:
+                    graph.add(name, version)
+            continue
+        if section == "importers" and indent == 4:
+            dep_indent = 6 if stripped.rstrip(":") in DEPENDENCY_FIELDS else None
+            pending = None
+            continue
+        if dep_indent is None:
+            continue
+
+        key, value = _yaml_key_value(stripped)
+        if indent == dep_indent:
+            pending = key if not value else None
+            if value:
+                _pnpm_direct(graph, key, value)
+        elif indent > dep_indent and pending is not None and key == "version":
+            _pnpm_direct(graph, pending, value)
+            pending = None
+
+
+def _pnpm_direct(graph, name, version):
+    # link: e file: apontam para pastas do próprio repo (workspaces), não para pacotes instalados
+    if version.startswith(("link:", "file:", "workspace:")):
+        return
+    if version.startswith("/") or "@" in _pnpm_version(version).lstrip("@"):
+        # alias ("npm:outro@1.0.0" resolvido como /outro/1.0.0, /outro@1.0.0 ou outro@1.0.0)
+        name, version = _pnpm_package_key(version)
+    graph.add_direct(name, _pnpm_version(version))
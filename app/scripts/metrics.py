@@ -1,39 +1,241 @@
+import cProfile
+import hashlib
+import io
 import os
+import pstats
+import shutil
+import tarfile
 import tempfile
+import time
 import zipfile
 import requests
 import json
 from utils import run_command
+from advisories import load_advisory_index, scan_packages
+from lockfiles import LOCKFILE_NAMES, DependencyGraph
+from exclusions import MINIFIED_SAMPLE_BYTES, ExclusionRules
+from supervised import PROCESS_CONTEXT, SUPERVISED_ANALYSIS, AnalysisBudget
+from distributions import FunctionStats
+from cache import content_digest, open_file_cache
+from jsloc import js_code_lines
+from telemetry import StageRecorder, measured_call, profile_path, record_child_usage
 from pygount import analysis
 from pathlib import Path
 import lizard  # ✅ nova dependência
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
 
-def download_and_extract(repo, token):
-    """Baixa o repositório em ZIP e retorna o caminho da pasta extraída."""
-    headers = {"Authorization": f"token {token}"}
-    response = requests.get(repo["download_url"], headers=headers)
-    response.raise_for_status()
+# nomes de arquivo que o índice guarda separadamente (além do agrupamento por extensão)
+INDEXED_FILE_NAMES = ("package.json",) + LOCKFILE_NAMES
+
+# paralelismo do lizard: nº de processos e tamanho dos lotes de arquivos
+LIZARD_WORKERS = max(1, int(os.getenv("LIZARD_WORKERS", "1")))
+LIZARD_CHUNK_SIZE = max(1, int(os.getenv("LIZARD_CHUNK_SIZE", "64")))
+COMPLEXITY_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx")
+# arquivos maiores que isso não vão ao lizard
+LIZARD_MAX_FILE_SIZE = 1_000_000
+
+# motor de contagem de LOC: "native" (jsloc) ou "pygount" (referência, bem mais lento)
+LOC_ENGINES = ("native", "pygount")
+LOC_ENGINE = os.getenv("LOC_ENGINE", "native")
+
+# ANALYZE_FROM_ZIP=1 lê os fontes direto do ZIP baixado, sem extrair para o disco
+ANALYZE_FROM_ZIP = os.getenv("ANALYZE_FROM_ZIP", "0") == "1"
+
+# download em blocos: memória limitada ao tamanho do bloco, com retomada via HTTP Range
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = max(0, int(os.getenv("DOWNLOAD_RETRIES", "3")))
+DOWNLOAD_TIMEOUT = (10, 60)
+
+
+def _expected_download_size(response, offset):
+    """Tamanho final esperado do arquivo, a partir de Content-Range (206) ou Content-Length (200)."""
+    content_range = response.headers.get("Content-Range", "")
+    if response.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length and length.isdigit() else None
+
+
+# respostas HTTP que valem nova tentativa (sobrecarga/limite); 401, 403, 404... falham na hora
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class IncompleteDownload(IOError):
+    """Download interrompido ou inconsistente (tamanho, Range), que vale nova tentativa."""
+
+
+def _range_validator(response):
+    """ETag forte (ou Last-Modified) para o If-Range: sem ele não dá para retomar com segurança."""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _retry_delay(error, attempt):
+    retry_after = getattr(getattr(error, "response", None), "headers", {}).get("Retry-After", "")
+    if retry_after.isdigit():
+        return min(int(retry_after), 60)
+    return min(2 ** attempt, 30)
+
+
+def stream_download(url, dest_path, headers=None, chunk_size=DOWNLOAD_CHUNK_SIZE, retries=None, expected_sha256=None):
+    """
+    Baixa `url` para `dest_path` em blocos, sem manter a resposta inteira em memória.
+    - O conteúdo vai para `dest_path + ".part"`; se a conexão cair, a próxima tentativa
+      continua do ponto em que parou (header Range, com If-Range com o ETag/Last-Modified da
+      primeira resposta: se o arquivo remoto mudou, o servidor manda tudo de novo em vez de
+      emendar bytes de versões diferentes). Um .part que já exista em `dest_path` só é
+      retomado se o validador dele foi guardado (arquivo .part.validator); quem chama com uma
+      pasta temporária nova (download_zip) só tem a retomada entre tentativas.
+    - Só falhas transitórias são repetidas: conexão, timeout, corpo truncado e HTTP 429/5xx.
+    - Ao final confere o tamanho anunciado pelo servidor e, se informado, o sha256.
+    Retorna {"path", "bytes", "sha256", "resumed"}.
+    """
+    if retries is None:
+        retries = DOWNLOAD_RETRIES
+    part_path = dest_path + ".part"
+    validator_path = part_path + ".validator"
+    resumed = False
+
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = _read_text(validator_path) if offset else None
+        # identity: os offsets do Range precisam bater com os bytes gravados em disco
+        request_headers = {**(headers or {}), "Accept-Encoding": "identity"}
+        if offset and validator:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = validator
+        else:
+            offset = 0  # .part sem validador: não há como saber se ainda é o mesmo arquivo
+        try:
+            with requests.get(url, headers=request_headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 416:
+                    # Range inválido (arquivo parcial maior que o remoto): recomeça do zero
+                    os.remove(part_path)
+                    raise IncompleteDownload("range não satisfatível, reiniciando download")
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    offset = 0  # servidor ignorou o Range (ou o arquivo mudou) e mandou tudo
+                resumed = resumed or offset > 0
+                expected_size = _expected_download_size(response, offset)
+                if not offset:
+                    new_validator = _range_validator(response)
+                    if new_validator:
+                        with open(validator_path, "w", encoding="utf-8") as f:
+                            f.write(new_validator)
+                    elif os.path.exists(validator_path):
+                        os.remove(validator_path)
+
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
 
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != expected_size:
+                raise IncompleteDownload(f"download incompleto: {size} de {expected_size} bytes")
+            break
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in RETRY_STATUSES or attempt >= retries:
+                raise
+            error = e
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                IncompleteDownload) as e:
+            if attempt >= retries:
+                raise
+            error = e
+        print(f"   ⚠️ Falha no download ({error}); tentando novamente ({attempt + 1}/{retries})...")
+        time.sleep(_retry_delay(error, attempt))
+
+    digest = hashlib.sha256()
+    with open(part_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    if expected_sha256 and sha256 != expected_sha256.lower():
+        os.remove(part_path)
+        raise IOError(f"sha256 divergente para {url}: {sha256}")
+
+    os.replace(part_path, dest_path)
+    return {"path": dest_path, "bytes": os.path.getsize(dest_path), "sha256": sha256, "resumed": resumed}
+
+
+def download_zip(repo, token):
+    """Baixa o repositório em ZIP para uma pasta temporária e retorna (pasta, caminho do zip)."""
+    headers = {"Authorization": f"token {token}"}
     temp_dir = tempfile.mkdtemp()
     zip_path = os.path.join(temp_dir, "repo.zip")
-    with open(zip_path, "wb") as f:
-        f.write(response.content)
 
+    try:
+        stream_download(repo["download_url"], zip_path, headers=headers)
+        # integridade: o diretório central fica no fim do ZIP, então um arquivo truncado falha aqui
+        with zipfile.ZipFile(zip_path, "r"):
+            pass
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    return temp_dir, zip_path
+
+
+def download_and_extract(repo, token):
+    """Baixa o repositório em ZIP e retorna o caminho da pasta extraída."""
+    temp_dir, zip_path = download_zip(repo, token)
+    return extract_zip(temp_dir, zip_path)
+
+
+def extract_zip(temp_dir, zip_path):
+    """Extrai o ZIP dentro de temp_dir e retorna a pasta raiz do repositório."""
     with zipfile.ZipFile(zip_path, "r") as zip_ref:
         zip_ref.extractall(temp_dir)
+    return _extracted_root(temp_dir, zip_path)
 
-    extracted_folders = [
-        os.path.join(temp_dir, i)
-        for i in os.listdir(temp_dir)
-        if os.path.isdir(os.path.join(temp_dir, i))
-    ]
 
-    return extracted_folders[0] if extracted_folders else temp_dir
+def extract_tar(temp_dir, tar_path):
+    """Extrai um .tar (.gz, .bz2, .xz) dentro de temp_dir e retorna a pasta raiz do repositório."""
+    with tarfile.open(tar_path, "r:*") as tar:
+        if hasattr(tarfile, "data_filter"):
+            # recusa links e caminhos que escapariam de temp_dir
+            tar.extractall(temp_dir, filter="data")
+        else:
+            tar.extractall(temp_dir)
+    return _extracted_root(temp_dir, tar_path)
+
 
+def _extracted_root(temp_dir, archive_path):
+    """A pasta raiz única do arquivo ("<repo>-<ref>/" no GitHub) ou, sem ela, o próprio temp_dir."""
+    entries = [name for name in os.listdir(temp_dir) if os.path.join(temp_dir, name) != archive_path]
+    if len(entries) == 1 and os.path.isdir(os.path.join(temp_dir, entries[0])):
+        return os.path.join(temp_dir, entries[0])
+    return temp_dir
 
-def count_loc_fallback(repo_path):
+
+def count_loc_fallback(repo_path, index=None):
     """Conta linhas manualmente em arquivos .js (fallback)."""
     count = 0
+    if index is not None and index.get("archive"):
+        with source_reader(index) as read:
+            for file_path, _ in indexed_files(index, [".js"]):
+                try:
+                    count += read(file_path).count(b"\n")
+                except Exception:
+                    pass
+        return count
     for root, _, files in os.walk(repo_path):
         for f in files:
             if f.endswith(".js"):
@@ -45,122 +247,723 @@ def count_loc_fallback(repo_path):
     return count
 
 
-def find_package_json_files(root_dir):
-    """Busca todos os package.json no repositório."""
-    matches = []
-    for root, _, files in os.walk(root_dir):
-        for f in files:
-            if f == "package.json":
-                matches.append(os.path.join(root, f))
-    return matches
+def _file_extension(name):
+    """Sufixo usado para agrupar o índice (mesma semântica do glob "*.ext")."""
+    dot = name.rfind(".")
+    return name[dot:] if dot != -1 else ""
 
 
-def count_js_loc(repo_path: str) -> int:
-    """Conta linhas de código em arquivos JS com pygount."""
-    total_loc = 0
-    repo_dir = Path(repo_path)
+def _read_head(file_path, size=MINIFIED_SAMPLE_BYTES):
+    with open(file_path, "rb") as f:
+        return f.read(size)
 
-    for file_path in repo_dir.rglob("*.js"):
-        if not file_path.is_file():
-            continue
+
+def build_file_index(root_dir, names=INDEXED_FILE_NAMES, exclusions=None):
+    """
+    Percorre o repositório uma única vez (os.scandir) e monta um índice de arquivos.
+    Retorna um dict com:
+    - by_ext: {".js": [(caminho, tamanho), ...], ...}
+    - by_name: {"package.json": [caminho, ...], ...} para os nomes em `names`
+    - skipped: quantas pastas/arquivos ficaram de fora por `exclusions`
+    As listas são ordenadas pelo caminho para que o resultado seja determinístico.
+    `exclusions` (default: ExclusionRules() com a configuração do ambiente) poda pastas
+    antes de descer nelas e tira do índice arquivos ignorados, vendored, gerados ou minificados.
+    """
+    if exclusions is None:
+        exclusions = ExclusionRules()
+    by_ext = {}
+    by_name = {name: [] for name in names}
+    pending = [(str(root_dir), "")]
+
+    while pending:
+        current, rel_dir = pending.pop()
         try:
-            result = analysis.SourceAnalysis.from_file(
-                str(file_path),
-                group=repo_dir.name,
-                encoding="utf-8"
-            )
-            total_loc += result.code_count
-        except UnicodeDecodeError:
-            print(f"⚠️ Arquivo com encoding inválido: {file_path}")
-        except Exception as e:
-            print(f"⚠️ Erro ao analisar {file_path}: {e}")
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"⚠️ Não foi possível listar {current}: {e}")
+            continue
+
+        # .gitignore/.gitattributes da pasta valem para as entradas dela, então são lidos primeiro
+        for entry in entries:
+            if exclusions.wants(entry.name) and entry.is_file():
+                try:
+                    with open(entry.path, "r", encoding="utf-8", errors="replace") as f:
+                        exclusions.add_rules_file(f"{rel_dir}/{entry.name}" if rel_dir else entry.name, f.read())
+                except OSError:
+                    pass
+
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                # não segue links simbólicos de pastas (igual a os.walk/rglob)
+                if entry.is_dir(follow_symlinks=False):
+                    if not exclusions.prune_dir(rel_path):
+                        pending.append((entry.path, rel_path))
+                    continue
+                if not entry.is_file() or exclusions.skip_file(rel_path):
+                    continue
+                size = entry.stat().st_size
+                if exclusions.skip_minified(entry.name, size, lambda: _read_head(entry.path)):
+                    continue
+                if entry.name in by_name:
+                    by_name[entry.name].append(entry.path)
+                ext = _file_extension(entry.name)
+                if ext:
+                    by_ext.setdefault(ext, []).append((entry.path, size))
+            except OSError:
+                continue
+
+    for files in by_ext.values():
+        files.sort()
+    for files in by_name.values():
+        files.sort()
 
-    return total_loc
+    return {"root": str(root_dir), "archive": None, "by_ext": by_ext, "by_name": by_name,
+            "skipped": exclusions.skipped}
 
 
-def calc_js_complexity(repo_path: str, extensions=None) -> float:
+def build_zip_index(zip_path, names=INDEXED_FILE_NAMES, exclusions=None):
     """
-    Calcula a complexidade média do código JS usando lizard.
-    - repo_path: caminho para a pasta do repo.
-    - extensions: lista opcional de sufixos de arquivo (ex: ['.js', '.jsx', '.ts', '.tsx'])
+    Monta o mesmo índice de build_file_index a partir da tabela de membros de um ZIP,
+    sem descompactar nada além dos arquivos de regras e do começo dos candidatos a
+    minificado. Os caminhos do índice são os nomes dos membros no ZIP.
     """
-    if extensions is None:
-        extensions = [".js", ".jsx", ".ts", ".tsx"]
+    if exclusions is None:
+        exclusions = ExclusionRules()
+    by_ext = {}
+    by_name = {name: [] for name in names}
 
-    repo_dir = Path(repo_path)
-    complexities = []
-
-    for ext in extensions:
-        for file_path in repo_dir.rglob(f"*{ext}"):
-            # print(f"   🔍 Analisando complexidade em {file_path}...")
-            
-            # pular entradas que não são arquivos (por ex.: pastas com nome terminado em .js)
-            if not file_path.is_file():
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        members = [info for info in zip_ref.infolist() if not info.is_dir()]
+        # o codeload do GitHub põe tudo numa pasta raiz "<repo>-<ref>/": as regras são relativas a ela
+        prefix = members[0].filename.split("/", 1)[0] + "/" if members and "/" in members[0].filename else ""
+        if not all(info.filename.startswith(prefix) for info in members):
+            prefix = ""
+        pruned = {"": False}
+
+        def read_head(info):
+            with zip_ref.open(info) as f:
+                return f.read(MINIFIED_SAMPLE_BYTES)
+
+        def dir_pruned(rel_dir):
+            if rel_dir not in pruned:
+                parent = rel_dir.rpartition("/")[0]
+                pruned[rel_dir] = dir_pruned(parent) or exclusions.prune_dir(rel_dir)
+            return pruned[rel_dir]
+
+        # regras das pastas mais rasas primeiro: as mais profundas têm precedência
+        rule_files = [info for info in members if exclusions.wants(info.filename.rsplit("/", 1)[-1])]
+        for info in sorted(rule_files, key=lambda info: info.filename.count("/")):
+            rel_path = info.filename[len(prefix):]
+            if not dir_pruned(rel_path.rpartition("/")[0]):
+                exclusions.add_rules_file(rel_path, zip_ref.read(info).decode("utf-8", "replace"))
+
+        for info in members:
+            rel_path = info.filename[len(prefix):]
+            name = rel_path.rsplit("/", 1)[-1]
+            if dir_pruned(rel_path.rpartition("/")[0]) or exclusions.skip_file(rel_path):
+                continue
+            if exclusions.skip_minified(name, info.file_size, lambda: read_head(info)):
                 continue
+            if name in by_name:
+                by_name[name].append(info.filename)
+            ext = _file_extension(name)
+            if ext:
+                by_ext.setdefault(ext, []).append((info.filename, info.file_size))
+
+    for files in by_ext.values():
+        files.sort()
+    for files in by_name.values():
+        files.sort()
 
-            # pular arquivos muito grandes (opcional), por exemplo > 5MB
+    return {"root": str(zip_path), "archive": str(zip_path), "prefix": prefix, "by_ext": by_ext,
+            "by_name": by_name, "skipped": exclusions.skipped}
+
+
+@contextmanager
+def source_reader(index):
+    """
+    Devolve uma função read(caminho) -> bytes para os arquivos do índice.
+    No modo ZIP o arquivo é aberto uma vez e só os membros pedidos são descompactados.
+    """
+    archive = index.get("archive") if index else None
+    if archive:
+        with zipfile.ZipFile(archive, "r") as zip_ref:
+            yield zip_ref.read
+    else:
+        def read(file_path):
+            with open(file_path, "rb") as f:
+                return f.read()
+        yield read
+
+
+@contextmanager
+def source_opener(index):
+    """
+    Como source_reader, mas devolve open(caminho) -> arquivo texto, para ler em fluxo
+    arquivos grandes (lockfiles) sem carregá-los inteiros.
+    """
+    archive = index.get("archive") if index else None
+    if archive:
+        with zipfile.ZipFile(archive, "r") as zip_ref:
+            yield lambda file_path: io.TextIOWrapper(zip_ref.open(file_path), encoding="utf-8", errors="replace")
+    else:
+        yield lambda file_path: open(file_path, "r", encoding="utf-8", errors="replace")
+
+
+def _decode_source(data):
+    """Decodifica bytes de um fonte como o lizard faz ao ler do disco (utf-8, ignorando erros)."""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("utf-8", "ignore")
+
+
+def _relative_path(index, file_path):
+    """Caminho de um arquivo do índice relativo à raiz do repo (sem a pasta raiz do ZIP, se houver)."""
+    if index.get("archive"):
+        return file_path[len(index.get("prefix", "")):]
+    return Path(os.path.relpath(file_path, index["root"])).as_posix()
+
+
+def indexed_files(index, extensions):
+    """Lista (caminho, tamanho) do índice para as extensões pedidas, em ordem estável."""
+    files = []
+    for ext in dict.fromkeys(extensions):
+        files.extend(index["by_ext"].get(ext, []))
+    return files
+
+
+def find_package_json_files(root_dir, index=None):
+    """Busca todos os package.json no repositório."""
+    if index is None:
+        index = build_file_index(root_dir)
+    return list(index["by_name"].get("package.json", []))
+
+
+def find_lockfiles(root_dir, index=None):
+    """Lockfiles do repositório como [(nome, caminho)], fora de node_modules versionados."""
+    if index is None:
+        index = build_file_index(root_dir)
+    return [
+        (name, file_path)
+        for name in LOCKFILE_NAMES
+        for file_path in index["by_name"].get(name, [])
+        if "node_modules" not in Path(file_path).parts
+    ]
+
+
+def lockfile_dependencies(repo_path, index=None, manifests=()):
+    """
+    Lê todos os lockfiles do repo num único grafo deduplicado e devolve as contagens
+    (lockfiles, direct_deps, transitive_deps, unique_deps), ver lockfiles.py.
+    """
+    if index is None:
+        index = build_file_index(repo_path)
+    graph = DependencyGraph()
+    with source_opener(index) as open_text:
+        for name, file_path in find_lockfiles(repo_path, index):
             try:
-                if file_path.stat().st_size > 1_000_000:
-                    continue
-            except Exception:
-                pass
+                with open_text(file_path) as stream:
+                    graph.add_lockfile(name, stream, manifests)
+            except Exception as e:
+                print(f"   ⚠️ Lockfile ignorado ({file_path}): {e}")
+    return graph.counts()
+
+
+def _pygount_code_count(file_path, group, data=None):
+    """Linhas de código de um arquivo segundo o pygount (lendo do disco ou de `data`)."""
+    # TextIOWrapper dá o mesmo newline universal da leitura pelo caminho (CRLF quebrava o pygount)
+    file_handle = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8") if data is not None else None
+    result = analysis.SourceAnalysis.from_file(
+        str(file_path),
+        group=group,
+        encoding="utf-8",
+        file_handle=file_handle,
+    )
+    return result.code_count
 
+
+def _file_loc(file_path, engine, group, data=None):
+    """Linhas de código de um arquivo: motor nativo e, se a extensão não é de JavaScript, pygount."""
+    count = None
+    if engine == "native":
+        count = js_code_lines(data, os.path.basename(file_path))
+    if count is None:
+        # no modo ZIP (ou com cache) o conteúdo é entregue ao pygount em memória
+        count = _pygount_code_count(file_path, group, data)
+    return count
+
+
+def _loc_chunk(archive, engine, group, file_paths):
+    """
+    LOC de cada arquivo de um lote, em ordem (None para os que falharam). No modo supervisionado
+    roda no processo filho, que lê os arquivos sozinho; MemoryError sobe para o supervisor.
+    """
+    with source_reader({"archive": archive}) as read:
+        for file_path in file_paths:
             try:
-                # lizard.analyze_file analisa um único arquivo e retorna um FileInfo-like object
-                file_info = lizard.analyze_file(str(file_path))
-                for func in getattr(file_info, "function_list", []):
-                    # cyclomatic_complexity é o campo padrão
-                    cc = getattr(func, "cyclomatic_complexity", None)
-                    if cc is not None:
-                        complexities.append(cc)
+                data = read(file_path) if archive or engine == "native" else None
+                yield _file_loc(file_path, engine, group, data)
+            except MemoryError:
+                raise
+            except UnicodeDecodeError:
+                print(f"⚠️ Arquivo com encoding inválido: {file_path}")
+                yield None
+            except Exception as e:
+                print(f"⚠️ Erro ao analisar {file_path}: {e}")
+                yield None
+
+
+def _file_cache_key(file_path, data):
+    """
+    Chave do cache por arquivo: hash do conteúdo mais a extensão, porque o lizard escolhe a
+    linguagem (e o pygount o léxico) pelo nome: os mesmos bytes em .js e .ts dão resultados diferentes.
+    """
+    return f"{content_digest(data)}{_file_extension(os.path.basename(file_path))}"
+
+
+def count_js_loc(repo_path: str, index=None, cache=None, engine=None, budget=None) -> int:
+    """
+    Conta linhas de código em arquivos JS.
+    `engine` escolhe o motor: "native" (padrão, ver jsloc.py) ou "pygount"; extensões
+    que o motor nativo não lê como JavaScript passam pelo pygount.
+    Com `cache` (FileResultCache) arquivos de conteúdo já visto, neste ou em outro repo,
+    não são reanalisados (uma consulta ao cache para o repo inteiro).
+    Com `budget` (supervised.AnalysisBudget) os arquivos são contados em lotes (LIZARD_CHUNK_SIZE)
+    no processo supervisionado: os que estouram o orçamento ficam de fora e, se o tempo ou a
+    memória do repo acabam, a contagem é parcial.
+    """
+    engine = engine or LOC_ENGINE
+    if engine not in LOC_ENGINES:
+        raise ValueError(f"Motor de LOC desconhecido: {engine}")
+    cache_kind = "loc" if engine == "pygount" else f"loc-{engine}"
+    repo_dir = Path(repo_path)
+    if index is None:
+        index = build_file_index(repo_path)
+    file_paths = [file_path for file_path, _ in indexed_files(index, [".js"])]
+
+    # com cache: chave de cada arquivo e só os conteúdos inéditos (uma vez cada) são contados
+    keys = file_paths
+    known = {}
+    pending = file_paths
+    if cache is not None:
+        with source_reader(index) as read:
+            keys = [_file_cache_key(file_path, read(file_path)) for file_path in file_paths]
+        known = cache.get_many(cache_kind, keys)
+        first_path = {}
+        for file_path, key in zip(file_paths, keys):
+            if key not in known:
+                first_path.setdefault(key, file_path)
+        pending = list(first_path.values())
+
+    if budget is None:
+        computed = list(_loc_chunk(index["archive"], engine, repo_dir.name, pending))
+    else:
+        computed = _supervised_chunks(budget, "loc", pending, 1, LIZARD_CHUNK_SIZE,
+                                      _loc_chunk, index["archive"], engine, repo_dir.name)
+    path_key = dict(zip(file_paths, keys))
+    # arquivos com erro ou descartados pelo orçamento (None) não contam nem vão para o cache
+    new_counts = {path_key[file_path]: count for file_path, count in zip(pending, computed) if count is not None}
+
+    if cache is not None:
+        cache.put_many(cache_kind, new_counts)
+    known.update(new_counts)
+    return sum(known.get(key, 0) for key in keys)
+
+
+def _source_functions(file_path, data=None):
+    """(complexidade ciclomática, NLOC, nº de parâmetros) de cada função de um arquivo (lido do disco ou de `data`)."""
+    if data is None:
+        # lizard.analyze_file analisa um único arquivo e retorna um FileInfo-like object
+        file_info = lizard.analyze_file(str(file_path))
+    else:
+        file_info = lizard.analyze_file.analyze_source_code(str(file_path), _decode_source(data))
+    functions = []
+    for func in getattr(file_info, "function_list", []):
+        # cyclomatic_complexity é o campo padrão
+        cc = getattr(func, "cyclomatic_complexity", None)
+        if cc is not None:
+            functions.append([cc, getattr(func, "nloc", 0), getattr(func, "parameter_count", 0)])
+    return functions
+
+
+def _file_functions(file_path, read=None):
+    """
+    Roda o lizard em um arquivo e devolve [complexidade, nloc, parâmetros] de cada função.
+    Com `read` (modo ZIP) o código é lido em memória em vez de abrir o caminho no disco.
+    """
+    try:
+        return _source_functions(file_path, read(file_path) if read is not None else None)
+    except Exception as e:
+        # só log pra debug; não interrompe o processamento do repo
+        print(f"   ⚠️ Lizard falhou em {file_path}: {e}")
+        return []
+
+
+def _isolated_functions(archive, file_paths):
+    """
+    Como _file_functions para um lote, no processo supervisionado: um resultado por arquivo,
+    à medida que ficam prontos, e MemoryError sobe para o supervisor registrar o arquivo.
+    """
+    with source_reader({"archive": archive}) as read:
+        for file_path in file_paths:
+            try:
+                yield _source_functions(file_path, read(file_path) if archive else None)
+            except MemoryError:
+                raise
             except Exception as e:
-                # só log pra debug; não interrompe o processamento do repo
                 print(f"   ⚠️ Lizard falhou em {file_path}: {e}")
+                yield []
+
+
+def _supervised_chunks(budget, stage, file_paths, workers, chunk_size, func, *args):
+    """
+    func(*args, lote) em lotes de `chunk_size` arquivos nos processos supervisionados do orçamento
+    (até `workers` lotes ao mesmo tempo, um filho por thread supervisora). Um resultado por
+    arquivo, em ordem; None para os descartados pelo orçamento.
+    """
+    chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+
+    def run(chunk):
+        return budget.run_files(stage, chunk, func, *args)
+
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(run, chunks))
+    else:
+        results = [run(chunk) for chunk in chunks]
+    return [file_result for chunk_results in results for file_result in chunk_results]
+
+
+def _functions_chunk(archive, file_paths):
+    """Executado nos processos do pool: analisa um lote de arquivos, preservando a ordem."""
+    if not archive:
+        return [_file_functions(file_path) for file_path in file_paths]
+    # cada lote reabre o ZIP: o handle não pode ser compartilhado entre processos
+    with source_reader({"archive": archive}) as read:
+        return [_file_functions(file_path, read) for file_path in file_paths]
+
+
+def _function_stats_chunk(archive, file_paths):
+    """Como _functions_chunk, mas já agregado: o processo devolve só os histogramas do lote."""
+    stats = FunctionStats()
+    for functions in _functions_chunk(archive, file_paths):
+        stats.add_functions(functions)
+    return stats
+
+
+def complexity_files(index, extensions=COMPLEXITY_EXTENSIONS):
+    """Arquivos que o lizard analisa (pula os muito grandes, ver LIZARD_MAX_FILE_SIZE)."""
+    return [file_path for file_path, size in indexed_files(index, extensions) if size <= LIZARD_MAX_FILE_SIZE]
+
+
+def collect_function_stats(repo_path: str, extensions=None, index=None, workers=None, chunk_size=None, cache=None,
+                           budget=None) -> FunctionStats:
+    """
+    Roda o lizard nos arquivos JS/TS e agrega complexidade, NLOC e parâmetros de cada função
+    em histogramas (distributions.FunctionStats).
+    - repo_path: caminho para a pasta do repo.
+    - extensions: lista opcional de sufixos de arquivo (ex: ['.js', '.jsx', '.ts', '.tsx'])
+    - index: índice de arquivos já montado por build_file_index (opcional)
+    - workers: nº de processos do lizard (default: LIZARD_WORKERS; 1 = sequencial)
+    - chunk_size: arquivos por lote enviado a cada processo (default: LIZARD_CHUNK_SIZE)
+    - cache: FileResultCache opcional; só arquivos com conteúdo ainda não visto vão ao lizard
+    - budget: supervised.AnalysisBudget opcional; os lotes rodam nos processos supervisionados
+      (até workers ao mesmo tempo) e arquivos descartados ficam de fora
+    O resultado é o mesmo para qualquer nº de workers: os histogramas só somam contagens.
+    """
+    if extensions is None:
+        extensions = COMPLEXITY_EXTENSIONS
+    if index is None:
+        index = build_file_index(repo_path)
+    if workers is None:
+        workers = LIZARD_WORKERS
+    if chunk_size is None:
+        chunk_size = LIZARD_CHUNK_SIZE
+
+    file_paths = complexity_files(index, extensions)
+    stats = FunctionStats()
+
+    # sem cache nem orçamento cada processo do pool devolve os histogramas do seu lote, não as funções
+    if cache is None and budget is None:
+        chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=PROCESS_CONTEXT) as pool:
+                for chunk_stats, cpu_seconds, peak_rss_mb in pool.map(
+                        measured_call, repeat(_function_stats_chunk), repeat(index["archive"]), chunks):
+                    record_child_usage(cpu_seconds, peak_rss_mb)
+                    stats.merge(chunk_stats)
+        else:
+            stats = _function_stats_chunk(index["archive"], file_paths)
+        return stats
 
-    return sum(complexities) / len(complexities) if complexities else 0.0
+    # com cache: chave de cada arquivo e só os conteúdos inéditos (uma vez cada) vão ao lizard
+    digests = None
+    known = {}
+    pending = file_paths
+    if cache is not None:
+        with source_reader(index) as read:
+            digests = [_file_cache_key(file_path, read(file_path)) for file_path in file_paths]
+        known = cache.get_many("functions", digests)
+        first_path = {}
+        for file_path, digest in zip(file_paths, digests):
+            if digest not in known:
+                first_path.setdefault(digest, file_path)
+        pending = list(first_path.values())
 
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    if budget is not None:
+        computed = _supervised_chunks(budget, "complexity", pending, workers, chunk_size,
+                                      _isolated_functions, index["archive"])
+    elif workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=PROCESS_CONTEXT) as pool:
+            computed = []
+            for chunk_result, cpu_seconds, peak_rss_mb in pool.map(
+                    measured_call, repeat(_functions_chunk), repeat(index["archive"]), chunks):
+                record_child_usage(cpu_seconds, peak_rss_mb)
+                computed.extend(chunk_result)
+    else:
+        computed = _functions_chunk(index["archive"], pending)
 
-def get_metrics(repo, token):
-    """Calcula métricas do repositório (LOC, complexidade, dependências)."""
-    repo_path = download_and_extract(repo, token)
+    if cache is None:
+        for file_result in computed:
+            stats.add_functions(file_result or [])
+        return stats
+
+    path_digest = dict(zip(file_paths, digests))
+    # arquivos descartados pelo orçamento (None) não vão para o cache
+    new_results = {path_digest[file_path]: result for file_path, result in zip(pending, computed)
+                   if result is not None}
+    cache.put_many("functions", new_results)
+    known.update(new_results)
+    for digest in digests:
+        stats.add_functions(known.get(digest, []))
+    return stats
+
+
+def calc_js_complexity(repo_path: str, extensions=None, index=None, workers=None, chunk_size=None, cache=None,
+                       budget=None) -> float:
+    """
+    Calcula a complexidade média do código JS usando lizard (média por função).
+    Os parâmetros são os de collect_function_stats.
+    """
+    stats = collect_function_stats(repo_path, extensions, index, workers, chunk_size, cache, budget)
+    return stats.complexity.mean()
+
+
+def get_metrics(repo, token, from_zip=None, profile_dir=None):
+    """
+    Calcula métricas do repositório (LOC, complexidade, dependências, árvore dos lockfiles
+    e, com ADVISORY_DB, dependências vulneráveis).
+    Com from_zip=True (default: ANALYZE_FROM_ZIP) os fontes são lidos direto do ZIP,
+    sem extrair o repositório para o disco.
+    O resultado traz em "stages" a telemetria de cada etapa (ver telemetry.py).
+    """
+    return analyze_fetched(repo, fetch_repo(repo, token, from_zip), profile_dir)
+
+
+def fetch_repo(repo, token, from_zip=None, recorder=None):
+    """
+    Etapa de download: baixa o ZIP e monta o índice de arquivos.
+    Retorna {"temp_dir", "repo_path", "index", "stages"}, que pode ser enviado a outro
+    processo para a etapa de análise (analyze_fetched).
+    `recorder` (StageRecorder) permite continuar os spans de etapas anteriores.
+    Repos com "local_path" (modo offline) são lidos do disco por fetch_local_repo.
+    """
+    if repo.get("local_path"):
+        return fetch_local_repo(repo, from_zip, recorder)
+    if from_zip is None:
+        from_zip = ANALYZE_FROM_ZIP
+    if recorder is None:
+        recorder = StageRecorder()
+
+    with recorder.span("download") as span:
+        temp_dir, zip_path = download_zip(repo, token)
+        span["bytes"] = os.path.getsize(zip_path)
+    try:
+        if from_zip:
+            repo_path = zip_path
+            index = _index_with_span(recorder, build_zip_index, zip_path)
+        else:
+            with recorder.span("extract") as span:
+                repo_path = extract_zip(temp_dir, zip_path)
+                # o ZIP já foi extraído; removê-lo reduz o disco ocupado enquanto o repo espera a análise
+                os.remove(zip_path)
+            # uma única varredura do repositório, compartilhada por LOC, complexidade e dependências
+            index = _index_with_span(recorder, build_file_index, repo_path)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    return {"temp_dir": temp_dir, "repo_path": repo_path, "index": index, "stages": recorder.spans}
+
+
+def fetch_local_repo(repo, from_zip=None, recorder=None):
+    """
+    Como fetch_repo, para um repo que já está no disco (modo offline, ver local_inputs.py):
+    repo["local_path"] é um ZIP, um tar ou uma pasta (checkout). Nada é baixado; ZIPs são
+    lidos direto com from_zip, tars são extraídos numa pasta temporária e checkouts são
+    indexados no lugar ("temp_dir" None: a pasta original nunca é apagada).
+    """
+    if from_zip is None:
+        from_zip = ANALYZE_FROM_ZIP
+    if recorder is None:
+        recorder = StageRecorder()
+    path, kind = repo["local_path"], repo["local_kind"]
+
+    temp_dir = None
+    try:
+        if kind == "zip" and from_zip:
+            repo_path = path
+            index = _index_with_span(recorder, build_zip_index, path)
+        else:
+            repo_path = path
+            if kind in ("zip", "tar"):
+                temp_dir = tempfile.mkdtemp()
+                with recorder.span("extract") as span:
+                    span["bytes"] = os.path.getsize(path)
+                    extract = extract_zip if kind == "zip" else extract_tar
+                    repo_path = extract(temp_dir, path)
+            index = _index_with_span(recorder, build_file_index, repo_path)
+    except Exception:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    return {"temp_dir": temp_dir, "repo_path": repo_path, "index": index, "stages": recorder.spans}
+
+
+def _index_with_span(recorder, build, path):
+    with recorder.span("index") as span:
+        index = build(path)
+        span["files"] = sum(len(files) for files in index["by_ext"].values())
+        span["skipped"] = dict(index["skipped"])
+    return index
+
+
+def analyze_fetched(repo, fetched, profile_dir=None):
+    """
+    Etapa de análise: calcula as métricas de um repo já baixado e apaga os arquivos temporários.
+    Com `profile_dir` a análise roda sob o cProfile e o pstats vai para <profile_dir>/<repo>.prof,
+    somado aos perfis dos processos supervisionados, onde o lizard e o pygount de fato rodam.
+    """
+    cache = open_file_cache()
+    recorder = StageRecorder(list(fetched.get("stages", [])))
+    # lizard/pygount num processo supervisionado, com orçamento de tempo e memória (os filhos
+    # são encerrados ao fim do repo)
+    budget = AnalysisBudget(profile=bool(profile_dir)) if SUPERVISED_ANALYSIS else None
+    profiler = None
+    if profile_dir:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        metrics = _collect_metrics(repo, fetched["repo_path"], fetched["index"], cache, recorder, budget)
+    finally:
+        if budget is not None:
+            budget.close()
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            stats = pstats.Stats(profiler)
+            if budget is not None:
+                budget.add_profiles(stats)
+            stats.dump_stats(profile_path(profile_dir, repo["name"]))
+        if cache is not None:
+            cache.close()
+        if fetched["temp_dir"] is not None:
+            shutil.rmtree(fetched["temp_dir"], ignore_errors=True)
+    metrics["stages"] = recorder.spans
+    return metrics
+
+
+def _collect_metrics(repo, repo_path, index, cache=None, recorder=None, budget=None):
+    """
+    Roda os analisadores sobre o índice (pasta extraída ou ZIP) e monta o dict de métricas.
+    Com `budget` (supervised.AnalysisBudget) o lizard e o pygount rodam nos processos supervisionados.
+    """
+    if recorder is None:
+        recorder = StageRecorder()
     metrics = {
         "repo": repo["name"],
         "stars": repo["stars"],
         "forks": repo["forks"],
         "size_kb": repo["size_kb"],
     }
+    # o que a varredura deixou de fora (pastas podadas, ignorados, vendored, gerados, minificados)
+    for kind, count in index.get("skipped", {}).items():
+        metrics[f"skipped_{kind}"] = count
 
-    # 1️⃣ Linhas de código (pygount com fallback)
-    try:
-        total_loc = count_js_loc(repo_path)
-        metrics["lines_of_code"] = total_loc
-    except Exception as e:
-        metrics["lines_of_code"] = count_loc_fallback(repo_path)
-        print(f"⚠️ Erro ao calcular LOC (pygount) em {repo['name']}: {e}")
+    # 1️⃣ Linhas de código (jsloc ou pygount, com fallback)
+    with recorder.span("loc", files=len(indexed_files(index, [".js"]))):
+        try:
+            total_loc = count_js_loc(repo_path, index=index, cache=cache, budget=budget)
+            metrics["lines_of_code"] = total_loc
+        except Exception as e:
+            metrics["lines_of_code"] = count_loc_fallback(repo_path, index=index)
+            print(f"⚠️ Erro ao calcular LOC em {repo['name']}: {e}")
 
-    # 2️⃣ Complexidade ciclomática (lizard)
-    try:
-        avg_complexity = calc_js_complexity(repo_path)
-        metrics["avg_complexity"] = avg_complexity
-        print(f"   🧮 Complexidade média em {repo['name']}: {avg_complexity:.2f}")
-    except Exception as e:
-        metrics["avg_complexity"] = 0
-        print(f"⚠️ Lizard falhou em {repo['name']}: {e}")
+    # 2️⃣ Complexidade ciclomática, NLOC e parâmetros por função (lizard): média e distribuições
+    with recorder.span("complexity", files=len(complexity_files(index))) as span:
+        try:
+            function_stats = collect_function_stats(repo_path, index=index, cache=cache, budget=budget)
+            avg_complexity = function_stats.complexity.mean()
+            metrics["avg_complexity"] = avg_complexity
+            metrics.update(function_stats.to_metrics())
+            # histogramas exatos (mescláveis); o analyze.py os tira do registro e grava em arquivo à parte
+            metrics["function_histograms"] = function_stats.to_dict()
+            span["functions"] = function_stats.complexity.count
+            print(f"   🧮 Complexidade média em {repo['name']}: {avg_complexity:.2f} "
+                  f"(p90 {metrics['complexity_p90']}, máx. {metrics['complexity_max']})")
+        except Exception as e:
+            metrics["avg_complexity"] = 0
+            print(f"⚠️ Lizard falhou em {repo['name']}: {e}")
+
+    if budget is not None:
+        # arquivos descartados pelo orçamento e se LOC/complexidade cobrem só parte do repo
+        metrics["partial"] = budget.exhausted
+        metrics["offending_files"] = [{**item, "file": _relative_path(index, item["file"])} for item in budget.offending]
 
     # 3️⃣ Dependências (procura todos os package.json)
-    try:
-        pkg_files = find_package_json_files(repo_path)
-        total_deps = 0
-        for pkg_path in pkg_files:
+    packages = []
+    with recorder.span("dependencies") as span:
+        try:
+            pkg_files = find_package_json_files(repo_path, index=index)
+            span["files"] = len(pkg_files)
+            with source_reader(index) as read:
+                for pkg_path in pkg_files:
+                    try:
+                        pkg = json.loads(read(pkg_path).decode("utf-8"))
+                        if isinstance(pkg, dict):
+                            packages.append(pkg)
+                    except Exception:
+                        pass
+            metrics["dependencies"] = sum(len(pkg.get("dependencies") or {}) for pkg in packages)
+            metrics["dev_dependencies"] = sum(len(pkg.get("devDependencies") or {}) for pkg in packages)
+        except Exception as e:
+            metrics["dependencies"] = 0
+            metrics["dev_dependencies"] = 0
+            print(f"⚠️ Erro ao ler dependências em {repo['name']}: {e}")
+
+    # 4️⃣ Árvore completa de dependências (package-lock.json, yarn.lock, pnpm-lock.yaml)
+    with recorder.span("lockfiles") as span:
+        try:
+            lock_counts = lockfile_dependencies(repo_path, index=index, manifests=packages)
+            span["files"] = lock_counts["lockfiles"]
+            if lock_counts["lockfiles"]:
+                metrics.update({k: v for k, v in lock_counts.items() if k != "lockfiles"})
+        except Exception as e:
+            print(f"⚠️ Erro ao ler lockfiles em {repo['name']}: {e}")
+
+    # 5️⃣ Vulnerabilidades (índice local de advisories OSV, só com ADVISORY_DB configurado)
+    advisory_index = load_advisory_index()
+    if advisory_index is not None:
+        with recorder.span("advisories", packages=len(packages)) as span:
             try:
-                with open(pkg_path, "r", encoding="utf-8") as f:
-                    pkg = json.load(f)
-                    total_deps += len(pkg.get("dependencies", {}))
-            except Exception:
-                pass
-        metrics["dependencies"] = total_deps
-    except Exception as e:
-        metrics["dependencies"] = 0
-        print(f"⚠️ Erro ao ler dependências em {repo['name']}: {e}")
+                metrics.update(scan_packages(packages, advisory_index))
+                span["vulnerable"] = metrics["vulnerable_deps"]
+            except Exception as e:
+                print(f"⚠️ Erro ao verificar vulnerabilidades em {repo['name']}: {e}")
 
     return metrics
@@ -0,0 +1,172 @@
+"""
+Base SQLite com os resultados da coleta: uma linha por (repo, snapshot).
+
+O snapshot é o commit analisado (commit_sha) ou, sem ele, a data da execução. Rodar a
+coleta de novo no mesmo commit atualiza a linha (upsert) em vez de duplicá-la, e campos
+vindos de fontes diferentes (métricas, CVEs) se completam na mesma linha.
+
+Uso:
+  python app/scripts/results_db.py import app/results/summary.json app/results/dependencies_cve_summary.json
+  sqlite3 app/results/results.sqlite "SELECT repo, vulnerable_deps FROM repo_metrics ORDER BY stars DESC"
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, Text, create_engine, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from utils import iter_jsonl
+
+# fica em results/, mas .sqlite não é lido como aba pelo generate_results_excel
+RESULTS_DB = os.getenv("RESULTS_DB", "./app/results/results.sqlite")
+
+# colunas conhecidas dos arquivos de resultado; o resto do registro vai para "extra" (JSON)
+METRIC_COLUMNS = {
+    "stars": Integer,
+    "forks": Integer,
+    "size_kb": Integer,
+    "lines_of_code": Integer,
+    "avg_complexity": Float,
+    "dependencies": Integer,
+    "dev_dependencies": Integer,
+    "direct_deps": Integer,
+    "transitive_deps": Integer,
+    "unique_deps": Integer,
+    "vulnerable_deps": Integer,
+    "cves": Text,  # lista em JSON
+    "path_usado": String,
+    "commit_sha": String,
+}
+KEY_COLUMNS = ("repo", "snapshot")
+
+metadata = MetaData()
+repo_metrics = Table(
+    "repo_metrics",
+    metadata,
+    # a chave primária (repo, snapshot) também serve de índice para buscas por repo
+    Column("repo", String, primary_key=True),
+    Column("snapshot", String, primary_key=True),
+    Column("analyzed_at", String, nullable=False),
+    *[Column(name, type_) for name, type_ in METRIC_COLUMNS.items()],
+    Column("extra", Text),
+    Index("ix_repo_metrics_stars", "stars"),
+    Index("ix_repo_metrics_vulnerable_deps", "vulnerable_deps"),
+)
+
+
+def to_row(record, snapshot=None, analyzed_at=None):
+    """Converte um registro de métricas (dict do analyze.py ou dos JSON) numa linha da tabela."""
+    analyzed_at = analyzed_at or datetime.now(timezone.utc).isoformat(timespec="seconds")
+    row = {
+        "repo": record["repo"],
+        "snapshot": record.get("commit_sha") or snapshot or analyzed_at[:10],
+        "analyzed_at": analyzed_at,
+    }
+    extra = {}
+    for key, value in record.items():
+        if key in METRIC_COLUMNS:
+            row[key] = json.dumps(value) if key == "cves" and value is not None else value
+        elif key not in row:
+            extra[key] = value
+    if extra:
+        row["extra"] = json.dumps(extra)
+    return row
+
+
+class ResultsStore:
+    """Acesso à base de resultados (SQLAlchemy Core sobre SQLite)."""
+
+    def __init__(self, path=None):
+        self.path = path or RESULTS_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        with self.engine.begin() as conn:
+            # WAL: o Excel/gráficos podem ler enquanto a coleta ainda grava
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        metadata.create_all(self.engine)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """Bases criadas por versões anteriores ganham as colunas de métricas novas (create_all não altera tabelas)."""
+        with self.engine.begin() as conn:
+            existing = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(repo_metrics)")}
+            for column in repo_metrics.columns:
+                if column.name not in existing:
+                    type_ = column.type.compile(dialect=self.engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE repo_metrics ADD COLUMN {column.name} {type_}")
+
+    def upsert(self, records, snapshot=None):
+        """
+        Insere ou atualiza os registros numa única transação. Só as colunas presentes em
+        cada registro são atualizadas, então um arquivo de CVEs não apaga as métricas de LOC.
+        """
+        analyzed_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        count = 0
+        with self.engine.begin() as conn:
+            for record in records:
+                row = to_row(record, snapshot, analyzed_at)
+                stmt = sqlite_insert(repo_metrics).values(row)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(KEY_COLUMNS),
+                    set_={key: stmt.excluded[key] for key in row if key not in KEY_COLUMNS},
+                )
+                conn.execute(stmt)
+                count += 1
+        return count
+
+    def latest(self):
+        """DataFrame com o snapshot mais recente de cada repo, do mais estrelado para o menos."""
+        rank = func.row_number().over(
+            partition_by=repo_metrics.c.repo,
+            order_by=(repo_metrics.c.analyzed_at.desc(), repo_metrics.c.snapshot.desc()),
+        )
+        ranked = select(repo_metrics, rank.label("rank")).subquery()
+        query = (
+            select(*[ranked.c[column.name] for column in repo_metrics.columns])
+            .where(ranked.c.rank == 1)
+            .order_by(ranked.c.stars.desc(), ranked.c.repo)
+        )
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn)
+
+    def close(self):
+        self.engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(path):
+    """Registros de um arquivo de resultados: lista JSON (summary.json...) ou JSONL (checkpoint)."""
+    if path.endswith(".jsonl"):
+        return list(iter_jsonl(path))
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Base SQLite dos resultados")
+    sub = p.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Importa arquivos JSON/JSONL de resultados para a base")
+    imp.add_argument("files", nargs="+", help="Arquivos .json (lista de repos) ou .jsonl")
+    imp.add_argument("--snapshot", default="legacy",
+                     help="Snapshot dos registros sem commit_sha (default: legacy, para que os arquivos se completem)")
+    imp.add_argument("--db", default=RESULTS_DB, help="Caminho da base SQLite")
+    args = p.parse_args()
+
+    with ResultsStore(args.db) as store:
+        for path in args.files:
+            count = store.upsert(read_records(path), snapshot=args.snapshot)
+            print(f"📥 {path}: {count} repos")
+    print(f"✅ Base atualizada: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
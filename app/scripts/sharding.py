@@ -0,0 +1,130 @@
+"""
+Coleta em vários nós: `analyze.py --shard i/N` analisa só a fatia i (de 1 a N) da lista de
+repos, e `analyze.py --merge-shards N` junta as fatias nos resultados canônicos.
+
+A fatia de um repo vem do hash do nome (full_name, sem diferenciar maiúsculas), não da
+posição na lista: todos os nós podem buscar a mesma lista de forma independente, mesmo que a
+ordem mude entre uma busca e outra, e cada repo cai sempre na mesma fatia.
+
+Cada fatia grava seus arquivos em <results>/shards/ (checkpoint, telemetria e base SQLite
+próprios) e, ao terminar, um marcador shard-<i>-of-<N>.done.json com os repos que recebeu e
+os que analisou. O merge só roda com os N marcadores presentes e consistentes.
+
+Teste local (N processos lado a lado):
+  for i in 1 2 3; do python app/scripts/analyze.py --limit 30 --shard $i/3 & done; wait
+  python app/scripts/analyze.py --merge-shards 3
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from utils import iter_jsonl
+
+SHARDS_SUBDIR = "shards"
+
+
+def parse_shard(text):
+    """"i/N" -> (i, N), com 1 <= i <= N (tipo de argumento do argparse)."""
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        index = count = 0
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"fatia inválida: {text!r} (use i/N, com 1 <= i <= N)")
+    return index, count
+
+
+def shard_label(shard):
+    index, count = shard
+    return f"shard-{index}-of-{count}"
+
+
+def shard_of(name, count):
+    """Fatia (1 a `count`) do repo `name`; estável entre máquinas e execuções."""
+    digest = hashlib.sha1(name.lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def in_shard(name, shard):
+    return shard_of(name, shard[1]) == shard[0]
+
+
+def shard_paths(results_dir, shard):
+    """Arquivos de uma fatia: checkpoint, telemetria, histogramas por função, base SQLite e marcador de conclusão."""
+    base = os.path.join(results_dir, SHARDS_SUBDIR, shard_label(shard))
+    return {
+        "checkpoint": f"{base}.summary.jsonl",
+        "telemetry": f"{base}.telemetry.jsonl",
+        "histograms": f"{base}.function_histograms.jsonl",
+        "db": f"{base}.results.sqlite",
+        "marker": f"{base}.done.json",
+    }
+
+
+def write_marker(path, shard, assigned, analyzed):
+    """Grava o marcador de conclusão (via arquivo temporário: o merge nunca lê um marcador pela metade)."""
+    marker = {
+        "shard": shard[0],
+        "shards": shard[1],
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "assigned": sorted(assigned),
+        "analyzed": sorted(analyzed),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def remove_marker(path):
+    """Uma fatia que (re)começa deixa de contar como concluída até terminar de novo."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def check_shards(results_dir, count):
+    """
+    Valida as N fatias antes do merge e devolve a lista de checkpoints. Levanta ValueError
+    se falta alguma fatia, se um marcador é de outra divisão (N diferente), se um checkpoint
+    tem repo de outra fatia ou não tem um repo que o marcador diz ter analisado.
+    Repos recebidos mas não analisados (falhas) só geram aviso.
+    """
+    problems = []
+    checkpoints = []
+    for index in range(1, count + 1):
+        shard = (index, count)
+        paths = shard_paths(results_dir, shard)
+        if not os.path.exists(paths["marker"]):
+            problems.append(f"{shard_label(shard)} não terminou (sem {paths['marker']})")
+            continue
+        with open(paths["marker"], "r", encoding="utf-8") as f:
+            marker = json.load(f)
+        if (marker.get("shard"), marker.get("shards")) != shard:
+            problems.append(f"{paths['marker']} é da fatia {marker.get('shard')}/{marker.get('shards')}")
+            continue
+
+        found = set()
+        if os.path.exists(paths["checkpoint"]):
+            for record in iter_jsonl(paths["checkpoint"]):
+                if not in_shard(record["repo"], shard):
+                    problems.append(f"{shard_label(shard)}: {record['repo']} pertence à fatia "
+                                    f"{shard_of(record['repo'], count)}/{count}")
+                found.add(record["repo"])
+        missing = set(marker["analyzed"]) - found
+        if missing:
+            problems.append(f"{shard_label(shard)}: {len(missing)} repos analisados ausentes do checkpoint "
+                            f"(ex.: {sorted(missing)[0]})")
+        failed = set(marker["assigned"]) - set(marker["analyzed"])
+        if failed:
+            print(f"⚠️ {shard_label(shard)}: {len(failed)} repos falharam e ficam de fora: "
+                  f"{', '.join(sorted(failed)[:5])}{'...' if len(failed) > 5 else ''}")
+        checkpoints.append(paths["checkpoint"])
+
+    if problems:
+        raise ValueError("fatias incompletas ou inconsistentes:\n  " + "\n  ".join(problems))
+    return [path for path in checkpoints if os.path.exists(path)]
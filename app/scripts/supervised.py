@@ -0,0 +1,347 @@
+"""
+Análise supervisionada: o lizard e o pygount rodam num processo filho com orçamento de
+tempo por arquivo, orçamento de tempo e de memória por repo e limite de memória por arquivo.
+
+O filho recebe um lote de arquivos por vez (LIZARD_CHUNK_SIZE), lê cada um sozinho e devolve
+um resultado por arquivo assim que fica pronto: o supervisor espera cada resultado com o limite
+de tempo do arquivo, sem pagar uma ida e volta pelo pipe (nem copiar o conteúdo) a cada um.
+
+Um arquivo patológico que trava o parser ou estoura a memória não para mais o lote: o
+filho é morto e recriado, o arquivo é registrado como problemático e a análise segue com
+os próximos arquivos do lote. Quando o orçamento do repo acaba, os arquivos restantes ficam
+de fora e as métricas saem parciais.
+"""
+import cProfile
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from telemetry import current_peak_rss_mb, process_cpu_seconds, record_child_usage, reset_peak_rss
+
+try:
+    import resource
+except ImportError:  # Windows: sem setrlimit, só os limites de tempo valem
+    resource = None
+
+# SUPERVISED_ANALYSIS=0 volta a rodar lizard/pygount no próprio processo, sem limites
+SUPERVISED_ANALYSIS = os.getenv("SUPERVISED_ANALYSIS", "1") == "1"
+# segundos por arquivo e por repo (LOC + complexidade); 0 desliga o limite
+FILE_TIME_BUDGET = float(os.getenv("FILE_TIME_BUDGET", "60"))
+REPO_TIME_BUDGET = float(os.getenv("REPO_TIME_BUDGET", "1800"))
+# memória extra que o processo de análise pode alocar além do que usa ao iniciar: um arquivo
+# que passa disso é descartado (o filho é recriado para o próximo)
+WORKER_MEMORY_MB = int(os.getenv("WORKER_MEMORY_MB", "2048"))
+# memória de um repo (MB): soma do RSS dos processos de análise dele (um por thread supervisora);
+# passou disso, os arquivos restantes ficam de fora como no orçamento de tempo; 0 desliga
+REPO_MEMORY_BUDGET = int(os.getenv("REPO_MEMORY_BUDGET", "4096"))
+
+# método de início de todos os processos filhos (pool de análise do analyze.py, lotes do lizard
+# e o filho supervisionado): o fork direto de um processo com threads (downloads, supervisoras)
+# copia também locks que outra thread segurava naquele instante (telemetria, requests/urllib3)
+# e o filho pode travar para sempre. O forkserver só faz fork de um processo sem threads.
+PROCESS_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+class WorkerTimeout(Exception):
+    pass
+
+
+class WorkerMemoryError(Exception):
+    pass
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+def _limit_memory(memory_mb):
+    if resource is None or not memory_mb:
+        return
+    try:
+        with open("/proc/self/statm", "r") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        current = 0
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current + memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _worker_main(conn, memory_mb, profile_path=None):
+    """
+    Laço do processo filho: cada mensagem (func, args) roda func(*args), que devolve um
+    iterável com um resultado por arquivo do lote. Cada resultado vai ao supervisor assim que
+    fica pronto, com o CPU e o pico de RSS gastos nele (telemetria e orçamento de memória);
+    ao final do lote vai um "done".
+    Com `profile_path` os lotes rodam sob o cProfile e o pstats é gravado lá quando o filho
+    é encerrado normalmente (close()).
+    """
+    _limit_memory(memory_mb)
+    profiler = cProfile.Profile() if profile_path else None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        if profiler is not None:
+            profiler.enable()
+        try:
+            alive = _run_message(conn, *message)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        if not alive:
+            return
+    if profiler is not None:
+        profiler.dump_stats(profile_path)
+
+
+def _run_message(conn, func, args):
+    """Roda um lote, mandando cada resultado ao supervisor; False se o filho precisa encerrar (MemoryError)."""
+    results = None
+    while True:
+        reset_peak_rss()
+        started = time.process_time()
+
+        def usage():
+            return time.process_time() - started, current_peak_rss_mb()
+
+        try:
+            if results is None:
+                results = iter(func(*args))
+            value = next(results)
+        except StopIteration:
+            conn.send(("done", None, usage()))
+            return True
+        except MemoryError:
+            # depois de um MemoryError o estado do processo é incerto: encerra e o supervisor recria
+            conn.send(("memory", None, usage()))
+            return False
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", usage()))
+            return True
+        conn.send(("ok", value, usage()))
+
+
+class SupervisedWorker:
+    """Processo filho de análise, iniciado sob demanda e recriado depois de morto."""
+
+    def __init__(self, memory_mb=None, profile_dir=None):
+        self.memory_mb = WORKER_MEMORY_MB if memory_mb is None else memory_mb
+        # com profile_dir cada filho grava ali o seu .prof ao ser encerrado (um arquivo por filho)
+        self.profile_dir = profile_dir
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        # CPU já informado pelo filho atual: se ele é morto no meio de um arquivo, só o que
+        # passa disso ainda não entrou na telemetria
+        self.reported_cpu = 0.0
+        # pico de RSS (MB) do filho no último arquivo; 0 sem filho vivo (orçamento de memória do repo)
+        self.rss_mb = 0.0
+
+    def _start(self):
+        profile_path = None
+        if self.profile_dir:
+            fd, profile_path = tempfile.mkstemp(suffix=".prof", dir=self.profile_dir)
+            os.close(fd)
+        self.conn, child_conn = PROCESS_CONTEXT.Pipe()
+        self.process = PROCESS_CONTEXT.Process(target=_worker_main, args=(child_conn, self.memory_mb, profile_path),
+                                               daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _reaped(self):
+        self.reported_cpu = 0.0
+        self.rss_mb = 0.0
+
+    def _kill(self):
+        if self.process is not None:
+            cpu_seconds = process_cpu_seconds(self.process.pid)
+            if cpu_seconds is not None:
+                record_child_usage(max(0.0, cpu_seconds - self.reported_cpu))
+            self.process.kill()
+            self.process.join()
+            self.conn.close()
+            self.process = None
+            self.restarts += 1
+            self._reaped()
+
+    def stream(self, func, args=(), timeout=None):
+        """
+        Executa func(*args) no filho e devolve, um a um, os resultados que ele produz (func
+        devolve um iterável, um item por arquivo do lote; precisa ser uma função de módulo,
+        vai por pickle). `timeout` é chamado antes de cada item e devolve o tempo máximo de
+        espera por ele (None: sem limite). Levanta WorkerTimeout, WorkerMemoryError ou
+        WorkerCrashed no item em que o filho travou ou morreu (o filho é descartado e a próxima
+        chamada cria outro) e RuntimeError se func falhar fora de um arquivo.
+        """
+        if self.process is not None and not self.process.is_alive():
+            # o filho morreu entre duas chamadas (e o is_alive já o recolheu)
+            self.process = None
+            self._reaped()
+        if self.process is None:
+            self._start()
+        finished = False
+        try:
+            self.conn.send((func, args))
+            while True:
+                if not self.conn.poll(timeout() if timeout is not None else None):
+                    self._kill()
+                    raise WorkerTimeout()
+                status, value, (cpu_seconds, peak_rss_mb) = self.conn.recv()
+                self.reported_cpu += cpu_seconds
+                self.rss_mb = peak_rss_mb or 0.0
+                record_child_usage(cpu_seconds, peak_rss_mb)
+                if status == "done":
+                    finished = True
+                    return
+                if status == "memory":
+                    self._kill()
+                    raise WorkerMemoryError()
+                if status == "error":
+                    finished = True
+                    raise RuntimeError(value)
+                yield value
+        except (EOFError, OSError):
+            self._kill()
+            raise WorkerCrashed()
+        finally:
+            if not finished and self.process is not None:
+                # quem chamou parou no meio do lote: o filho ainda manda resultados que ninguém vai ler
+                self._kill()
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.conn.close()
+            self.process = None
+            self._reaped()
+
+
+class AnalysisBudget:
+    """
+    Orçamento de um repo, usado como context manager (os processos filhos são encerrados na
+    saída). run_files() executa um lote de arquivos no filho supervisionado da thread que
+    chama; arquivos que estouram o limite vão para `offending` e, quando o tempo ou a memória
+    do repo acabam, `exhausted` fica True e nada mais roda (resultado parcial).
+    """
+
+    def __init__(self, repo_seconds=None, file_seconds=None, repo_memory_mb=None, profile=False):
+        repo_seconds = REPO_TIME_BUDGET if repo_seconds is None else repo_seconds
+        self.file_seconds = (FILE_TIME_BUDGET if file_seconds is None else file_seconds) or None
+        self.deadline = time.monotonic() + repo_seconds if repo_seconds else None
+        self.repo_memory_mb = (REPO_MEMORY_BUDGET if repo_memory_mb is None else repo_memory_mb) or None
+        self.offending = []
+        self.exhausted = False
+        self.lock = threading.Lock()
+        # um filho por thread supervisora (o lizard com LIZARD_WORKERS > 1 usa várias)
+        self.workers = {}
+        # profile=True: os filhos rodam sob o cProfile (ver add_profiles)
+        self.profile_dir = tempfile.mkdtemp(prefix="analysis-profiles-") if profile else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Encerra os processos filhos do repo."""
+        with self.lock:
+            workers = list(self.workers.values())
+            self.workers.clear()
+        for worker in workers:
+            worker.close()
+
+    def add_profiles(self, stats):
+        """
+        Soma a `stats` (pstats.Stats) os perfis dos filhos já encerrados (close()) e apaga os
+        arquivos. Filhos mortos no meio de um arquivo (tempo, memória) não deixam perfil.
+        """
+        if self.profile_dir is None:
+            return stats
+        for name in sorted(os.listdir(self.profile_dir)):
+            path = os.path.join(self.profile_dir, name)
+            if os.path.getsize(path):
+                stats.add(path)
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        self.profile_dir = None
+        return stats
+
+    def _worker(self):
+        with self.lock:
+            worker = self.workers.get(threading.get_ident())
+            if worker is None:
+                worker = self.workers[threading.get_ident()] = SupervisedWorker(profile_dir=self.profile_dir)
+        return worker
+
+    def _timeout(self):
+        if self.deadline is None:
+            return self.file_seconds
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            self.exhausted = True
+            return 0
+        return remaining if self.file_seconds is None else min(self.file_seconds, remaining)
+
+    def _check_memory(self, stage):
+        if self.repo_memory_mb is None or self.exhausted:
+            return
+        with self.lock:
+            used = sum(worker.rss_mb for worker in self.workers.values())
+        if used > self.repo_memory_mb:
+            self.exhausted = True
+            print(f"   🧠 Orçamento de memória do repo esgotado em {stage} ({used:.0f} MB); métricas parciais")
+
+    def _offend(self, stage, file_path, reason):
+        with self.lock:
+            self.offending.append({"stage": stage, "file": file_path, "reason": reason})
+        print(f"   ⏱️ {stage}: {file_path} descartado ({reason})")
+
+    def run_files(self, stage, file_paths, func, *args):
+        """
+        func(*args, lote) no filho supervisionado, que devolve um resultado por arquivo, em ordem
+        (um gerador). Cada arquivo tem o próprio limite de tempo; o que estoura o tempo ou a
+        memória, ou derruba o filho, vai para `offending` e o lote segue num filho novo a partir
+        do arquivo seguinte. Devolve um resultado por arquivo: None para os descartados e para
+        os que ficaram de fora porque o orçamento do repo acabou.
+        """
+        results = []
+        while len(results) < len(file_paths) and not self.exhausted:
+            remaining = file_paths[len(results):]
+            try:
+                for value in self._worker().stream(func, args + (remaining,), self._timeout):
+                    results.append(value)
+                    self._check_memory(stage)
+                    if self.exhausted:
+                        break
+            except WorkerTimeout:
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    # quem acabou foi o tempo do repo, não necessariamente o deste arquivo
+                    self.exhausted = True
+                    print(f"   ⏱️ Orçamento de tempo do repo esgotado em {stage}; métricas parciais")
+                else:
+                    self._offend(stage, file_paths[len(results)], "timeout")
+                    results.append(None)
+            except WorkerMemoryError:
+                self._offend(stage, file_paths[len(results)], "memory")
+                results.append(None)
+            except WorkerCrashed:
+                self._offend(stage, file_paths[len(results)], "crashed")
+                results.append(None)
+        return results + [None] * (len(file_paths) - len(results))
@@ -0,0 +1,164 @@
+"""
+Telemetria por etapa da coleta (download, extração, índice, LOC, complexidade, dependências).
+
+Cada etapa vira um "span" com tempo de parede, tempo de CPU (da thread da etapa e dos
+processos filhos que trabalharam nela), pico de memória (RSS) do processo durante a etapa,
+pico dos filhos e contadores livres (bytes baixados, arquivos processados...). Os spans
+são dicts simples, então viajam junto com o repo entre threads e processos do pipeline.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, o pico de memória fica como None
+    resource = None
+
+# ru_maxrss vem em KB no Linux e em bytes no macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# spans em andamento neste processo: o uso informado pelos processos filhos vai para todos eles
+_active = []
+_active_lock = threading.Lock()
+
+
+def reset_peak_rss():
+    """Zera o pico de RSS do processo (VmHWM) no Linux; False se não for possível."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def current_peak_rss_mb():
+    """VmHWM do processo (MB): o maior RSS desde o início ou desde o último reset_peak_rss()."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def process_max_rss_mb():
+    """Maior RSS (MB) em toda a vida do processo (fallback sem /proc: não é por etapa)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT / (1024 * 1024), 1)
+
+
+def process_cpu_seconds(pid):
+    """CPU (usuário + sistema) já gasto por outro processo, lido de /proc; None fora do Linux."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # o nome do processo (2º campo) pode ter espaços: os campos numéricos vêm depois do ")"
+            fields = f.read().rpartition(")")[2].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def measured_call(func, *args):
+    """
+    Executado num processo filho (lotes do lizard no pool): func(*args) junto com o CPU e o
+    pico de RSS gastos, para quem chamou repassar a record_child_usage.
+    """
+    reset_peak_rss()
+    started = time.process_time()
+    result = func(*args)
+    return result, time.process_time() - started, current_peak_rss_mb()
+
+
+def record_child_usage(cpu_seconds, peak_rss_mb=None):
+    """
+    Uso de um processo filho numa chamada (worker supervisionado, lote do pool): entra no CPU
+    e no pico dos filhos de todos os spans em andamento neste processo.
+    """
+    with _active_lock:
+        for tracker in _active:
+            tracker["child_cpu"] += cpu_seconds
+            if peak_rss_mb is not None:
+                tracker["child_peak"] = max(tracker["child_peak"] or 0, peak_rss_mb)
+
+
+def _cpu_seconds():
+    # thread_time: os downloads rodam em threads do processo principal, então o tempo de
+    # processo misturaria repos. Os filhos informam o próprio uso (record_child_usage): eles
+    # sobem pelo forkserver, não são filhos diretos deste processo e não entram no os.times
+    return time.thread_time()
+
+
+class StageRecorder:
+    """
+    Acumula os spans de um repo. Uso:
+
+        with recorder.span("download") as span:
+            ...
+            span["bytes"] = tamanho
+    """
+
+    def __init__(self, spans=None):
+        self.spans = spans if spans is not None else []
+
+    @contextmanager
+    def span(self, stage, **fields):
+        info = dict(fields)
+        tracker = {"child_cpu": 0.0, "child_peak": None, "peak": True}
+        with _active_lock:
+            # com outra etapa em andamento (outra thread) o pico não pode ser zerado: a leitura
+            # vale desde o início da etapa mais antiga ainda aberta (limite superior)
+            if not _active:
+                tracker["peak"] = reset_peak_rss()
+            _active.append(tracker)
+        started_wall = time.perf_counter()
+        started_cpu = _cpu_seconds()
+        status = "ok"
+        try:
+            yield info
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            with _active_lock:
+                _active.remove(tracker)
+            span = {
+                "stage": stage,
+                "status": status,
+                "wall_s": round(time.perf_counter() - started_wall, 4),
+                "cpu_s": round(_cpu_seconds() - started_cpu + tracker["child_cpu"], 4),
+            }
+            if tracker["peak"]:
+                span["peak_rss_mb"] = current_peak_rss_mb()
+            else:
+                # sem como zerar o pico: só o máximo da vida do processo, rotulado como tal
+                span["peak_rss_mb"] = None
+                span["process_max_rss_mb"] = process_max_rss_mb()
+            span["children_peak_rss_mb"] = tracker["child_peak"]
+            span.update(info)
+            self.spans.append(span)
+
+
+def summarize_spans(spans):
+    """Totais de um repo: tempo somado das etapas e o maior pico de memória (do processo e dos filhos)."""
+    def peak(field):
+        values = [span[field] for span in spans if span.get(field) is not None]
+        return max(values) if values else None
+
+    return {
+        "wall_s": round(sum(span["wall_s"] for span in spans), 4),
+        "cpu_s": round(sum(span["cpu_s"] for span in spans), 4),
+        "peak_rss_mb": peak("peak_rss_mb"),
+        "children_peak_rss_mb": peak("children_peak_rss_mb"),
+    }
+
+
+def profile_path(profile_dir, full_name):
+    """Arquivo .prof (cProfile/pstats) de um repo."""
+    return os.path.join(profile_dir, full_name.replace("/", "__") + ".prof")
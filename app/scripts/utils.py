@@ -1,6 +1,7 @@
 import subprocess
 import json
 import os
+import re
 
 def run_command(command, cwd=None):
     result = subprocess.run(
@@ -18,3 +19,167 @@ def save_json(filepath, data):
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+
+
+class JsonlWriter:
+    """
+    Checkpoint em JSONL: cada registro é acrescentado como uma linha assim que fica pronto.
+    O fsync é feito a cada `fsync_every` registros (e no close), para não pagar um fsync por repo.
+    """
+
+    def __init__(self, filepath, fsync_every=10, truncate=False):
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        # uma queda no meio da escrita deixa a última linha sem "\n": começa numa linha nova
+        torn = False
+        if not truncate and os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+            with open(filepath, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self.file = open(filepath, "w" if truncate else "a", encoding="utf-8")
+        if torn:
+            self.file.write("\n")
+        self.fsync_every = max(1, fsync_every)
+        self.pending = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.pending += 1
+        if self.pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_jsonl(filepath):
+    """Lê um JSONL registro a registro; linhas truncadas (queda no meio da escrita) são ignoradas."""
+    if not os.path.exists(filepath):
+        return
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"⚠️ Linha inválida ignorada em {filepath}: {line[:80]}")
+
+
+def save_json_stream(filepath, records):
+    """Grava um array JSON item a item, sem montar a lista inteira em memória."""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write("[")
+        first = True
+        for record in records:
+            f.write("\n" if first else ",\n")
+            item = json.dumps(record, indent=2)
+            f.write("  " + item.replace("\n", "\n  "))
+            first = False
+        f.write("\n]" if not first else "]")
+
+
+_JSON_READ_SIZE = 1 << 20
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonStream:
+    """
+    Leitor JSON incremental sobre um arquivo texto: guarda só uma janela do arquivo,
+    recarregada à medida que os valores são consumidos. Arrays e objetos grandes podem
+    ser percorridos item a item (iter_array/iter_object) sem montar o valor inteiro.
+    """
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=_JSON_READ_SIZE):
+        chunk = self.fh.read(size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self):
+        """Próximo caractere que não é espaço ('' no fim do arquivo), sem consumi-lo."""
+        while True:
+            self.pos = _JSON_WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"esperado {char!r} na posição {self.pos} da janela atual")
+        self.pos += 1
+
+    def value(self):
+        """Decodifica o próximo valor JSON completo, lendo mais do arquivo enquanto ele estiver cortado."""
+        self.peek()
+        size = _JSON_READ_SIZE
+        while True:
+            try:
+                obj, end = _JSON_DECODER.raw_decode(self.buf, self.pos)
+                # um número no fim da janela pode continuar na próxima leitura
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2  # valores grandes: leituras maiores para a redecodificação continuar linear
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"esperado ',' ou ']' no array, encontrado {char!r}")
+
+    def iter_object(self):
+        """
+        Percorre um objeto devolvendo as chaves uma a uma. A cada chave, quem consome lê o
+        valor (value(), iter_array() ou iter_object()) antes de pedir a próxima.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"esperado ',' ou '}}' no objeto, encontrado {char!r}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os scripts se importam pelo nome (rodam de dentro de app/scripts)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "scripts"))
@@ -0,0 +1,133 @@
+"""stream_download contra um servidor HTTP local: retomada com Range/If-Range e novas tentativas por status."""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import metrics
+
+DATA = bytes(range(256)) * 1200  # ~300 KB
+ETAG = '"v1"'
+
+
+class Server:
+    """
+    Servidor local cujo comportamento cada teste define:
+    - statuses: status devolvidos (em ordem) antes de servir o arquivo;
+    - cut_first: a primeira resposta com o arquivo cai depois de `cut_first` bytes;
+    - honor_range: responde 206 a Range com If-Range igual ao ETag (senão sempre 200).
+    """
+
+    def __init__(self, statuses=(), cut_first=None, honor_range=True):
+        self.statuses = list(statuses)
+        self.cut_first = cut_first
+        self.honor_range = honor_range
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append({"range": self.headers.get("Range"), "if_range": self.headers.get("If-Range")})
+                if server.statuses:
+                    self.send_response(server.statuses.pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start = 0
+                if server.honor_range and self.headers.get("Range") and self.headers.get("If-Range") == ETAG:
+                    start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(DATA) - 1}/{len(DATA)}")
+                else:
+                    self.send_response(200)
+                body = DATA[start:]
+                self.send_header("ETag", ETAG)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if server.cut_first is not None:
+                    cut, server.cut_first = server.cut_first, None
+                    self.wfile.write(body[:cut])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/repo.zip"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(metrics.time, "sleep", lambda seconds: None)
+    servers = []
+
+    def start(**kwargs):
+        servers.append(Server(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def download(server, tmp_path, **kwargs):
+    # blocos pequenos: o que chegou antes da queda é gravado no .part
+    return metrics.stream_download(server.url, str(tmp_path / "repo.zip"), chunk_size=4096, **kwargs)
+
+
+def test_resumes_with_range_and_if_range(serve, tmp_path):
+    server = serve(cut_first=100_000)
+    result = download(server, tmp_path, retries=2)
+
+    assert (tmp_path / "repo.zip").read_bytes() == DATA
+    assert result["resumed"] is True
+    assert server.requests[0] == {"range": None, "if_range": None}
+    offset = server.requests[1]["range"]
+    assert offset.startswith("bytes=") and int(offset[6:-1]) > 0
+    assert server.requests[1]["if_range"] == ETAG
+    assert sorted(os.listdir(tmp_path)) == ["repo.zip"]  # sem .part nem .validator
+
+
+def test_restarts_when_server_ignores_range(serve, tmp_path):
+    server = serve(cut_first=100_000, honor_range=False)
+    result = download(server, tmp_path, retries=2)
+
+    assert (tmp_path / "repo.zip").read_bytes() == DATA
+    assert result["resumed"] is False
+    assert len(server.requests) == 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retries_transient_status(serve, tmp_path, status):
+    server = serve(statuses=[status, status])
+    download(server, tmp_path, retries=3)
+
+    assert (tmp_path / "repo.zip").read_bytes() == DATA
+    assert len(server.requests) == 3
+
+
+@pytest.mark.parametrize("status", [401, 403, 404])
+def test_does_not_retry_client_errors(serve, tmp_path, status):
+    server = serve(statuses=[status])
+    with pytest.raises(requests.HTTPError):
+        download(server, tmp_path, retries=3)
+
+    assert len(server.requests) == 1
+
+
+def test_gives_up_after_retries(serve, tmp_path):
+    server = serve(statuses=[503] * 5)
+    with pytest.raises(requests.HTTPError):
+        download(server, tmp_path, retries=2)
+
+    assert len(server.requests) == 3
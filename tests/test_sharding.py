@@ -0,0 +1,108 @@
+"""--shard i/N + --merge-shards sobre um corpus local (--input-dir) e as validações do merge."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from sharding import check_shards, shard_of, shard_paths
+
+ANALYZE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "scripts", "analyze.py")
+REPOS = ["acme/alpha", "acme/beta", "acme/gamma", "acme/delta", "acme/epsilon", "acme/zeta"]
+
+
+def make_corpus(root):
+    """Um checkout (pasta) por repo, com package.json e um pouco de JS, mais o manifesto."""
+    corpus = root / "corpus"
+    manifest = []
+    for n, name in enumerate(REPOS, start=1):
+        repo_dir = corpus / name.replace("/", "__")
+        (repo_dir / "src").mkdir(parents=True)
+        (repo_dir / "package.json").write_text(json.dumps({"name": name, "dependencies": {"left-pad": "^1.0.0"}}))
+        body = "".join(f"function f{i}(a) {{\n  if (a > {i}) {{ return a; }}\n  return {i};\n}}\n" for i in range(n))
+        (repo_dir / "src" / "index.js").write_text(f"// {name}\n{body}")
+        manifest.append({"name": name, "stars": 100 * n, "forks": n, "size_kb": n})
+    (root / "manifest.json").write_text(json.dumps(manifest))
+    return corpus, root / "manifest.json"
+
+
+def analyze(cwd, *args):
+    env = {**os.environ, "FILE_CACHE": "0", "METRICS_CACHE_DIR": str(cwd / "cache")}
+    subprocess.run([sys.executable, ANALYZE, *args], cwd=cwd, env=env, check=True, capture_output=True, timeout=600)
+
+
+def summary(cwd):
+    with open(cwd / "app" / "results" / "summary.json", encoding="utf-8") as f:
+        return {record["repo"]: record for record in json.load(f)}
+
+
+@pytest.fixture(scope="module")
+def runs(tmp_path_factory):
+    root = tmp_path_factory.mktemp("shards")
+    corpus, manifest = make_corpus(root)
+    assert {shard_of(name, 2) for name in REPOS} == {1, 2}  # as duas fatias recebem repos
+
+    single = root / "single"
+    single.mkdir()
+    analyze(single, "--input-dir", str(corpus), "--manifest", str(manifest))
+
+    sharded = root / "sharded"
+    sharded.mkdir()
+    for index in (1, 2):
+        analyze(sharded, "--input-dir", str(corpus), "--manifest", str(manifest), "--shard", f"{index}/2")
+    analyze(sharded, "--merge-shards", "2")
+    return single, sharded
+
+
+def test_merged_summary_matches_single_run(runs):
+    single, sharded = runs
+    expected = summary(single)
+
+    assert sorted(expected) == sorted(REPOS)
+    assert summary(sharded) == expected
+
+
+def test_merge_concatenates_shard_reports(runs):
+    _, sharded = runs
+    reports = sharded / "app" / "results" / "reports"
+    for name in ("telemetry.jsonl", "function_histograms.jsonl"):
+        with open(reports / name, encoding="utf-8") as f:
+            assert sorted(json.loads(line)["repo"] for line in f) == sorted(REPOS)
+
+
+def copy_results(sharded, tmp_path):
+    results = tmp_path / "results"
+    shutil.copytree(sharded / "app" / "results", results)
+    return str(results)
+
+
+def test_rejects_missing_shard(runs, tmp_path):
+    results = copy_results(runs[1], tmp_path)
+    os.remove(shard_paths(results, (2, 2))["marker"])
+
+    with pytest.raises(ValueError, match="shard-2-of-2 não terminou"):
+        check_shards(results, 2)
+
+
+def test_rejects_duplicate_shard(runs, tmp_path):
+    # a fatia 1 copiada no lugar da 2 (ex.: o mesmo --shard rodado em dois nós)
+    results = copy_results(runs[1], tmp_path)
+    first, second = shard_paths(results, (1, 2)), shard_paths(results, (2, 2))
+    for kind in ("checkpoint", "marker"):
+        shutil.copyfile(first[kind], second[kind])
+
+    with pytest.raises(ValueError, match="é da fatia 1/2"):
+        check_shards(results, 2)
+
+
+def test_rejects_repo_in_wrong_shard(runs, tmp_path):
+    # marcador certo, mas o checkpoint da fatia 2 traz repos que são da fatia 1
+    results = copy_results(runs[1], tmp_path)
+    first, second = shard_paths(results, (1, 2)), shard_paths(results, (2, 2))
+    with open(first["checkpoint"], encoding="utf-8") as src, open(second["checkpoint"], "a", encoding="utf-8") as dst:
+        dst.write(src.read())
+
+    with pytest.raises(ValueError, match="pertence à fatia 1/2"):
+        check_shards(results, 2)